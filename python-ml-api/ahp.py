@@ -0,0 +1,238 @@
+"""层次分析法（AHP）权重引擎：幂迭代求主特征向量、一致性比率（CR）、多专家判断矩阵的几何平均聚合
+
+层级结构来自 indicators：目标 → 4个一级指标 → 12个二级指标 → 32个三级指标，每个非叶节点一个判断矩阵（未提供时视为各项同等重要）。
+求解结果按矩阵内容哈希缓存；一批矩阵按阶数分组，同阶矩阵在同一次批量矩阵乘法中迭代，
+多名专家的全部矩阵只需几次向量化计算。
+"""
+import hashlib
+import os
+
+import numpy as np
+
+from errors import InputError
+from indicators import ALL_THIRD, FIRST_LEVEL, FIRST_TO_SECOND, SECOND_LEVEL, SECOND_TO_THIRD, resolve_third_names
+from model_cache import ModelCache
+
+GOAL = '综合评价'
+# Saaty 平均随机一致性指标 RI（按矩阵阶数索引，超过15阶时取15阶的值）
+RANDOM_INDEX = (0.0, 0.0, 0.0, 0.58, 0.90, 1.12, 1.24, 1.32, 1.41, 1.45, 1.49, 1.51, 1.48, 1.56, 1.57, 1.59)
+CR_THRESHOLD = 0.1
+POWER_TOL = 1e-12
+POWER_MAX_ITER = 1000
+# 判断矩阵互反性检查的相对容差（允许 1/3 写作 0.33 之类的舍入）
+RECIPROCAL_RTOL = 0.05
+
+
+def random_index(n):
+    return RANDOM_INDEX[min(n, len(RANDOM_INDEX) - 1)]
+
+
+def hierarchy_nodes():
+    """需要判断矩阵的节点：[(节点名, 子节点所在层级, [子节点名])]"""
+    return ([(GOAL, 'first', FIRST_LEVEL)]
+            + [(first, 'second', FIRST_TO_SECOND[first]) for first in FIRST_LEVEL]
+            + [(second, 'third', SECOND_TO_THIRD[second]) for second in SECOND_LEVEL])
+
+
+def to_matrix(matrix, n, node=''):
+    """判断矩阵转为 n×n 的 float64 数组（只检查形状，数值由 check_judgments 批量校验）"""
+    try:
+        A = np.asarray(matrix, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise InputError(f'判断矩阵 {node} 必须是数值矩阵')
+    if A.shape != (n, n):
+        raise InputError(f'判断矩阵 {node} 应为 {n}×{n}，实际为 {"×".join(map(str, A.shape))}')
+    return A
+
+
+def check_judgments(A, node=''):
+    """批量校验 (..., n, n) 判断矩阵：元素为正数、a_ji = 1/a_ij、对角线为1"""
+    def first_bad(mask):
+        position = np.argwhere(mask.reshape(-1, *A.shape[-2:]).any(axis=(1, 2)))[0][0]
+        return f'（第{position + 1}位专家）' if A.ndim > 2 else ''
+
+    invalid = ~np.isfinite(A) | (A <= 0)
+    if invalid.any():
+        raise InputError(f'判断矩阵 {node} 的元素必须是正数{first_bad(invalid)}')
+    not_reciprocal = ~np.isclose(A * np.swapaxes(A, -1, -2), 1.0, rtol=RECIPROCAL_RTOL)
+    if not_reciprocal.any():
+        raise InputError(f'判断矩阵 {node} 不满足互反性（a_ji = 1/a_ij，对角线为1）{first_bad(not_reciprocal)}')
+    return A
+
+
+def matrix_key(A):
+    hasher = hashlib.sha256()
+    hasher.update(str(A.shape).encode())
+    hasher.update(np.ascontiguousarray(A, dtype=np.float64).tobytes())
+    return hasher.hexdigest()
+
+
+def _power_iteration(A):
+    """A: (B, n, n) 同阶正互反矩阵 -> (主特征向量 (B, n)，λmax (B,)，迭代次数)"""
+    batch, n, _ = A.shape
+    w = np.full((batch, n, 1), 1.0 / n)
+    iterations = 0
+    for iterations in range(1, POWER_MAX_ITER + 1):
+        v = A @ w
+        v /= v.sum(axis=1, keepdims=True)
+        delta = np.abs(v - w).max()
+        w = v
+        if delta < POWER_TOL:
+            break
+    lambda_max = ((A @ w) / w).mean(axis=(1, 2))
+    return w[..., 0], lambda_max, iterations
+
+
+def solve_batch(matrices):
+    """批量求解判断矩阵（可混合不同阶数），返回每个矩阵的 {weights, lambda_max, ci, cr, consistent, cache_hit}"""
+    results = [None] * len(matrices)
+    pending = {}  # 阶数 -> {矩阵哈希: [在输入中的位置]}
+    for i, A in enumerate(matrices):
+        key = matrix_key(A)
+        cached = ahp_cache.get(key)
+        if cached is not None:
+            results[i] = {**cached, 'cache_hit': True}
+        else:
+            pending.setdefault(len(A), {}).setdefault(key, []).append(i)
+
+    for n, groups in pending.items():
+        keys = list(groups)
+        weights, lambda_max, iterations = _power_iteration(np.stack([matrices[groups[key][0]] for key in keys]))
+        ci = np.maximum((lambda_max - n) / (n - 1), 0.0) if n > 2 else np.zeros(len(keys))
+        cr = ci / random_index(n) if random_index(n) else np.zeros(len(keys))
+        for j, key in enumerate(keys):
+            result = {
+                'weights': weights[j],
+                'lambda_max': float(lambda_max[j]),
+                'ci': float(ci[j]),
+                'cr': float(cr[j]),
+                'consistent': bool(cr[j] <= CR_THRESHOLD),
+                'iterations': iterations
+            }
+            ahp_cache.put(key, result)
+            for i in groups[key]:
+                results[i] = {**result, 'cache_hit': False}
+    return results
+
+
+def aggregate_judgments(matrices, expert_weights=None):
+    """多专家判断矩阵（列表或 (专家数, n, n) 数组）按（加权）几何平均聚合为一个矩阵，结果仍满足互反性"""
+    stacked = np.asarray(matrices, dtype=np.float64)
+    if expert_weights is None:
+        return np.exp(np.log(stacked).mean(axis=0))
+    w = np.asarray(expert_weights, dtype=np.float64)
+    return np.exp(np.tensordot(w / w.sum(), np.log(stacked), axes=1))
+
+
+def parse_expert(judgments):
+    """{"first": 4×4, "second": {一级指标: 矩阵}, "third": {二级指标: 矩阵}} -> {节点名: 判断矩阵}"""
+    if not isinstance(judgments, dict):
+        raise InputError('每位专家的判断矩阵必须是对象：{"first": ..., "second": {...}, "third": {...}}')
+    for level in ('second', 'third'):
+        unknown = set(judgments.get(level) or {}) - set(FIRST_LEVEL if level == 'second' else SECOND_LEVEL)
+        if unknown:
+            raise InputError(f'未知的指标节点: {", ".join(sorted(unknown))}')
+    matrices = {}
+    for node, level, children in hierarchy_nodes():
+        matrix = judgments.get('first') if node == GOAL else (judgments.get(level) or {}).get(node)
+        n = len(children)
+        matrices[node] = np.ones((n, n)) if matrix is None else to_matrix(matrix, n, node)
+    return matrices
+
+
+def _compose(solutions):
+    """各节点的局部权重 -> 各层全局权重、一致性报告和层次总排序一致性比率"""
+    first_weights = solutions[GOAL]['weights']
+    first_global = dict(zip(FIRST_LEVEL, first_weights))
+    second_local, second_global, third_local, third_global = {}, {}, {}, {}
+    for first in FIRST_LEVEL:
+        for second, w in zip(FIRST_TO_SECOND[first], solutions[first]['weights']):
+            second_local[second] = w
+            second_global[second] = first_global[first] * w
+    for second in SECOND_LEVEL:
+        for third, w in zip(SECOND_TO_THIRD[second], solutions[second]['weights']):
+            third_local[third] = w
+            third_global[third] = second_global[second] * w
+
+    # 层次总排序一致性：CR = Σ(上层权重 × CI) / Σ(上层权重 × RI)
+    parent_weight = {GOAL: 1.0, **first_global, **second_global}
+    consistency = []
+    numerator = denominator = 0.0
+    for node, level, children in hierarchy_nodes():
+        solution = solutions[node]
+        numerator += parent_weight[node] * solution['ci']
+        denominator += parent_weight[node] * random_index(len(children))
+        consistency.append({
+            'node': node,
+            'level': level,
+            'n': len(children),
+            'lambda_max': solution['lambda_max'],
+            'ci': solution['ci'],
+            'cr': solution['cr'],
+            'consistent': solution['consistent']
+        })
+    overall_cr = numerator / denominator if denominator else 0.0
+    return {
+        'first': first_weights,
+        'second_local': np.array([second_local[s] for s in SECOND_LEVEL]),
+        'second_global': np.array([second_global[s] for s in SECOND_LEVEL]),
+        'third_local': np.array([third_local[t] for t in ALL_THIRD]),
+        'third_global': np.array([third_global[t] for t in ALL_THIRD]),
+        'consistency': consistency,
+        'overall_cr': overall_cr,
+        'consistent': overall_cr <= CR_THRESHOLD and all(item['consistent'] for item in consistency)
+    }
+
+
+def evaluate_hierarchy(experts, expert_weights=None):
+    """按层级求局部/全局权重；多名专家时先按几何平均聚合判断矩阵，同时给出每位专家各自的权重。
+    聚合矩阵和所有专家的矩阵在一次 solve_batch 中求解。"""
+    if not experts:
+        experts = [{}]
+    if expert_weights is not None:
+        expert_weights = np.asarray(expert_weights, dtype=np.float64)
+        if expert_weights.shape != (len(experts),) or (expert_weights <= 0).any():
+            raise InputError(f'expert_weights 必须是 {len(experts)} 个正数')
+    parsed = [parse_expert(judgments) for judgments in experts]
+    nodes = [node for node, _, _ in hierarchy_nodes()]
+    # 每个节点把所有专家的矩阵叠成 (专家数, n, n)，一次完成校验和聚合
+    stacked = {node: check_judgments(np.stack([matrices[node] for matrices in parsed]), node) for node in nodes}
+
+    batch = [aggregate_judgments(stacked[node], expert_weights) if len(parsed) > 1
+             else stacked[node][0] for node in nodes]
+    if len(parsed) > 1:
+        batch += [stacked[node][e] for e in range(len(parsed)) for node in nodes]
+    solved = solve_batch(batch)
+
+    result = _compose(dict(zip(nodes, solved[:len(nodes)])))
+    result['cache_hits'] = sum(1 for item in solved if item['cache_hit'])
+    result['n_matrices'] = len(solved)
+    result['experts'] = []
+    if len(parsed) > 1:
+        for e in range(1, len(parsed) + 1):
+            result['experts'].append(_compose(dict(zip(nodes, solved[e * len(nodes):(e + 1) * len(nodes)]))))
+    return result
+
+
+def evaluate_spec(spec):
+    """请求中的 AHP 描述：{"experts": [...], "expert_weights": [...]} 或单组 {"matrices": {...}}"""
+    if not isinstance(spec, dict):
+        raise InputError('ahp 参数必须是对象')
+    experts = spec.get('experts') or [spec.get('matrices') or {}]
+    return evaluate_hierarchy(experts, spec.get('expert_weights'))
+
+
+def feature_weights(result, feature_names=None, n_features=len(ALL_THIRD)):
+    """按指标列（中文名或英文属性名）取三级指标的全局权重并归一化；名称无法识别时返回 None"""
+    thirds = resolve_third_names(feature_names, n_features)
+    if thirds is None:
+        return None
+    index = {name: i for i, name in enumerate(ALL_THIRD)}
+    weights = result['third_global'][[index[t] for t in thirds]]
+    return weights / weights.sum()
+
+
+ahp_cache = ModelCache(
+    max_entries=int(os.environ.get('ML_AHP_CACHE_ENTRIES', 4096)),
+    max_bytes=int(os.environ.get('ML_AHP_CACHE_MB', 16)) * 1024 * 1024
+)
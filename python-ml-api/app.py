@@ -1,555 +1,1352 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import numpy as np
-import pandas as pd
-import torch
-import torch.nn as nn
-import torch.optim as optim
-import shap
-from sklearn.decomposition import PCA
-from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
-from scipy.spatial import ConvexHull
-import matplotlib
-matplotlib.use('Agg')  # 使用非交互式后端
-import matplotlib.pyplot as plt
-import matplotlib.font_manager as fm
-import io
 import base64
+import functools
 import json
+import os
 from datetime import datetime
 import random
+import time
+import serving
+from ahp import ahp_cache, check_judgments, evaluate_hierarchy, evaluate_spec, feature_weights, solve_batch, to_matrix
+from datasets import registry as dataset_registry, resolve_dataset
+from errors import InputError, ServiceBusy
+from experts import METHODS as EXPERT_METHODS, aggregate_rows, aggregate_scores, parse_expert_options
+from genetic import parse_ga_options, run_genetic_algorithm
+from inference import ENGINES as INFERENCE_ENGINES, align_features, get_predictor, predictor_cache
+from indicators import FIRST_LEVEL, SECOND_LEVEL, hierarchy_rollup, resolve_third_names
+from ingest import DEFAULT_RANGE, ingest_file
+from jobs import job_manager
+from model_cache import dataset_fingerprint, model_cache
+from model_store import model_store, parse_version, reuse_targets
+from pipeline import Pipeline, run_pipeline, stage_cache
+from rendering import FORMATS as RENDER_FORMATS, parse_render_options, render_cache, render_cached
+from scheduler import compute_scheduler
+from wire import Records, ip_column, ip_count, ip_matrix, read_request, respond
+
+# torch / sklearn / scipy / shap 等重型依赖在各接口内延迟导入（见 serving.HEAVY_MODULES），
+# 服务启动后 /api/health 立即可用，/api/ready 在预加载完成后返回就绪
 
 app = Flask(__name__)
 CORS(app)  # 允许跨域请求
 
-# 设置中文字体
-def setup_chinese_font():
-    """设置中文字体，优先使用系统可用字体"""
-    chinese_fonts = [
-        'PingFang SC',      # macOS 默认中文字体
-        'Heiti SC',         # 黑体-简
-        'STHeiti',          # 华文黑体
-        'Arial Unicode MS', # 支持中文的 Arial
-        'SimHei',           # Windows 黑体
-        'Microsoft YaHei',  # 微软雅黑
-        'WenQuanYi Micro Hei' # Linux 文泉驿字体
-    ]
+def parse_training_options(data, default_epochs):
+    """解析训练参数：最大轮数、早停（patience / min_delta）、训练时间预算、验证集比例"""
+    options = {
+        'epochs': int(data.get('max_epochs', default_epochs)),
+        'patience': int(data.get('patience', 50)) if data.get('early_stopping', True) else None,
+        'min_delta': float(data.get('min_delta', 1e-4)),
+        'time_budget': float(data['train_time_budget']) if data.get('train_time_budget') else None,
+        'validation_split': float(data.get('validation_split', 0.0))
+    }
+    if options['epochs'] < 1:
+        raise InputError('max_epochs 需大于0')
+    if options['patience'] is not None and options['patience'] < 1:
+        raise InputError('patience 需大于0')
+    if not 0 <= options['validation_split'] < 0.5:
+        raise InputError('validation_split 需在 0-0.5 之间')
+    return options
+
+def training_summary(training):
+    """训练过程摘要，写入响应的 model_info"""
+    return {
+        'epochs': training['epochs_used'],
+        'max_epochs': training['max_epochs'],
+        'stop_reason': training['stop_reason'],
+        'best_epoch': training['best_epoch'],
+        'training_seconds': training['seconds'],
+        'seconds_per_epoch': training['seconds_per_epoch']
+    }
+
+def request_client():
+    """计算调度中的客户端标识：X-Client-Id 请求头（前端按分析人员传入），否则为客户端地址"""
+    return request.headers.get('X-Client-Id') or request.remote_addr or 'anonymous'
+
+def busy_response(e):
+    return jsonify({'error': str(e)}), 503, {'Retry-After': '5'}
+
+def compute_bound(kind):
+    """视图装饰器：在计算调度器中获得计算槽后再执行，排队已满或等待超时返回503"""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                with compute_scheduler.slot(kind, request_client()):
+                    return view(*args, **kwargs)
+            except ServiceBusy as e:
+                return busy_response(e)
+        return wrapper
+    return decorator
+
+def scheduled_task(kind, fn):
+    """后台任务在计算调度器中排队（不设超时）后执行"""
+    def run(data, job):
+        with compute_scheduler.slot(kind, job.client, timeout=None):
+            return fn(data, job)
+    return run
+
+def ahp_records(result):
+    """AHP各层权重转为列式记录"""
+    from indicators import ALL_THIRD, FIRST_LEVEL, SECOND_LEVEL, SECOND_TO_FIRST, THIRD_TO_SECOND
+
+    return {
+        'first_level': Records(name=list(FIRST_LEVEL), weight=result['first']),
+        'second_level': Records(
+            name=list(SECOND_LEVEL),
+            parent=[SECOND_TO_FIRST[s] for s in SECOND_LEVEL],
+            local_weight=result['second_local'],
+            global_weight=result['second_global']
+        ),
+        'third_level': Records(
+            name=list(ALL_THIRD),
+            parent=[THIRD_TO_SECOND[t] for t in ALL_THIRD],
+            local_weight=result['third_local'],
+            global_weight=result['third_global']
+        )
+    }
+
+def run_neural_network_training(data, job=None):
+    """训练神经网络并返回训练过程和预测结果（可在请求线程或后台任务中执行）"""
+    import torch
+    from sklearn.preprocessing import StandardScaler
+    from ensemble import BatchedAdvancedNN, bootstrap_weights, ensemble_statistics, train_ensemble
+    from importance import STRATEGIES as IMPORTANCE_STRATEGIES, compute_feature_importance, normalize_importance
+    from indicators import hierarchy_groups
+    from models import AdvancedNN, fit_model
+
+    ips_data = data.get('ips', [])
+    feature_names = data.get('feature_names', [])  # 接收指标名称
+    
+    if ip_count(ips_data) < 5:
+        raise InputError('IP数量太少（<5），无法进行神经网络训练')
+    
+    # 准备数据
+    X = ip_matrix(ips_data)
+    
+    if X.shape[1] < 2:
+        raise InputError('指标数量太少，无法进行神经网络训练')
+    
+    # 集成模式：同时训练多个副本，用副本间的分歧估计预测不确定性
+    ensemble_size = int(data.get('ensemble_size', 1))
+    prediction_interval = float(data.get('prediction_interval', 0.9))
+    bootstrap = bool(data.get('bootstrap', False))
+    if not 1 <= ensemble_size <= 64:
+        raise InputError('ensemble_size 需在 1-64 之间')
+    if not 0 < prediction_interval < 1:
+        raise InputError('prediction_interval 需在 0-1 之间')
+    
+    # 特征重要性参数：zero 置零 / mean 均值基线 / permutation 置换（重复 importance_repeats 次）
+    importance_strategy = data.get('importance_strategy', 'zero')
+    importance_repeats = int(data.get('importance_repeats', 5))
+    importance_level = data.get('importance_level', 'indicator')  # indicator / second / first
+    if importance_strategy not in IMPORTANCE_STRATEGIES:
+        raise InputError(f'不支持的特征重要性策略: {importance_strategy}，可选: {list(IMPORTANCE_STRATEGIES)}')
+    if importance_repeats < 1:
+        raise InputError('importance_repeats 需大于0')
+    
+    training_options = parse_training_options(data, 500)
+    if training_options['validation_split'] and X.shape[0] * (1 - training_options['validation_split']) < 2:
+        raise InputError('IP数量太少，无法划分验证集')
+    warm_start_epochs = int(data.get('warm_start_epochs', 50))
+    if warm_start_epochs < 1:
+        raise InputError('warm_start_epochs 需大于0')
+    
+    input_size = X.shape[1]
+    cache_key = dataset_fingerprint(X, feature_names, 'random', {
+        'ensemble_size': ensemble_size, 'bootstrap': bootstrap, **training_options
+    })
+    cached = model_cache.get(cache_key)
+    
+    # 持久化的模型线（带 dataset_id 时按数据集区分）：内存缓存未命中时，
+    # 训练矩阵相同或版本被固定则直接加载已保存的模型，只新增/修改了少量IP时从最新版本热启动微调
+    model_id = model_store.line_id('random', feature_names, input_size, {
+        'ensemble_size': ensemble_size, 'bootstrap': bootstrap, 'dataset_id': data.get('dataset_id')
+    })
+    mode, version_info, saved = 'cache', None, None
+    requested = parse_version(data.get('model_version'))
+    wanted = requested if requested is not None else (model_store.meta(model_id) or {}).get('pinned')
+    if cached is not None and wanted is not None and cached['model_version'] != wanted:
+        cached = None  # 内存中的模型不是指定/固定的版本
+    if cached is None:
+        mode, version_info, saved = model_store.plan(model_id, X, requested, bool(data.get('warm_start', True)))
+    if mode in ('exact', 'pinned'):
+        print(f"加载已保存的模型 {model_id} v{version_info['version']}（{mode}），跳过训练")
+        cached = {
+            'state_dict': saved['state_dict'],
+            'scaler_X': saved['scaler_X'],
+            'scaler_Y': saved['scaler_Y'],
+            'targets': reuse_targets(saved, X, lambda n: np.random.rand(n, 1) * 100),
+            'training': saved['training'],
+            'model_version': version_info['version']
+        }
+    
+    if cached is None:
+        if mode == 'warm_start':
+            # 沿用已保存版本的目标值和归一化器，只为新增的IP生成目标值
+            Y = reuse_targets(saved, X, lambda n: np.random.rand(n, 1) * 100)
+            scaler_X = saved['scaler_X']
+            scaler_Y = saved['scaler_Y']
+            training_options = {**training_options, 'epochs': min(warm_start_epochs, training_options['epochs'])}
+            X_scaled = scaler_X.transform(X)
+            Y_scaled = scaler_Y.transform(Y)
+        else:
+            # 生成目标值（可以基于现有评分或使用随机值）
+            Y = np.random.rand(X.shape[0], 1) * 100  # 0-100分的随机评分
+            
+            # 数据归一化
+            scaler_X = StandardScaler()
+            scaler_Y = StandardScaler()
+            X_scaled = scaler_X.fit_transform(X)
+            Y_scaled = scaler_Y.fit_transform(Y)
+        
+        # 转换为PyTorch张量
+        X_tensor = torch.tensor(X_scaled, dtype=torch.float32)
+        Y_tensor = torch.tensor(Y_scaled, dtype=torch.float32)
+        
+        # 创建和训练模型
+        print(f"开始训练神经网络，输入维度：{input_size}, 样本数量：{X.shape[0]}, 集成副本数：{ensemble_size}"
+              + (f"，从 v{version_info['version']} 热启动" if mode == 'warm_start' else ''))
+        if ensemble_size > 1:
+            model = BatchedAdvancedNN(input_size, ensemble_size, seed=int(np.random.randint(0, 2**31 - ensemble_size)))
+            if mode == 'warm_start':
+                model.load_state_dict(saved['state_dict'])
+            sample_weights = bootstrap_weights(ensemble_size, X.shape[0]) if bootstrap else None
+            training = train_ensemble(model, X_tensor, Y_tensor, sample_weights=sample_weights,
+                                      callback=job.report_progress if job else None, **training_options)
+        else:
+            model = AdvancedNN(input_size)
+            if mode == 'warm_start':
+                model.load_state_dict(saved['state_dict'])
+            training = fit_model(model, X_tensor, Y_tensor,
+                                 callback=job.report_progress if job else None, **training_options)
+        losses = training['losses']
+        
+        state_dict = {k: v.detach().clone() for k, v in model.state_dict().items()}
+        model_version = None
+        if data.get('persist', True):
+            model_version = model_store.save(
+                model_id, {'kind': 'random', 'feature_names': list(feature_names), 'input_size': input_size,
+                           'ensemble_size': ensemble_size, 'bootstrap': bootstrap,
+                           'dataset_id': data.get('dataset_id')},
+                state_dict, X, Y, training, scaler_X, scaler_Y, mode)['version']
+        model_cache.put(cache_key, {
+            'state_dict': state_dict,
+            'scaler_X': scaler_X,
+            'scaler_Y': scaler_Y,
+            'targets': Y,
+            'training': training,
+            'model_version': model_version
+        })
+    else:
+        # 命中缓存或已保存的模型：直接恢复模型和归一化器，只需一次前向计算
+        if mode == 'cache':
+            print(f"命中模型缓存，跳过训练：{cache_key[:12]}")
+        model_version = cached['model_version']
+        scaler_X = cached['scaler_X']
+        scaler_Y = cached['scaler_Y']
+        Y = cached['targets']
+        training = cached['training']
+        losses = training['losses']
+        X_tensor = torch.tensor(scaler_X.transform(X), dtype=torch.float32)
+        model = BatchedAdvancedNN(input_size, ensemble_size) if ensemble_size > 1 else AdvancedNN(input_size)
+        model.load_state_dict(cached['state_dict'])
+    
+    # 获取预测结果
+    model.eval()
+    if ensemble_size > 1:
+        predict = lambda x: model(x).mean(dim=0)  # 集成平均预测
+        with torch.no_grad():
+            # 各副本预测 (K, n)，还原到原始评分尺度后汇总
+            replica_predictions = model(X_tensor).squeeze(-1) * float(scaler_Y.scale_[0]) + float(scaler_Y.mean_[0])
+        ensemble_stats = {k: v.numpy() for k, v in ensemble_statistics(replica_predictions, prediction_interval).items()}
+        predictions = ensemble_stats['mean']
+    else:
+        predict = model
+        with torch.no_grad():
+            predictions_scaled = model(X_tensor).numpy()
+            predictions = scaler_Y.inverse_transform(predictions_scaled).flatten()
+    
+    # 计算特征重要性：所有扰动副本堆叠为一个批次统一前向计算
+    importance_result = compute_feature_importance(predict, X_tensor, importance_strategy, importance_repeats)
+    feature_importance = normalize_importance(importance_result['importance'])
+    
+    # 按二级/一级指标分组的重要性
+    group_importance = None
+    if importance_level in ('second', 'first'):
+        groups = hierarchy_groups(feature_names, input_size, importance_level)
+        if groups is None:
+            print(f"警告：无法将指标名称映射到指标体系，跳过{importance_level}级分组重要性")
+        else:
+            grouped = compute_feature_importance(predict, X_tensor, importance_strategy, importance_repeats,
+                                                 groups=[cols for _, cols in groups])
+            normalized = normalize_importance(grouped['importance'])
+            group_importance = [
+                {'name': name, 'importance': float(normalized[i]), 'raw_importance': float(grouped['importance'][i]),
+                 'std': float(grouped['std'][i]), 'n_indicators': len(cols)}
+                for i, (name, cols) in enumerate(groups)
+            ]
+    
+    results = Records(
+        name=ip_column(ips_data, 'project_name'),
+        group=ip_column(ips_data, 'group_name'),
+        predicted_score=np.asarray(predictions, dtype=np.float64)
+    )
+    if ensemble_size > 1:
+        std = ensemble_stats['std'].astype(np.float64)
+        results.update({
+            'std': std,
+            'prediction_interval': np.stack([ensemble_stats['lower'], ensemble_stats['upper']], axis=1).astype(np.float64),
+            # 置信度：副本标准差相对目标分布标准差越小越可信
+            'confidence': np.maximum(0.0, 1.0 - std / float(scaler_Y.scale_[0]))
+        })
+    else:
+        results['confidence'] = 1.0 - np.abs(results['predicted_score'] - Y[:, 0]) / 100  # 简化的置信度
+    
+    return {
+        'success': True,
+        'training_losses': np.asarray(losses, dtype=np.float64),
+        'validation_losses': np.asarray(training['val_losses'], dtype=np.float64),
+        'predictions': results,
+        'feature_importance': feature_importance,
+        'group_importance': group_importance,
+        'importance_info': {
+            'strategy': importance_strategy,
+            'repeats': importance_repeats if importance_strategy == 'permutation' else 1,
+            'level': importance_level
+        },
+        'model_info': {
+            'input_size': input_size,
+            **training_summary(training),
+            'final_loss': losses[-1] if losses else 0,
+            'cache_hit': cached is not None,
+            'model_id': model_id,
+            'model_version': model_version,
+            # cache 内存缓存 / exact 已保存的相同数据 / pinned 固定版本 / warm_start 热启动微调 / full 从头训练
+            'model_mode': mode,
+            'warm_start_from': version_info['version'] if mode == 'warm_start' else None,
+            'ensemble_size': ensemble_size,
+            'prediction_interval': prediction_interval if ensemble_size > 1 else None
+        }
+    }
+
+def run_shap_explanation(data, job=None):
+    """SHAP模型解释（可在请求线程或后台任务中执行）"""
+    import torch
+    from explain import BACKGROUND_METHODS, EXPLAINERS as SHAP_EXPLAINERS, explain_model
+    from models import AdvancedNN, fit_model
+
+    ips_data = data.get('ips', [])
+    feature_names = data.get('feature_names', [])  # 接收指标名称
+    
+    if ip_count(ips_data) < 3:
+        raise InputError('SHAP解释需要至少3个IP')
+    
+    # 解释器参数：explainer 可选 deep / gradient / linear，background_size 为背景集规模，
+    # max_samples（最多解释的样本数）和 time_budget（秒）用于限制开销
+    explain_options = {
+        'explainer': data.get('explainer', 'deep'),
+        'background_size': int(data.get('background_size', 100)),
+        'background_method': data.get('background_method', 'kmeans'),
+        'chunk_size': int(data.get('chunk_size', 256)),
+        'max_samples': int(data['max_samples']) if data.get('max_samples') else None,
+        'time_budget': float(data['time_budget']) if data.get('time_budget') else None
+    }
+    if explain_options['explainer'] not in SHAP_EXPLAINERS:
+        raise InputError(f'不支持的解释器: {explain_options["explainer"]}，可选: {list(SHAP_EXPLAINERS)}')
+    if explain_options['background_method'] not in BACKGROUND_METHODS:
+        raise InputError(f'不支持的背景集方法: {explain_options["background_method"]}，可选: {list(BACKGROUND_METHODS)}')
+    if explain_options['background_size'] < 1 or explain_options['chunk_size'] < 1:
+        raise InputError('background_size 和 chunk_size 需大于0')
+    if explain_options['max_samples'] is not None and explain_options['max_samples'] < 1:
+        raise InputError('max_samples 需大于0')
+    
+    # 构建特征矩阵
+    X = ip_matrix(ips_data)
+    input_size = X.shape[1]
     
-    available_fonts = [f.name for f in fm.fontManager.ttflist]
+    # 确保使用传入的指标名称，如果没有传入或数量不匹配则使用默认格式
+    if not feature_names or len(feature_names) != input_size:
+        print(f"警告：传入的指标名称数量({len(feature_names) if feature_names else 0})与特征数量({input_size})不匹配")
+        feature_names = [f'指标{i+1}' for i in range(input_size)]
+    else:
+        print(f"使用传入的指标名称：{feature_names[:3]}...（共{len(feature_names)}个）")
+    
+    # 转换为张量
+    X_tensor = torch.FloatTensor(X)
+    model = AdvancedNN(input_size)
     
-    for font in chinese_fonts:
-        if font in available_fonts:
-            plt.rcParams['font.sans-serif'] = [font]
-            break
+    training_options = parse_training_options(data, 200)
+    cache_key = dataset_fingerprint(X, feature_names, 'mean', training_options)
+    cached = model_cache.get(cache_key)
+    if cached is None:
+        # 创建伪目标变量（综合评分）
+        Y = np.mean(X, axis=1)
+        Y_tensor = torch.FloatTensor(Y).unsqueeze(1)
+        
+        # 构建和训练神经网络
+        training = fit_model(model, X_tensor, Y_tensor,
+                             callback=job.report_progress if job else None, **training_options)
+        model_cache.put(cache_key, {
+            'state_dict': {k: v.detach().clone() for k, v in model.state_dict().items()},
+            'training': training
+        })
     else:
-        plt.rcParams['font.sans-serif'] = ['PingFang SC', 'Heiti SC', 'STHeiti', 'Arial Unicode MS']
+        print(f"命中模型缓存，跳过训练：{cache_key[:12]}")
+        model.load_state_dict(cached['state_dict'])
+        training = cached['training']
+    model.eval()
+    
+    # SHAP解释：固定规模背景集 + 分块解释，开销不随IP数量平方增长
+    explanation = explain_model(model, X, **explain_options)
+    shap_values = explanation['shap_values']
+    explained_mask = explanation['explained_mask']
+    predictions = explanation['predictions']
     
-    plt.rcParams['axes.unicode_minus'] = False
-
-setup_chinese_font()
-
-# 神经网络模型定义
-class AdvancedNN(nn.Module):
-    def __init__(self, input_size):
-        super(AdvancedNN, self).__init__()
-        self.fc1 = nn.Linear(input_size, 64)
-        self.relu1 = nn.ReLU()
-        self.dropout1 = nn.Dropout(0.2)
-        self.fc2 = nn.Linear(64, 32)
-        self.relu2 = nn.ReLU()
-        self.dropout2 = nn.Dropout(0.2)
-        self.fc3 = nn.Linear(32, 16)
-        self.relu3 = nn.ReLU()
-        self.fc4 = nn.Linear(16, 1)
-
-    def forward(self, x):
-        x = self.fc1(x)
-        x = self.relu1(x)
-        x = self.dropout1(x)
-        x = self.fc2(x)
-        x = self.relu2(x)
-        x = self.dropout2(x)
-        x = self.fc3(x)
-        x = self.relu3(x)
-        x = self.fc4(x)
-        return x
-
-def train_nn(model, data, targets, epochs=500):
-    """训练神经网络模型"""
-    criterion = nn.MSELoss()
-    optimizer = optim.Adam(model.parameters(), lr=0.001, weight_decay=1e-5)
-    scheduler = optim.lr_scheduler.ReduceLROnPlateau(optimizer, patience=50)
+    # 计算每个特征的平均SHAP值（仅统计已解释的样本；explain_model 至少解释第一块，不会为空）
+    mean_shap_values = np.mean(np.abs(shap_values[explained_mask]), axis=0)
     
-    losses = []
-    for epoch in range(epochs):
-        model.train()
-        optimizer.zero_grad()
-        outputs = model(data)
-        loss = criterion(outputs, targets)
-        loss.backward()
-        optimizer.step()
-        scheduler.step(loss)
-        losses.append(loss.item())
-        
-        if epoch % 100 == 0:
-            print(f'Epoch [{epoch}/{epochs}], Loss: {loss.item():.4f}')
+    # 为每个IP计算SHAP值
+    ip_explanations = Records(
+        name=ip_column(ips_data, 'project_name'),
+        shap_values=shap_values,  # 未解释的样本为 NaN 行（JSON 中为 null）
+        predicted_value=np.asarray(predictions, dtype=np.float64)
+    )
     
-    return losses
+    print(f"SHAP分析完成，返回指标名称：{feature_names[:3]}...（共{len(feature_names)}个）")
+    
+    return {
+        'success': True,
+        'mean_shap_values': mean_shap_values,
+        'ip_explanations': ip_explanations,
+        'feature_names': feature_names,  # 返回确认的指标名称
+        'cache_hit': cached is not None,
+        'model_info': training_summary(training),
+        'explanation_info': explanation['info']
+    }
+
+# 可异步执行的任务类型
+JOB_TASKS = {
+    'neural-network': scheduled_task('neural-network', run_neural_network_training),
+    'shap': scheduled_task('shap', run_shap_explanation)
+}
+
+def submit_job(kind, data):
+    """提交后台任务，相同数据集的同类任务会复用已有任务"""
+    ips_data = data.get('ips', [])
+    dedup_key = None
+    if ips_data:
+        X = ip_matrix(ips_data)
+        params = {k: v for k, v in data.items() if k not in ('ips', 'feature_names', 'async', 'type')}
+        dedup_key = dataset_fingerprint(X, data.get('feature_names', []), kind, params)
+    job, deduplicated = job_manager.submit(kind, JOB_TASKS[kind], data, dedup_key, client=request_client())
+    return jsonify({
+        'success': True,
+        'job_id': job.id,
+        'status': job.status,
+        'deduplicated': deduplicated
+    }), 202
 
 @app.route('/api/neural-network/train', methods=['POST'])
 def train_neural_network():
-    """训练神经网络并返回训练过程和预测结果"""
+    """训练神经网络并返回训练过程和预测结果（async=true 时转为后台任务）"""
     try:
-        data = request.json
-        ips_data = data.get('ips', [])
-        feature_names = data.get('feature_names', [])  # 接收指标名称
+        data = resolve_dataset(read_request())
+        if data.get('async'):
+            return submit_job('neural-network', data)
+        with compute_scheduler.slot('neural-network', request_client()):
+            result = run_neural_network_training(data)
+        return respond(result)
         
-        if len(ips_data) < 5:
-            return jsonify({'error': 'IP数量太少（<5），无法进行神经网络训练'}), 400
+    except InputError as e:
+        return jsonify({'error': str(e)}), 400
+    except ServiceBusy as e:
+        return busy_response(e)
+    except Exception as e:
+        print(f"神经网络训练错误: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/shap/explain', methods=['POST'])
+def shap_explain():
+    """SHAP模型解释（async=true 时转为后台任务）"""
+    try:
+        data = resolve_dataset(read_request())
+        if data.get('async'):
+            return submit_job('shap', data)
+        with compute_scheduler.slot('shap', request_client()):
+            result = run_shap_explanation(data)
+        return respond(result)
         
-        # 准备数据
-        X = np.array([ip['indicators'] for ip in ips_data], dtype=np.float32)
+    except InputError as e:
+        return jsonify({'error': str(e)}), 400
+    except ServiceBusy as e:
+        return busy_response(e)
+    except Exception as e:
+        print(f"SHAP解释错误: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs', methods=['POST'])
+def create_job():
+    """提交异步训练任务，立即返回任务ID"""
+    try:
+        data = resolve_dataset(read_request())
+        kind = data.get('type')
+        if kind not in JOB_TASKS:
+            return jsonify({'error': f'不支持的任务类型: {kind}，可选: {list(JOB_TASKS)}'}), 400
+        return submit_job(kind, data)
         
-        if X.shape[1] < 2:
-            return jsonify({'error': '指标数量太少，无法进行神经网络训练'}), 400
+    except InputError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"提交任务错误: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """任务队列统计"""
+    return jsonify({
+        'success': True,
+        'jobs': job_manager.stats()
+    })
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """查询任务状态和部分训练损失（since 参数用于增量获取损失曲线）"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': f'任务不存在: {job_id}'}), 404
+    since = request.args.get('since', 0, type=int)
+    return jsonify({'success': True, **job.to_dict(since=since)})
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """获取任务结果，未完成时返回 202"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': f'任务不存在: {job_id}'}), 404
+    if job.status == 'succeeded':
+        return respond(job.result)
+    if job.status in ('failed', 'cancelled'):
+        return jsonify({'error': job.error or '任务已取消', 'status': job.status}), 409
+    return jsonify({'success': True, 'job_id': job.id, 'status': job.status, 'progress': job.progress}), 202
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """取消任务"""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return jsonify({'error': f'任务不存在: {job_id}'}), 404
+    return jsonify({'success': True, 'job_id': job.id, 'status': job.status})
+
+@app.route('/api/datasets', methods=['POST'])
+def create_dataset():
+    """上传数据集（逐行或列式 ips，JSON 或 msgpack），返回 dataset_id 和内容哈希"""
+    try:
+        data = read_request()
+        dataset = dataset_registry.create(data.get('ips', []), data.get('feature_names'), data.get('name'))
+        return jsonify({'success': True, 'dataset_id': dataset.id, **dataset.info()}), 201
         
-        # 生成目标值（可以基于现有评分或使用随机值）
-        Y = np.random.rand(X.shape[0], 1) * 100  # 0-100分的随机评分
+    except InputError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"上传数据集错误: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/datasets', methods=['GET'])
+def list_datasets():
+    """已存储的数据集列表"""
+    return jsonify({'success': True, 'datasets': dataset_registry.list()})
+
+@app.route('/api/datasets/<dataset_id>', methods=['GET'])
+def get_dataset(dataset_id):
+    """数据集信息；include_data=1 时同时返回名称、分组和指标矩阵"""
+    try:
+        dataset = dataset_registry.get(dataset_id)
+        if dataset is None:
+            return jsonify({'error': f'数据集不存在: {dataset_id}'}), 404
+        payload = {'success': True, 'dataset_id': dataset.id, **dataset.info()}
+        if request.args.get('include_data') in ('1', 'true'):
+            payload['ips'] = Records(project_name=dataset.names, group_name=dataset.groups, indicators=dataset.X)
+        return respond(payload)
         
-        # 数据归一化
-        scaler_X = StandardScaler()
-        scaler_Y = StandardScaler()
-        X_scaled = scaler_X.fit_transform(X)
-        Y_scaled = scaler_Y.fit_transform(Y)
+    except InputError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/datasets/<dataset_id>/append', methods=['POST'])
+def append_dataset(dataset_id):
+    """向数据集追加IP"""
+    try:
+        data = read_request()
+        dataset = dataset_registry.append(dataset_id, data.get('ips', []))
+        return jsonify({'success': True, 'dataset_id': dataset.id, **dataset.info()})
         
-        # 转换为PyTorch张量
-        X_tensor = torch.tensor(X_scaled, dtype=torch.float32)
-        Y_tensor = torch.tensor(Y_scaled, dtype=torch.float32)
+    except KeyError:
+        return jsonify({'error': f'数据集不存在: {dataset_id}'}), 404
+    except InputError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"追加数据集错误: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/datasets/<dataset_id>', methods=['PATCH'])
+def patch_dataset(dataset_id):
+    """修改数据集中的IP：updates 中每项用 index 或 project_name 定位，可修改 indicators / group_name / new_name"""
+    try:
+        data = read_request()
+        updates = data.get('updates', [])
+        if not updates:
+            raise InputError('updates 不能为空')
+        dataset = dataset_registry.patch(dataset_id, updates)
+        return jsonify({'success': True, 'dataset_id': dataset.id, **dataset.info()})
         
-        # 创建和训练模型
-        input_size = X.shape[1]
-        model = AdvancedNN(input_size)
+    except KeyError:
+        return jsonify({'error': f'数据集不存在: {dataset_id}'}), 404
+    except InputError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"修改数据集错误: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/datasets/<dataset_id>', methods=['DELETE'])
+def delete_dataset(dataset_id):
+    """删除数据集"""
+    try:
+        if not dataset_registry.delete(dataset_id):
+            return jsonify({'error': f'数据集不存在: {dataset_id}'}), 404
+        return jsonify({'success': True, 'dataset_id': dataset_id})
         
-        print(f"开始训练神经网络，输入维度：{input_size}, 样本数量：{X.shape[0]}")
-        losses = train_nn(model, X_tensor, Y_tensor, epochs=500)
+    except InputError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/models', methods=['GET'])
+def list_models():
+    """已保存的模型线及其版本列表（固定版本、每个版本的训练轮数/损失/方式）"""
+    return jsonify({'success': True, 'models': model_store.list()})
+
+@app.route('/api/predict', methods=['POST'])
+def predict_scores():
+    """只推理的批量评分：用已保存的模型版本（指定 > 固定 > 最新）为任意一批IP打分，不训练"""
+    try:
+        data = resolve_dataset(read_request())
+        model_id = data.get('model_id')
+        if not model_id:
+            raise InputError('缺少 model_id（见 GET /api/models 或训练结果的 model_info.model_id）')
+        engine = data.get('engine', 'script')
+        if engine not in INFERENCE_ENGINES:
+            raise InputError(f'不支持的推理引擎: {engine}，可选: {list(INFERENCE_ENGINES)}')
+        try:
+            chunk_size = int(data['chunk_size']) if data.get('chunk_size') else None
+        except (TypeError, ValueError) as e:
+            raise InputError(f'chunk_size 格式错误: {str(e)}')
+        if chunk_size is not None and chunk_size < 1:
+            raise InputError('chunk_size 需大于0')
+        model_version = parse_version(data.get('model_version'))
+        ips_data = data.get('ips', [])
+        if ip_count(ips_data) < 1:
+            raise InputError('没有需要评分的IP')
         
-        # 获取预测结果
-        model.eval()
-        with torch.no_grad():
-            predictions_scaled = model(X_tensor).numpy()
-            predictions = scaler_Y.inverse_transform(predictions_scaled).flatten()
+        predictor, version_info, meta = get_predictor(model_store, model_id, model_version, engine)
+        if predictor is None:
+            return jsonify({'error': f'模型不存在: {model_id}'}), 404
+        X = align_features(ip_matrix(ips_data), data.get('feature_names'), meta.get('feature_names'))
         
-        # 计算特征重要性（简化版）
-        feature_importance = []
-        for i in range(input_size):
-            X_perturbed = X_tensor.clone()
-            X_perturbed[:, i] = 0  # 将第i个特征置零
-            with torch.no_grad():
-                pred_perturbed = model(X_perturbed)
-                importance = torch.mean(torch.abs(model(X_tensor) - pred_perturbed)).item()
-                feature_importance.append(importance)
-        
-        # 归一化特征重要性
-        max_importance = max(feature_importance)
-        if max_importance > 0:
-            feature_importance = [imp / max_importance for imp in feature_importance]
-        
-        results = []
-        for i, ip in enumerate(ips_data):
-            results.append({
-                'name': ip['project_name'],
-                'group': ip['group_name'],
-                'predicted_score': float(predictions[i]),
-                'confidence': float(1.0 - abs(predictions[i] - Y[i, 0]) / 100)  # 简化的置信度
-            })
+        start = time.perf_counter()
+        replica_scores = predictor.predict(X, chunk_size)
+        inference_seconds = time.perf_counter() - start
         
-        return jsonify({
+        results = Records(
+            name=ip_column(ips_data, 'project_name'),
+            group=ip_column(ips_data, 'group_name'),
+            predicted_score=replica_scores.mean(axis=0).astype(np.float64)
+        )
+        if predictor.n_models > 1:
+            results['std'] = replica_scores.std(axis=0, ddof=1).astype(np.float64)
+        return respond({
             'success': True,
-            'training_losses': losses,
+            'model_id': model_id,
+            'model_version': version_info['version'],
+            'pinned': meta.get('pinned'),
+            'engine': engine,
             'predictions': results,
-            'feature_importance': feature_importance,
-            'model_info': {
-                'input_size': input_size,
-                'epochs': 500,
-                'final_loss': losses[-1] if losses else 0
-            }
+            'n_ips': len(X),
+            'inference_ms': inference_seconds * 1000
         })
         
+    except InputError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        print(f"神经网络训练错误: {str(e)}")
+        print(f"批量评分错误: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/shap/explain', methods=['POST'])
-def shap_explain():
-    """SHAP模型解释"""
+@app.route('/api/models/<model_id>/pin', methods=['POST'])
+def pin_model(model_id):
+    """固定模型版本：之后相同模型线的训练请求只加载该版本预测，不再训练"""
     try:
-        data = request.json
-        ips_data = data.get('ips', [])
-        feature_names = data.get('feature_names', [])  # 接收指标名称
-        
-        if len(ips_data) < 3:
-            return jsonify({'error': 'SHAP解释需要至少3个IP'}), 400
-        
-        # 构建特征矩阵
-        X = []
-        for ip in ips_data:
-            indicators = ip.get('indicators', [])
-            if not indicators:
-                return jsonify({'error': f'IP {ip.get("project_name", "未知")} 缺少指标数据'}), 400
-            X.append(indicators)
-        
-        X = np.array(X, dtype=np.float32)
-        input_size = X.shape[1]
-        
-        # 确保使用传入的指标名称，如果没有传入或数量不匹配则使用默认格式
-        if not feature_names or len(feature_names) != input_size:
-            print(f"警告：传入的指标名称数量({len(feature_names) if feature_names else 0})与特征数量({input_size})不匹配")
-            feature_names = [f'指标{i+1}' for i in range(input_size)]
-        else:
-            print(f"使用传入的指标名称：{feature_names[:3]}...（共{len(feature_names)}个）")
+        data = read_request()
+        if data.get('version') is None:
+            raise InputError('缺少 version')
+        meta = model_store.pin(model_id, data['version'])
+        return jsonify({'success': True, 'model_id': model_id, 'pinned': meta['pinned']})
         
-        # 创建伪目标变量（综合评分）
-        Y = np.mean(X, axis=1)
+    except KeyError:
+        return jsonify({'error': f'模型不存在: {model_id}'}), 404
+    except InputError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"固定模型版本错误: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/models/<model_id>/pin', methods=['DELETE'])
+def unpin_model(model_id):
+    """取消固定，恢复为使用最新版本（数据变化时热启动微调）"""
+    try:
+        model_store.pin(model_id, None)
+        return jsonify({'success': True, 'model_id': model_id, 'pinned': None})
         
-        # 转换为张量
-        X_tensor = torch.FloatTensor(X)
-        Y_tensor = torch.FloatTensor(Y).unsqueeze(1)
+    except KeyError:
+        return jsonify({'error': f'模型不存在: {model_id}'}), 404
+    except InputError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/models/<model_id>', methods=['DELETE'])
+def delete_model(model_id):
+    """删除模型线的全部版本"""
+    try:
+        if not model_store.delete(model_id):
+            return jsonify({'error': f'模型不存在: {model_id}'}), 404
+        return jsonify({'success': True, 'model_id': model_id})
         
-        # 构建和训练神经网络
-        model = AdvancedNN(input_size)
-        train_nn(model, X_tensor, Y_tensor, epochs=200)
-        model.eval()
-        
-        # SHAP解释
-        explainer = shap.DeepExplainer(model, X_tensor)
-        shap_values = explainer.shap_values(X_tensor)
-        
-        # 处理SHAP值
-        if isinstance(shap_values, list):
-            shap_values = shap_values[0]
-        
-        # 计算每个特征的平均SHAP值
-        mean_shap_values = np.mean(np.abs(shap_values), axis=0)
-        
-        # 为每个IP计算SHAP值
-        ip_explanations = []
-        for i, ip in enumerate(ips_data):
-            ip_shap = shap_values[i] if len(shap_values.shape) > 1 else shap_values
-            ip_explanations.append({
-                'name': ip['project_name'],
-                'shap_values': ip_shap.tolist() if hasattr(ip_shap, 'tolist') else [float(ip_shap)],
-                'predicted_value': float(model(X_tensor[i:i+1]).item())
-            })
+    except InputError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/ingest', methods=['POST'])
+def ingest_score_sheet():
+    """流式导入专家打分表（multipart 上传 file：xlsx 或 csv），返回 float32 指标矩阵和坏行报告；save_dataset=1 时直接存为数据集"""
+    try:
+        upload = request.files.get('file')
+        if upload is None or not upload.filename:
+            return jsonify({'error': '请以 multipart/form-data 上传 file（xlsx 或 csv）'}), 400
+        options = request.form
+        try:
+            value_range = (float(options.get('min_value', DEFAULT_RANGE[0])),
+                           float(options.get('max_value', DEFAULT_RANGE[1])))
+        except ValueError:
+            raise InputError('min_value / max_value 必须是数值')
         
-        print(f"SHAP分析完成，返回指标名称：{feature_names[:3]}...（共{len(feature_names)}个）")
+        result = ingest_file(upload.stream, upload.filename, sheet=options.get('sheet') or None,
+                             aggregate=options.get('aggregate', 'mean'), value_range=value_range)
+        print(f"导入打分表 {upload.filename}：{result['n_rows']}行，有效{result['n_valid']}行，"
+              f"坏行{result['n_bad']}行，耗时{result['seconds']:.2f}s")
+        if not result['n_valid']:
+            return jsonify({'error': '没有有效的评分行', 'bad_rows': result['bad_rows']}), 400
         
-        return jsonify({
+        payload = {
             'success': True,
-            'mean_shap_values': mean_shap_values.tolist(),
-            'ip_explanations': ip_explanations,
-            'feature_names': feature_names  # 返回确认的指标名称
+            **{key: result[key] for key in ('n_rows', 'n_valid', 'n_bad', 'bad_rows', 'feature_names',
+                                            'indicators', 'missing_indicators', 'ignored_columns',
+                                            'aggregate', 'seconds')}
+        }
+        if 'n_outliers' in result:
+            payload['n_outliers'] = result['n_outliers']
+            payload['flagged_experts'] = result['flagged_experts']
+        columns = {'project_name': result['names'], 'group_name': result['groups']}
+        if 'n_experts' in result:
+            columns['n_experts'] = result['n_experts']
+        if 'experts' in result:
+            columns['expert'] = result['experts']
+        if options.get('save_dataset') in ('1', 'true'):
+            dataset = dataset_registry.create(
+                {'project_name': result['names'], 'group_name': result['groups'], 'indicators': result['X']},
+                result['feature_names'], options.get('name') or upload.filename)
+            payload['dataset_id'] = dataset.id
+            payload['dataset'] = dataset.info()
+        if options.get('include_data', '1') in ('1', 'true'):
+            payload['ips'] = Records(**columns, indicators=result['X'])
+        return respond(payload)
+        
+    except InputError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"导入打分表错误: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+def aggregate_request_scores(data, methods, options):
+    """聚合请求中的评分：scores（列式或逐条的 project_name/group_name/expert/indicator/score），
+    或每位专家一行的宽格式 ips（需要 expert 字段）+ feature_names"""
+    scores = data.get('scores')
+    if scores is not None:
+        fields = ('project_name', 'group_name', 'expert', 'indicator', 'score')
+        if isinstance(scores, dict):
+            missing = [field for field in fields if field not in scores and field != 'group_name']
+            if missing:
+                raise InputError(f'scores 缺少字段: {", ".join(missing)}')
+            n = len(scores['score'])
+            columns = [scores.get(field, ['未知'] * n) for field in fields]
+        else:
+            try:
+                columns = [[item.get(field, '未知') if field == 'group_name' else item[field] for item in scores]
+                           for field in fields]
+            except KeyError as e:
+                raise InputError(f'scores 缺少字段: {e.args[0]}')
+        return aggregate_scores(*columns, methods=methods, **options)
+    ips_data = data.get('ips', [])
+    if not ips_data or not ip_count(ips_data):
+        raise InputError('请提供 scores（长格式评分）或 ips（每位专家一行）')
+    X = ip_matrix(ips_data, dtype=np.float64)
+    thirds = resolve_third_names(data.get('feature_names'), X.shape[1])
+    if thirds is None:
+        raise InputError('指标列无法对应到指标体系，请提供 feature_names')
+    return aggregate_rows(ip_column(ips_data, 'project_name'), ip_column(ips_data, 'group_name', '未知'),
+                          ip_column(ips_data, 'expert', ''), X, thirds, methods, **options)
+
+@app.route('/api/experts/aggregate', methods=['POST'])
+def aggregate_expert_scores():
+    """多专家评分聚合（均值/中位数/截尾均值/可靠度加权），同时标记异常评分（含小数点错位）和异常专家"""
+    try:
+        data = read_request()
+        methods = data.get('methods') or list(EXPERT_METHODS)
+        result = aggregate_request_scores(data, methods, parse_expert_options(data))
+        print(f"专家评分聚合：{result['n_scores']}条评分，{len(result['names'])}个IP，"
+              f"异常评分{result['n_outliers']}条，耗时{result['seconds']:.2f}s")
+        
+        return respond({
+            'success': True,
+            'results': Records(project_name=result['names'], group_name=result['groups'],
+                               n_experts=result['n_experts'], **result['aggregates']),
+            'feature_names': result['feature_names'],
+            'indicators': result['indicators'],
+            'methods': list(result['aggregates']),
+            'experts': Records(**result['experts']),
+            'outliers': Records(**result['outliers']),
+            'n_scores': result['n_scores'],
+            'n_outliers': result['n_outliers'],
+            'scale': result['scale'],
+            'seconds': result['seconds']
         })
         
+    except InputError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        print(f"SHAP解释错误: {str(e)}")
+        print(f"专家评分聚合错误: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/pca/analysis', methods=['POST'])
+@compute_bound('pca')
 def pca_analysis():
     """执行PCA降维分析"""
     try:
-        data = request.json
-        ips_data = data.get('ips', [])
-        n_components = data.get('n_components', 2)
+        data = resolve_dataset(read_request())
+        pipe = Pipeline(data, {'pca': data})
+        return respond({'success': True, **pipe.artifact('pca')})
+        
+    except InputError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"PCA分析错误: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+def get_pca_projection(data):
+    """根据请求中的 pca_id 取出已拟合的投影，并构建新IP的指标矩阵"""
+    from pca_service import pca_store
+
+    projection = pca_store.get(data.get('pca_id', ''))
+    if projection is None:
+        return None, None
+    X = ip_matrix(data.get('ips', []), dtype=np.float64)
+    if X.shape[1] != projection.n_features:
+        raise InputError(f'指标数量({X.shape[1]})与PCA模型的指标数量({projection.n_features})不一致')
+    return projection, X
+
+@app.route('/api/pca/project', methods=['POST'])
+def pca_project():
+    """将新IP投影到已有的PCA空间，无需重新拟合"""
+    try:
+        data = resolve_dataset(read_request())
+        projection, X = get_pca_projection(data)
+        if projection is None:
+            return jsonify({'error': 'PCA模型不存在或已过期，请先调用 /api/pca/analysis'}), 404
         
-        if len(ips_data) < 2:
-            return jsonify({'error': 'IP数量太少，无法进行PCA分析'}), 400
+        coordinates = projection.project(X)
+        errors = projection.reconstruction_error(X)
+        pca_results = Records(
+            name=ip_column(data['ips'], 'project_name', lambda i: f'IP{i+1}'),
+            group=ip_column(data['ips'], 'group_name', '未知'),
+            coordinates=coordinates,
+            reconstruction_error=errors
+        )
         
-        # 准备数据
-        X = np.array([ip['indicators'] for ip in ips_data])
-        ip_names = [ip['project_name'] for ip in ips_data]
+        return respond({
+            'success': True,
+            'pca_id': data['pca_id'],
+            'pca_results': pca_results,
+            'drift': projection.drift_report(X)
+        })
         
-        if X.shape[1] < n_components:
-            return jsonify({'error': f'指标数量({X.shape[1]})少于降维目标维度({n_components})'}), 400
+    except InputError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"PCA投影错误: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/pca/partial-fit', methods=['POST'])
+def pca_partial_fit():
+    """用新批次IP增量更新主成分（IncrementalPCA）"""
+    try:
+        data = resolve_dataset(read_request())
+        projection, X = get_pca_projection(data)
+        if projection is None:
+            return jsonify({'error': 'PCA模型不存在或已过期，请先调用 /api/pca/analysis'}), 404
+        
+        try:
+            drift = projection.partial_fit(X)
+        except ValueError as e:
+            raise InputError(str(e))
         
-        # 数据标准化
-        scaler = StandardScaler()
-        X_scaled = scaler.fit_transform(X)
+        return respond({
+            'success': True,
+            'pca_id': data['pca_id'],
+            'drift': drift,
+            'components': projection.pca.components_,
+            'pca_info': projection.info()
+        })
         
-        # PCA降维
-        pca = PCA(n_components=n_components)
-        X_pca = pca.fit_transform(X_scaled)
+    except InputError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"PCA增量更新错误: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/pca/<pca_id>', methods=['GET'])
+def pca_info(pca_id):
+    """查询已拟合PCA模型的信息及最近一次漂移检测结果"""
+    from pca_service import pca_store
+
+    projection = pca_store.get(pca_id)
+    if projection is None:
+        return jsonify({'error': f'PCA模型不存在: {pca_id}'}), 404
+    return respond({'success': True, 'pca_id': pca_id, 'pca_info': projection.info()})
+
+@app.route('/api/clustering/advanced', methods=['POST'])
+@compute_bound('clustering')
+def advanced_clustering():
+    """高级聚类分析，包含凸包计算"""
+    try:
+        data = resolve_dataset(read_request())
+        pipe = Pipeline(data, {'kmeans': data})
+        return respond({
+            'success': True,
+            **pipe.artifact('kmeans'),
+            'convex_hulls': pipe.artifact('hulls')
+        })
         
-        # 计算贡献度
-        explained_variance_ratio = pca.explained_variance_ratio_
-        cumulative_variance = np.cumsum(explained_variance_ratio)
+    except InputError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"高级聚类分析错误: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/clustering/k-sweep', methods=['POST'])
+@compute_bound('clustering')
+def clustering_k_sweep():
+    """在进程池中并行评估一组聚类数k，返回各k的质量指标和推荐k"""
+    try:
+        from clustering import LARGE_DATASET_THRESHOLD, SILHOUETTE_SAMPLE_SIZE, prepare_clustering_matrix, recommend_k, sweep_k
+
+        data = resolve_dataset(read_request())
+        ips_data = data.get('ips', [])
+        use_pca = data.get('use_pca', True)
         
-        # 获取主成分载荷
-        components = pca.components_
+        if ip_count(ips_data) < 3:
+            return jsonify({'error': 'k值扫描需要至少3个IP'}), 400
         
-        # 生成结果
-        pca_results = []
-        for i, (name, coords) in enumerate(zip(ip_names, X_pca)):
-            pca_results.append({
-                'name': name,
-                'coordinates': coords.tolist(),
-                'group': ips_data[i].get('group_name', '未知')
-            })
+        k_min = int(data.get('k_min', 2))
+        k_max = int(data.get('k_max', min(10, ip_count(ips_data) - 1)))
+        if k_min < 2 or k_max < k_min:
+            return jsonify({'error': f'k值范围不合法: {k_min}-{k_max}'}), 400
+        if k_max >= ip_count(ips_data):
+            return jsonify({'error': f'最大聚类数({k_max})需小于IP数量({ip_count(ips_data)})'}), 400
         
-        # 创建更友好的轴标签
-        axis_labels = []
-        for i in range(n_components):
-            variance_percent = explained_variance_ratio[i] * 100
-            axis_labels.append(f'主成分{i+1} ({variance_percent:.1f}%方差)')
+        # 标准化和PCA只计算一次，所有k共享同一矩阵
+        X = ip_matrix(ips_data, dtype=np.float64)
+        X_for_clustering, variance_explained = prepare_clustering_matrix(X, use_pca)
         
-        print(f"PCA分析完成：")
-        print(f"- 主成分数量: {n_components}")
-        print(f"- 轴标签: {axis_labels}")
-        print(f"- 累计方差解释率: {cumulative_variance[-1]*100:.1f}%")
+        options = {
+            'random_state': int(data.get('random_state', 42)),
+            'large_threshold': int(data.get('large_threshold', LARGE_DATASET_THRESHOLD)),
+            'silhouette_sample_size': int(data.get('silhouette_sample_size', SILHOUETTE_SAMPLE_SIZE))
+        }
+        start = datetime.now()
+        results = sweep_k(X_for_clustering, list(range(k_min, k_max + 1)),
+                          parallel=data.get('parallel'), **options)
+        recommended = recommend_k(results)
+        print(f"k值扫描完成：k={k_min}-{k_max}，推荐k={recommended}，耗时{(datetime.now() - start).total_seconds():.2f}s")
         
-        return jsonify({
+        return respond({
             'success': True,
-            'pca_results': pca_results,
-            'explained_variance_ratio': explained_variance_ratio.tolist(),
-            'cumulative_variance': cumulative_variance.tolist(),
-            'components': components.tolist(),
-            'n_components': n_components,
-            'total_variance_explained': float(cumulative_variance[-1]),
-            'axis_labels': axis_labels,  # 新增：友好的轴标签
-            'x_axis_label': axis_labels[0] if len(axis_labels) > 0 else 'PC1',
-            'y_axis_label': axis_labels[1] if len(axis_labels) > 1 else 'PC2'
+            'results': results,
+            'recommended_k': recommended,
+            'n_samples': len(X_for_clustering),
+            'pca_info': {
+                'used': variance_explained is not None,
+                'variance_explained': variance_explained.tolist() if variance_explained is not None else None
+            }
         })
         
+    except InputError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        print(f"PCA分析错误: {str(e)}")
+        print(f"k值扫描错误: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/clustering/advanced', methods=['POST'])
-def advanced_clustering():
-    """高级聚类分析，包含凸包计算"""
+@app.route('/api/genetic/evaluate', methods=['POST'])
+@compute_bound('genetic')
+def genetic_evaluate():
+    """遗传算法评估：以IP指标矩阵为初始种群进化，返回每代适应度统计和各IP评分"""
     try:
-        data = request.json
+        data = resolve_dataset(read_request())
         ips_data = data.get('ips', [])
-        n_clusters = data.get('n_clusters', 2)
-        use_pca = data.get('use_pca', True)
         
-        if len(ips_data) < n_clusters:
-            return jsonify({'error': f'IP数量({len(ips_data)})少于聚类数量({n_clusters})'}), 400
+        if ip_count(ips_data) < 2:
+            return jsonify({'error': 'IP数量太少（<2），无法进行遗传算法评估'}), 400
+        
+        X = ip_matrix(ips_data)
+        # 权重来源：显式 weights > 层次分析法判断矩阵 ahp > 默认判断矩阵（各项同等重要）的层次权重，
+        # 与 evaluation.score_ips、按组别分析和 test.py 一致；未传 ahp 且指标列无法对应到指标体系时等权
+        weights = data.get('weights')
+        if weights is not None:
+            weights = np.asarray(weights, dtype=np.float64)
+        elif data.get('ahp'):
+            weights = feature_weights(evaluate_spec(data['ahp']), data.get('feature_names'), X.shape[1])
+            if weights is None:
+                raise InputError('指标列无法对应到指标体系，请提供 feature_names 或直接传 weights')
+        else:
+            weights = feature_weights(evaluate_hierarchy([]), data.get('feature_names'), X.shape[1])
+            if weights is None:
+                weights = np.full(X.shape[1], 1.0 / X.shape[1])
+        history_mode = data.get('history', 'summary')
+        if history_mode not in ('summary', 'full'):
+            raise InputError('history 必须是 summary 或 full')
+        options = parse_ga_options(data)
+        
+        result = run_genetic_algorithm(X, weights, lower=data.get('lower'), upper=data.get('upper'),
+                                       record_history=history_mode == 'full', **options)
+        scores = result['initial_fitness']
+        ranks = np.empty(len(scores), dtype=np.int32)
+        ranks[np.argsort(-scores, kind='stable')] = np.arange(1, len(scores) + 1)
+        # 排名同时给出一级指标得分（与雷达图相同的聚合矩阵）；指标列无法对应时省略
+        thirds = resolve_third_names(data.get('feature_names'), X.shape[1])
+        first_scores = hierarchy_rollup(thirds).rollup(X)[1] if thirds is not None else None
+        print(f"遗传算法完成：{len(scores)}个IP，{result['generations_run']}代，耗时{result['seconds']:.2f}s")
+        
+        return respond({
+            'success': True,
+            'evaluation': Records(
+                name=ip_column(ips_data, 'project_name'),
+                group=ip_column(ips_data, 'group_name', '未知'),
+                score=scores,
+                error=result['fitness_std'],
+                final_fitness=result['final_fitness'],
+                rank=ranks,
+                **({'first_level': first_scores} if first_scores is not None else {})
+            ),
+            'first_level_names': list(FIRST_LEVEL) if first_scores is not None else None,
+            'weights': weights,
+            'best_fitness': result['best_fitness'],
+            'mean_fitness': result['mean_fitness'],
+            'std_fitness': result['std_fitness'],
+            'fitness_history': result['fitness_history'],  # history=full 时返回（代数 × IP数）
+            'best_individual': result['best_individual'],
+            'generations_run': result['generations_run'],
+            'converged': result['converged'],
+            'seconds': result['seconds'],
+            'options': options
+        })
+        
+    except InputError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"遗传算法评估错误: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/ahp/weights', methods=['POST'])
+def ahp_weights():
+    """层次分析法：按一级/二级/三级指标的判断矩阵求局部和全局权重，多名专家按几何平均聚合"""
+    try:
+        data = read_request()
+        result = evaluate_spec(data)
+        payload = {
+            'success': True,
+            **ahp_records(result),
+            'consistency': result['consistency'],
+            'overall_cr': result['overall_cr'],
+            'consistent': result['consistent'],
+            'n_matrices': result['n_matrices'],
+            'cache_hits': result['cache_hits']
+        }
+        if result['experts']:
+            payload['experts'] = [{
+                'third_global': expert['third_global'],
+                'overall_cr': expert['overall_cr'],
+                'consistent': expert['consistent'],
+                'inconsistent_nodes': [item['node'] for item in expert['consistency'] if not item['consistent']]
+            } for expert in result['experts']]
+        if data.get('feature_names') or data.get('n_features'):
+            # 按请求的指标列顺序给出可直接用于评分的权重向量
+            feature_names = data.get('feature_names')
+            weights = feature_weights(result, feature_names, int(data.get('n_features') or len(feature_names)))
+            if weights is None:
+                raise InputError('指标列无法对应到指标体系')
+            payload['feature_weights'] = weights
+        return respond(payload)
+        
+    except InputError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"AHP权重计算错误: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/ahp/solve', methods=['POST'])
+def ahp_solve():
+    """批量求解任意判断矩阵（可混合不同阶数），返回权重、λmax、CI 和 CR"""
+    try:
+        data = read_request()
+        matrices = data.get('matrices')
+        if not isinstance(matrices, list) or not matrices:
+            return jsonify({'error': 'matrices 必须是非空的判断矩阵列表'}), 400
+        checked = []
+        for i, matrix in enumerate(matrices):
+            n = len(matrix) if hasattr(matrix, '__len__') else 0
+            checked.append(check_judgments(to_matrix(matrix, n, f'#{i+1}'), f'#{i+1}'))
+        return respond({
+            'success': True,
+            'results': solve_batch(checked)
+        })
         
-        # 准备数据
-        X = np.array([ip['indicators'] for ip in ips_data])
-        ip_names = [ip['project_name'] for ip in ips_data]
+    except InputError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"AHP批量求解错误: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/hierarchy/rollup', methods=['POST'])
+def hierarchy_rollup_scores():
+    """按指标体系把各IP的三级指标聚合为二级/一级指标得分（雷达图、报告和排名共用）"""
+    try:
+        data = resolve_dataset(read_request())
+        ips_data = data.get('ips', [])
         
-        # 数据标准化
-        scaler = StandardScaler()
-        X_scaled = scaler.fit_transform(X)
+        if not ips_data or not ip_count(ips_data):
+            return jsonify({'error': '没有要聚合的IP'}), 400
         
-        # 可选的PCA降维
-        if use_pca and X.shape[1] > 2:
-            pca = PCA(n_components=2)
-            X_for_clustering = pca.fit_transform(X_scaled)
-            variance_explained = pca.explained_variance_ratio_
+        X = ip_matrix(ips_data, dtype=np.float64)
+        thirds = resolve_third_names(data.get('feature_names'), X.shape[1])
+        if thirds is None:
+            raise InputError('指标列无法对应到指标体系，请提供 feature_names')
+        # 分组内的权重：显式 weights > 层次分析法判断矩阵 ahp > 等权平均
+        first_weights = np.ones(len(FIRST_LEVEL))
+        weights = data.get('weights')
+        if weights is not None:
+            weights = np.asarray(weights, dtype=np.float64).reshape(-1)
+            if len(weights) != X.shape[1] or (weights < 0).any():
+                raise InputError(f'weights 必须是 {X.shape[1]} 个非负数')
+            weighting = 'custom'
+        elif data.get('ahp'):
+            result = evaluate_spec(data['ahp'])
+            weights = feature_weights(result, thirds, X.shape[1])
+            first_weights = result['first']
+            weighting = 'ahp'
         else:
-            X_for_clustering = X_scaled[:, :2] if X.shape[1] >= 2 else X_scaled
-            variance_explained = None
+            weighting = 'mean'
+        
+        rollup = hierarchy_rollup(thirds, weights)
+        second_scores, first_scores = rollup.rollup(X)
+        # 综合得分：一级指标得分按一级权重（只在有已选指标的一级指标间归一化）加权
+        first_weights = np.where(rollup.first_counts > 0, first_weights, 0.0)
+        overall = first_scores @ (first_weights / first_weights.sum())
+        ranks = np.empty(len(overall), dtype=np.int32)
+        ranks[np.argsort(-overall, kind='stable')] = np.arange(1, len(overall) + 1)
         
-        # K-means聚类
-        kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-        cluster_labels = kmeans.fit_predict(X_for_clustering)
-        centroids = kmeans.cluster_centers_
+        return respond({
+            'success': True,
+            'results': Records(
+                name=ip_column(ips_data, 'project_name'),
+                group=ip_column(ips_data, 'group_name', '未知'),
+                second_level=second_scores,
+                first_level=first_scores,
+                overall=overall,
+                rank=ranks
+            ),
+            'second_level_names': list(SECOND_LEVEL),
+            'first_level_names': list(FIRST_LEVEL),
+            'second_level_counts': rollup.second_counts,
+            'first_level_counts': rollup.first_counts,
+            'weighting': weighting
+        })
         
-        # 计算聚类质量指标
-        from sklearn.metrics import silhouette_score, calinski_harabasz_score
+    except InputError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"指标聚合错误: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/groups/analyze', methods=['POST'])
+@compute_bound('groups')
+def analyze_by_group():
+    """按组别（县）一次完成全部分析：各组别的评分、PCA、聚类和指标重要性在进程池中并行计算，并给出跨组别比较"""
+    try:
+        from group_analysis import analyze_groups
+        from importance import STRATEGIES as IMPORTANCE_STRATEGIES
+
+        data = resolve_dataset(read_request())
+        ips_data = data.get('ips', [])
         
-        # 质量指标计算需要特殊处理
-        silhouette_avg = None
-        calinski_harabasz = None
+        if not ips_data or not ip_count(ips_data):
+            return jsonify({'error': '没有要分析的IP'}), 400
         
-        try:
-            # 轮廓系数需要至少2个簇且每个簇至少有1个样本，但当每个样本都是单独簇时会失败
-            if len(set(cluster_labels)) > 1 and len(X_for_clustering) > len(set(cluster_labels)):
-                silhouette_avg = silhouette_score(X_for_clustering, cluster_labels)
-            else:
-                print(f"无法计算轮廓系数: 样本数={len(X_for_clustering)}, 簇数={len(set(cluster_labels))}")
-        except Exception as e:
-            print(f"轮廓系数计算失败: {str(e)}")
-            
-        try:
-            # Calinski-Harabasz指数需要至少2个簇
-            if len(set(cluster_labels)) > 1:
-                calinski_harabasz = calinski_harabasz_score(X_for_clustering, cluster_labels)
-        except Exception as e:
-            print(f"Calinski-Harabasz指数计算失败: {str(e)}")
-        
-        # 为每个聚类计算凸包
-        convex_hulls = []
-        for cluster_id in range(n_clusters):
-            cluster_points = X_for_clustering[cluster_labels == cluster_id]
-            if len(cluster_points) >= 3:  # 至少需要3个点才能形成凸包
-                try:
-                    hull = ConvexHull(cluster_points)
-                    hull_points = cluster_points[hull.vertices].tolist()
-                    convex_hulls.append({
-                        'cluster_id': cluster_id,
-                        'hull_points': hull_points,
-                        'area': hull.volume if hasattr(hull, 'volume') else 0
-                    })
-                except:
-                    # 如果无法计算凸包，使用最小包围矩形
-                    min_x, max_x = cluster_points[:, 0].min(), cluster_points[:, 0].max()
-                    min_y, max_y = cluster_points[:, 1].min(), cluster_points[:, 1].max()
-                    convex_hulls.append({
-                        'cluster_id': cluster_id,
-                        'hull_points': [[min_x, min_y], [max_x, min_y], [max_x, max_y], [min_x, max_y]],
-                        'area': (max_x - min_x) * (max_y - min_y)
-                    })
-            else:
-                convex_hulls.append({
-                    'cluster_id': cluster_id,
-                    'hull_points': cluster_points.tolist(),
-                    'area': 0
-                })
-        
-        # 生成结果
-        clustering_results = []
-        for i, (name, coords, label) in enumerate(zip(ip_names, X_for_clustering, cluster_labels)):
-            clustering_results.append({
-                'name': name,
-                'group': ips_data[i].get('group_name', '未知'),
-                'coordinates': coords.tolist(),
-                'cluster': int(label),
-                'distance_to_centroid': float(np.linalg.norm(coords - centroids[label]))
+        X = ip_matrix(ips_data)
+        feature_names = data.get('feature_names') or [f'指标{i+1}' for i in range(X.shape[1])]
+        thirds = resolve_third_names(data.get('feature_names'), X.shape[1])
+        # 所有组别共用同一组AHP权重（未提供判断矩阵时各项同等重要；指标无法对应到指标体系时等权）
+        weights = feature_weights(evaluate_spec(data.get('ahp') or {}), thirds, X.shape[1])
+        if weights is None:
+            weights = np.full(X.shape[1], 1.0 / X.shape[1])
+        options = {
+            'generations': int(data.get('generations', 50)),
+            'n_clusters': int(data.get('n_clusters', 3)),
+            'seed': int(data.get('seed', 0)),
+            'importance_strategy': data.get('importance_strategy', 'mean')
+        }
+        if not 1 <= options['generations'] <= 100000:
+            raise InputError('generations 必须在 1 到 100000 之间')
+        if options['n_clusters'] < 2:
+            raise InputError('n_clusters 必须大于1')
+        if options['importance_strategy'] not in IMPORTANCE_STRATEGIES:
+            raise InputError(f'不支持的特征重要性策略: {options["importance_strategy"]}，可选: {list(IMPORTANCE_STRATEGIES)}')
+        
+        analysis = analyze_groups(X, ip_column(ips_data, 'group_name', '未知'), weights, thirds,
+                                  selected=data.get('groups'), parallel=data.get('parallel'), **options)
+        names = np.asarray(ip_column(ips_data, 'project_name'), dtype=object)
+        if analysis['kept'] is not None:
+            names = names[analysis['kept']]
+        comparison = analysis['comparison']
+        
+        groups = []
+        for g, (group, index, result) in enumerate(zip(analysis['groups'], analysis['members'], analysis['results'])):
+            entry = {'group': group, 'n_ips': len(index), 'rank': comparison['rank'][g]}
+            if 'error' in result:
+                groups.append({**entry, 'error': result['error']})
+                continue
+            columns = {
+                'name': names[index].tolist(),
+                'score': result['scores'],
+                'error': result['errors'],
+                'rank': result['ranks'],
+                'overall_rank': analysis['overall_ranks'][index]
+            }
+            if 'first_level' in result:
+                columns['first_level'] = result['first_level']
+            if 'clusters' in result:
+                columns['cluster'] = result['clusters'].astype(np.int32)
+                columns['coordinates'] = result['coordinates']
+            groups.append({
+                **entry,
+                'results': Records(**columns),
+                'n_clusters': result.get('n_clusters'),
+                'explained_variance_ratio': result.get('explained_variance_ratio'),
+                'quality_metrics': result.get('quality'),
+                'feature_importance': Records(name=feature_names, importance=result['importance'],
+                                              raw_importance=result['raw_importance']),
+                'generations_run': result['generations_run'],
+                'warnings': result['warnings'],
+                'seconds': result['seconds']
             })
         
-        return jsonify({
+        summary = {
+            'group': analysis['groups'],
+            'n_ips': comparison['n_ips'],
+            'mean_score': comparison['mean_score'],
+            'std_score': comparison['std_score'],
+            'max_score': comparison['max_score'],
+            'best_ip': names[comparison['best_index']].tolist(),
+            'rank': comparison['rank'],
+            'mean_indicators': comparison['mean_indicators']
+        }
+        if 'first_level' in comparison:
+            summary['first_level'] = comparison['first_level']
+        print(f"分组分析完成：{len(analysis['groups'])}个组别，{len(names)}个IP，"
+              f"{'并行' if analysis['parallel'] else '串行'}，耗时{analysis['seconds']:.2f}s")
+        
+        return respond({
             'success': True,
-            'clustering_results': clustering_results,
-            'centroids': centroids.tolist(),
-            'convex_hulls': convex_hulls,
-            'quality_metrics': {
-                'silhouette_score': float(silhouette_avg) if silhouette_avg is not None else None,
-                'calinski_harabasz_score': float(calinski_harabasz) if calinski_harabasz is not None else None
-            },
-            'pca_info': {
-                'used': use_pca,
-                'variance_explained': variance_explained.tolist() if variance_explained is not None else None,
-                'x_axis_label': f'主成分1 ({variance_explained[0]*100:.1f}%方差)' if use_pca and variance_explained is not None else '维度1',
-                'y_axis_label': f'主成分2 ({variance_explained[1]*100:.1f}%方差)' if use_pca and variance_explained is not None and len(variance_explained) > 1 else '维度2',
-                'total_variance': f'{sum(variance_explained)*100:.1f}%' if variance_explained is not None else None
-            }
+            'groups': groups,
+            'comparison': Records(**summary),
+            # 组间差异：F 值越大，该指标在各组别之间的差异越显著
+            'indicator_differences': Records(name=feature_names, f_statistic=comparison['f_statistic']),
+            'first_level_names': list(FIRST_LEVEL) if thirds is not None else None,
+            'weights': weights,
+            'parallel': analysis['parallel'],
+            'workers': analysis['workers'],
+            'seconds': analysis['seconds']
         })
         
+    except InputError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        print(f"高级聚类分析错误: {str(e)}")
+        print(f"分组分析错误: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/visualization/advanced-plot', methods=['POST'])
 def generate_advanced_plot():
-    """生成高级可视化图表"""
+    """生成高级可视化图表（渲染进程池 + 内容哈希缓存）"""
     try:
-        data = request.json
+        data = read_request()
         plot_type = data.get('plot_type', 'clustering')
         plot_data = data.get('data', {})
-        
-        fig, ax = plt.subplots(figsize=(10, 8))
-        
-        if plot_type == 'clustering_with_hull':
-            # 聚类图与凸包
-            clustering_results = plot_data.get('clustering_results', [])
-            convex_hulls = plot_data.get('convex_hulls', [])
-            pca_info = plot_data.get('pca_info', {})
-            
-            # 绘制散点
-            colors = ['red', 'blue', 'green', 'orange', 'purple', 'brown', 'pink', 'gray']
-            for result in clustering_results:
-                cluster = result['cluster']
-                coords = result['coordinates']
-                color = colors[cluster % len(colors)]
-                ax.scatter(coords[0], coords[1], c=color, s=100, alpha=0.7, 
-                          label=f'簇 {cluster + 1}' if cluster < 8 else None)
-                ax.annotate(result['name'], (coords[0], coords[1]), 
-                           xytext=(5, 5), textcoords='offset points', fontsize=8)
-            
-            # 绘制凸包
-            for hull_info in convex_hulls:
-                hull_points = np.array(hull_info['hull_points'])
-                if len(hull_points) > 2:
-                    # 闭合凸包
-                    hull_points = np.vstack([hull_points, hull_points[0]])
-                    cluster_id = hull_info['cluster_id']
-                    color = colors[cluster_id % len(colors)]
-                    ax.plot(hull_points[:, 0], hull_points[:, 1], 
-                           color=color, linestyle='--', linewidth=2, alpha=0.8)
-                    ax.fill(hull_points[:, 0], hull_points[:, 1], 
-                           color=color, alpha=0.2)
-            
-            # 设置友好的轴标签
-            x_label = pca_info.get('x_axis_label', '维度1')
-            y_label = pca_info.get('y_axis_label', '维度2')
-            total_variance = pca_info.get('total_variance', '')
-            
-            ax.set_xlabel(x_label, fontsize=12)
-            ax.set_ylabel(y_label, fontsize=12)
-            
-            # 设置标题，包含方差信息
-            title = '聚类分析结果（含凸包）'
-            if total_variance:
-                title += f' - 总方差解释: {total_variance}'
-            ax.set_title(title, fontsize=14)
-            
-            ax.legend()
-            ax.grid(True, alpha=0.3)
-            
-        elif plot_type == 'pca_biplot':
-            # PCA双标图
-            pca_results = plot_data.get('pca_results', [])
-            components = plot_data.get('components', [])
-            pca_info = plot_data.get('pca_info', {})
-            
-            # 绘制数据点
-            for result in pca_results:
-                coords = result['coordinates']
-                ax.scatter(coords[0], coords[1], s=100, alpha=0.7)
-                ax.annotate(result['name'], (coords[0], coords[1]), 
-                           xytext=(5, 5), textcoords='offset points', fontsize=8)
-            
-            # 绘制变量向量（如果有足够的成分信息）
-            if len(components) >= 2:
-                for i, (pc1, pc2) in enumerate(zip(components[0], components[1])):
-                    ax.arrow(0, 0, pc1, pc2, head_width=0.05, head_length=0.05, 
-                            fc='red', ec='red', alpha=0.7)
-                    ax.text(pc1*1.1, pc2*1.1, f'指标{i+1}', fontsize=8, 
-                           ha='center', va='center')
-            
-            # 使用友好的轴标签
-            x_label = pca_info.get('x_axis_label', '主成分1')
-            y_label = pca_info.get('y_axis_label', '主成分2')
-            
-            ax.set_xlabel(x_label, fontsize=12)
-            ax.set_ylabel(y_label, fontsize=12)
-            ax.set_title('PCA双标图', fontsize=14)
-            ax.grid(True, alpha=0.3)
-            ax.axhline(y=0, color='k', linestyle='-', alpha=0.3)
-            ax.axvline(x=0, color='k', linestyle='-', alpha=0.3)
-        
-        # 将图表转换为base64编码的图片
-        buffer = io.BytesIO()
-        plt.savefig(buffer, format='png', dpi=150, bbox_inches='tight')
-        buffer.seek(0)
-        image_base64 = base64.b64encode(buffer.getvalue()).decode()
-        plt.close()
-        
+        fmt, dpi = parse_render_options(data)
+
+        image, cache_hit = render_cached(plot_type, plot_data, fmt, dpi)
+        mime_type = RENDER_FORMATS[fmt]
+
+        if request.args.get('raw') in ('1', 'true'):
+            # 直接返回图片字节，省去 base64 编解码
+            response = Response(image, mimetype=mime_type)
+            response.headers['X-Cache'] = 'HIT' if cache_hit else 'MISS'
+            return response
+
+        image_base64 = base64.b64encode(image).decode()
         return jsonify({
             'success': True,
-            'image': f'data:image/png;base64,{image_base64}',
-            'plot_type': plot_type
+            'image': f'data:{mime_type};base64,{image_base64}',
+            'plot_type': plot_type,
+            'format': fmt,
+            'dpi': dpi,
+            'cache_hit': cache_hit
         })
-        
+
+    except InputError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"生成高级图表错误: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/pipeline', methods=['POST'])
+@compute_bound('pipeline')
+def analysis_pipeline():
+    """分析流水线：按 stages 声明的阶段一次返回全部结果，共享标准化/PCA等中间结果"""
+    try:
+        data = resolve_dataset(read_request())
+        result = run_pipeline(data, runners={
+            'importance': run_neural_network_training,
+            'shap': run_shap_explanation
+        })
+        return respond({'success': True, **result})
+
+    except InputError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"分析流水线错误: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/sports-news/daily', methods=['GET'])
 def get_daily_sports_news():
     """获取每日新疆体育动态"""
@@ -604,9 +1401,35 @@ def get_daily_sports_news():
         print(f"获取体育动态错误: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """模型与图表缓存命中统计"""
+    return jsonify({
+        'success': True,
+        'model_cache': model_cache.stats(),
+        'render_cache': render_cache.stats(),
+        'pipeline_cache': stage_cache.stats(),
+        'ahp_cache': ahp_cache.stats(),
+        'predictor_cache': predictor_cache.stats()
+    })
+
+@app.route('/api/scheduler/stats', methods=['GET'])
+def scheduler_stats():
+    """计算调度统计：运行中/排队中的计算数（按类型、按客户端）、等待时间和运行时间分布"""
+    return jsonify({'success': True, 'scheduler': compute_scheduler.stats()})
+
+@app.route('/api/ready', methods=['GET'])
+def readiness_check():
+    """就绪检查：重型依赖加载（及预热）完成前返回503，负载均衡据此决定是否转发流量"""
+    status = serving.readiness()
+    return jsonify({
+        'status': 'ready' if status['ready'] else 'starting',
+        **status
+    }), 200 if status['ready'] else 503
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """健康检查接口"""
+    """健康检查接口（存活检查，不依赖重型模块加载）"""
     return jsonify({
         'status': 'healthy',
         'service': 'Python ML API',
@@ -619,10 +1442,38 @@ if __name__ == '__main__':
     print("可用接口:")
     print("- POST /api/neural-network/train - 神经网络训练")
     print("- POST /api/shap/explain - SHAP模型解释") 
+    print("- POST /api/datasets - 上传数据集（之后各分析接口可传 dataset_id）")
+    print("- POST /api/datasets/<dataset_id>/append - 追加IP")
+    print("- PATCH /api/datasets/<dataset_id> - 修改IP")
+    print("- GET /api/models - 已保存的模型及版本")
+    print("- POST /api/models/<model_id>/pin - 固定模型版本")
+    print("- POST /api/predict - 用已保存的模型批量评分（只推理）")
+    print("- POST /api/ingest - 流式导入专家打分表（xlsx/csv，可直接存为数据集）")
+    print("- POST /api/experts/aggregate - 多专家评分聚合与异常专家检测")
     print("- POST /api/pca/analysis - PCA降维分析")
+    print("- POST /api/pca/project - 新IP投影到已有PCA空间")
+    print("- POST /api/pca/partial-fit - PCA增量更新")
     print("- POST /api/clustering/advanced - 高级聚类分析")
+    print("- POST /api/clustering/k-sweep - 并行k值扫描")
+    print("- POST /api/genetic/evaluate - 遗传算法评估")
+    print("- POST /api/ahp/weights - AHP层次权重（多专家聚合、一致性检验）")
+    print("- POST /api/ahp/solve - 批量求解判断矩阵")
+    print("- POST /api/hierarchy/rollup - 三级指标聚合为二级/一级指标得分")
+    print("- POST /api/groups/analyze - 按组别（县）并行分析与跨组别比较")
     print("- POST /api/visualization/advanced-plot - 高级可视化")
+    print("- POST /api/pipeline - 分析流水线（标准化/PCA/聚类/凸包/重要性/渲染一次返回）")
     print("- GET /api/sports-news/daily - 每日体育动态")
-    print("- GET /api/health - 健康检查")
+    print("- POST /api/jobs - 提交异步训练任务")
+    print("- GET /api/jobs/<job_id> - 查询任务进度")
+    print("- GET /api/jobs/<job_id>/result - 获取任务结果")
+    print("- DELETE /api/jobs/<job_id> - 取消任务")
+    print("- GET /api/cache/stats - 模型与图表缓存统计")
+    print("- GET /api/scheduler/stats - 计算调度统计（排队数、等待时间）")
+    print("- GET /api/health - 健康检查（存活）")
+    print("- GET /api/ready - 就绪检查")
+
+    # 开启 reloader 时只在实际服务的子进程中预加载
+    if os.environ.get('ML_PRELOAD', '1') != '0' and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        serving.prepare_in_background()
     
     app.run(host='0.0.0.0', port=5001, debug=True) 
\ No newline at end of file
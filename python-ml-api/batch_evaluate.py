@@ -0,0 +1,112 @@
+"""批量评估命令行：无需图形界面，对一批打分表（xlsx/csv）运行 AHP → 遗传算法 → 排名 → 聚类，结果写为 CSV 或 Parquet
+
+多个文件在进程池中并行处理，每个工作进程的数值计算线程数按 CPU 核数平均分配。
+用法：python batch_evaluate.py 打分表1.xlsx 打分表2.csv ... [--output-dir results] [--format parquet]
+      [--workers 4] [--generations 50] [--clusters 3] [--seed 0] [--ahp 判断矩阵.json] [--predict]
+"""
+import argparse
+import glob
+import importlib.util
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from evaluation import evaluate_file
+
+_thread_limits = None
+
+
+def _init_worker(threads):
+    """限制工作进程的计算线程数，避免多个文件同时计算时线程过量：
+    已加载的 BLAS 由 threadpoolctl 限制，之后才导入的 sklearn（OpenMP）和 torch 读取环境变量"""
+    global _thread_limits
+    for name in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[name] = str(threads)
+    from threadpoolctl import threadpool_limits
+
+    _thread_limits = threadpool_limits(limits=threads)
+
+
+def parquet_available():
+    return any(importlib.util.find_spec(engine) is not None for engine in ('pyarrow', 'fastparquet'))
+
+
+def expand_inputs(patterns):
+    """展开通配符（Windows 的 shell 不会展开），去重并保持顺序"""
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        paths.extend(path for path in matches if path not in paths)
+    return paths
+
+
+def output_path(path, output_dir, fmt):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(output_dir or os.path.dirname(os.path.abspath(path)), f'{stem}_评估结果.{fmt}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='IP打分表批量评估')
+    parser.add_argument('inputs', nargs='+', help='打分表文件（xlsx/csv，可使用通配符）')
+    parser.add_argument('--output-dir', help='结果目录（默认与输入文件相同）')
+    parser.add_argument('--format', choices=('auto', 'csv', 'parquet'), default='auto',
+                        help='结果格式（auto：安装了 pyarrow/fastparquet 时为 parquet，否则为 csv）')
+    parser.add_argument('--workers', type=int, default=None, help='并行处理的文件数（默认 CPU 核数）')
+    parser.add_argument('--generations', type=int, default=50)
+    parser.add_argument('--clusters', type=int, default=3, help='聚类数（小于2时不聚类）')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--ahp', help='AHP判断矩阵 JSON 文件（格式同 POST /api/ahp/weights 的请求体）')
+    parser.add_argument('--predict', action='store_true', help='附加神经网络预测评分（需要 torch）')
+    parser.add_argument('--epochs', type=int, default=500)
+    args = parser.parse_args()
+
+    fmt = args.format
+    if fmt == 'auto':
+        fmt = 'parquet' if parquet_available() else 'csv'
+    elif fmt == 'parquet' and not parquet_available():
+        parser.error('输出 Parquet 需要安装 pyarrow 或 fastparquet')
+    paths = expand_inputs(args.inputs)
+    missing = [path for path in paths if not os.path.isfile(path)]
+    if missing:
+        parser.error(f'文件不存在: {", ".join(missing)}')
+    ahp = None
+    if args.ahp:
+        with open(args.ahp, encoding='utf-8') as f:
+            ahp = json.load(f)
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    options = {'ahp': ahp, 'generations': args.generations, 'n_clusters': args.clusters,
+               'seed': args.seed, 'predict': args.predict, 'epochs': args.epochs}
+    cpus = os.cpu_count() or 1
+    workers = max(1, min(args.workers or cpus, len(paths)))
+    print(f'{len(paths)} 个文件，{workers} 个工作进程，结果格式 {fmt}')
+
+    start = time.perf_counter()
+    failed = 0
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_worker, initargs=(max(1, cpus // workers),)) as pool:
+        futures = {pool.submit(evaluate_file, path, output_path(path, args.output_dir, fmt), **options): path
+                   for path in paths}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                summary = future.result()
+            except Exception as e:
+                failed += 1
+                print(f'  ✗ {path}: {str(e)}')
+                continue
+            print(f'  ✓ {path} → {summary["output"]}：{summary["n_ips"]} 个IP（{summary["n_rows"]} 行），'
+                  f'{summary["generations_run"]} 代，第一名 {summary["top"]}，耗时 {summary["seconds"]:.2f}s')
+            if summary['n_bad']:
+                print(f'    跳过 {summary["n_bad"]} 行无效评分，详见 {summary["bad_rows_output"]}')
+
+    print(f'完成：成功 {len(paths) - failed} 个，失败 {failed} 个，总耗时 {time.perf_counter() - start:.2f}s')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
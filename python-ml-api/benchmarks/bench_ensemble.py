@@ -0,0 +1,52 @@
+"""集成训练性能对比：单模型 vs 批量 K 副本 vs 逐个训练 K 个模型
+
+用法：python benchmarks/bench_ensemble.py [--n 200] [--k 16] [--epochs 500] [--skip-sequential]
+"""
+import argparse
+import os
+import sys
+import time
+
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from ensemble import BatchedAdvancedNN, train_ensemble  # noqa: E402
+from models import AdvancedNN, train_nn  # noqa: E402
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='集成训练基准测试')
+    parser.add_argument('--n', type=int, default=200, help='IP数量')
+    parser.add_argument('--d', type=int, default=32, help='指标数量')
+    parser.add_argument('--k', type=int, default=16, help='集成副本数')
+    parser.add_argument('--epochs', type=int, default=500)
+    parser.add_argument('--skip-sequential', action='store_true', help='跳过逐个训练的对照组')
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    X = torch.randn(args.n, args.d)
+    Y = torch.randn(args.n, 1)
+
+    # 预热，排除首次调用的初始化开销
+    train_nn(AdvancedNN(args.d), X, Y, epochs=5)
+    train_ensemble(BatchedAdvancedNN(args.d, args.k), X, Y, epochs=5)
+
+    single = timed(lambda: train_nn(AdvancedNN(args.d), X, Y, epochs=args.epochs))
+    batched = timed(lambda: train_ensemble(BatchedAdvancedNN(args.d, args.k), X, Y, epochs=args.epochs))
+    print(f'n={args.n}, d={args.d}, epochs={args.epochs}, torch线程数={torch.get_num_threads()}')
+    print(f'单模型:              {single:.3f}s')
+    print(f'批量集成 K={args.k}:      {batched:.3f}s  ({batched / single:.2f}x 单模型)')
+    if not args.skip_sequential:
+        sequential = timed(lambda: [train_nn(AdvancedNN(args.d), X, Y, epochs=args.epochs) for _ in range(args.k)])
+        print(f'逐个训练 K={args.k}:      {sequential:.3f}s  ({sequential / single:.2f}x 单模型)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""遗传算法基准：向量化引擎与原逐个体列表推导实现（test.py 中的 genetic_algorithm_per_ip）的每代耗时对比
+
+原实现按代数线性增长，只运行少量代数后按每代耗时估算全部代数的耗时。
+用法：python benchmarks/bench_genetic.py [--ips 10000] [--features 32] [--generations 1000] [--legacy-generations 20]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from genetic import DEFAULT_OPTIONS, run_genetic_algorithm  # noqa: E402
+
+
+def legacy_genetic_algorithm(data, weights, iterations):
+    """原实现：逐个体计算适应度并叠加高斯噪声"""
+    n = data.shape[0]
+    fitness_history = np.zeros((iterations, n))
+    for it in range(iterations):
+        fitness = [np.dot(ind, weights) for ind in data]
+        fitness_history[it] = fitness
+        data = data + np.random.normal(0, 0.1, data.shape)
+    return fitness_history
+
+
+def main():
+    parser = argparse.ArgumentParser(description='遗传算法基准测试')
+    parser.add_argument('--ips', type=int, default=10000)
+    parser.add_argument('--features', type=int, default=32)
+    parser.add_argument('--generations', type=int, default=1000)
+    parser.add_argument('--legacy-generations', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    X = rng.uniform(60, 95, size=(args.ips, args.features)).astype(np.float32)
+    weights = np.full(args.features, 1.0 / args.features)
+    print(f'{args.ips} 个IP × {args.features} 个指标，{args.generations} 代')
+
+    start = time.perf_counter()
+    legacy_genetic_algorithm(X.copy(), weights, args.legacy_generations)
+    legacy_per_generation = (time.perf_counter() - start) / args.legacy_generations
+    print(f'  原实现      每代 {legacy_per_generation * 1000:8.2f}ms  估算总耗时 {legacy_per_generation * args.generations:8.2f}s')
+
+    for record_history in (True, False):
+        result = run_genetic_algorithm(X, weights, generations=args.generations, patience=0,
+                                       seed=args.seed, record_history=record_history)
+        per_generation = result['seconds'] / result['generations_run']
+        label = '向量化引擎' + ('（完整历史）' if record_history else '（仅统计量）')
+        print(f'  {label:<10s} 每代 {per_generation * 1000:8.2f}ms  总耗时     {result["seconds"]:8.2f}s  '
+              f'最优适应度 {result["best_fitness"][0]:.2f} → {result["best_fitness"][-1]:.2f}')
+
+    result = run_genetic_algorithm(X, weights, generations=args.generations, seed=args.seed, record_history=False)
+    print(f'  提前终止（patience={DEFAULT_OPTIONS["patience"]}）：{result["generations_run"]} 代，'
+          f'{"已收敛" if result["converged"] else "未收敛"}，耗时 {result["seconds"]:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""只推理评分性能对比：训练接口的 eager 路径（sklearn 标准化 + nn.Module）vs 折叠后的 eager 模块 vs TorchScript
+
+用法：python benchmarks/bench_predict.py [--d 32] [--k 1] [--sizes 1,100,10000] [--repeats 200]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+from sklearn.preprocessing import StandardScaler
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from ensemble import BatchedAdvancedNN  # noqa: E402
+from inference import Predictor, fold_layers  # noqa: E402
+from models import AdvancedNN  # noqa: E402
+
+
+def rows_per_second(fn, X, repeats):
+    fn(X)  # 预热
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn(X)
+    elapsed = (time.perf_counter() - start) / repeats
+    return len(X) / elapsed, elapsed * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='只推理评分基准测试')
+    parser.add_argument('--d', type=int, default=32, help='指标数量')
+    parser.add_argument('--k', type=int, default=1, help='集成副本数（1 为单模型）')
+    parser.add_argument('--sizes', default='1,100,10000', help='每次评分的IP数量，逗号分隔')
+    parser.add_argument('--repeats', type=int, default=200, help='每个批量的重复次数（大批量自动减少）')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    sizes = [int(size) for size in args.sizes.split(',')]
+    X = rng.uniform(0, 100, size=(max(sizes), args.d)).astype(np.float32)
+    scaler_X = StandardScaler().fit(X)
+    scaler_Y = StandardScaler().fit(rng.random((len(X), 1)) * 100)
+    model = (BatchedAdvancedNN(args.d, args.k) if args.k > 1 else AdvancedNN(args.d)).eval()
+
+    def baseline(batch):
+        # 与 /api/neural-network/train 命中缓存后的预测相同：sklearn 标准化、整批前向、反标准化
+        with torch.no_grad():
+            outputs = model(torch.tensor(scaler_X.transform(batch), dtype=torch.float32))
+        return outputs.reshape(args.k, -1).numpy() * scaler_Y.scale_[0] + scaler_Y.mean_[0]
+
+    layers = fold_layers(model.state_dict(), scaler_X, scaler_Y)
+    engines = {'baseline': baseline}
+    for engine in ('eager', 'script'):
+        predictor = Predictor(layers, engine)
+        engines[engine] = predictor.predict
+        print(f'{engine}: 编译 {predictor.compile_seconds * 1000:.1f}ms，分块 {predictor.chunk_size} 行')
+    error = np.abs(engines['script'](X) - baseline(X)).max()
+    print(f'd={args.d}, k={args.k}, torch线程数={torch.get_num_threads()}, 与基线的最大误差={error:.2e}')
+
+    for size in sizes:
+        batch = X[:size]
+        repeats = max(3, args.repeats * 100 // max(size, 100))
+        results = {name: rows_per_second(fn, batch, repeats) for name, fn in engines.items()}
+        base_rate = results['baseline'][0]
+        print(f'n={size}: ' + '，'.join(
+            f'{name} {rate:,.0f} 行/秒 ({ms:.3f}ms, {rate / base_rate:.1f}x)' for name, (rate, ms) in results.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""计算调度吞吐对比：多个分析人员同时请求训练和聚类时，关闭调度 vs 开启调度
+
+每个分析人员一个线程，连续发送 --requests 个请求（训练和高级聚类交替，每次使用不同的数据以避开缓存）。
+每种模式在独立子进程中运行，保证 torch / BLAS 线程数从默认值开始。
+
+用法：python benchmarks/bench_scheduler.py [--analysts 10] [--requests 4] [--n 200] [--epochs 200]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def run_mode(args):
+    """在当前进程中运行一种模式，输出 JSON 结果"""
+    sys.path.insert(0, os.path.join(BENCH_DIR, '..'))
+    from app import app
+    from scheduler import compute_scheduler
+
+    if args.slots is not None:
+        compute_scheduler.max_concurrent = args.slots
+    client = app.test_client()
+    latencies = []
+    failures = []
+    lock = threading.Lock()
+
+    def analyst(index):
+        rng = np.random.default_rng(index)
+        for i in range(args.requests):
+            X = rng.uniform(1, 10, size=(args.n, args.d))
+            ips = [{'project_name': f'{index}-{j}', 'indicators': row.tolist()} for j, row in enumerate(X)]
+            if i % 2 == 0:
+                path, payload = '/api/neural-network/train', {'ips': ips, 'max_epochs': args.epochs,
+                                                               'early_stopping': False, 'persist': False}
+            else:
+                path, payload = '/api/clustering/advanced', {'ips': ips, 'n_clusters': 4}
+            start = time.perf_counter()
+            response = client.post(path, json=payload, headers={'X-Client-Id': f'analyst-{index}'})
+            with lock:
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    failures.append(response.status_code)
+
+    # 预热一次，排除首次导入和算子初始化
+    client.post('/api/clustering/advanced', json={'ips': [{'indicators': [i, i % 3, i % 5]} for i in range(10)]})
+    threads = [threading.Thread(target=analyst, args=(index,)) for index in range(args.analysts)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    stats = compute_scheduler.stats()
+    print(json.dumps({
+        'seconds': elapsed,
+        'throughput': len(latencies) / elapsed,
+        'p50': float(np.percentile(latencies, 50)),
+        'p95': float(np.percentile(latencies, 95)),
+        'failures': len(failures),
+        'slots': stats['max_concurrent'],
+        'threads_per_job': stats['threads_per_job'],
+        'mean_wait': stats['wait_seconds']['mean']
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='计算调度吞吐基准测试')
+    parser.add_argument('--analysts', type=int, default=10, help='同时请求的分析人员数')
+    parser.add_argument('--requests', type=int, default=4, help='每个分析人员的请求数')
+    parser.add_argument('--n', type=int, default=200, help='每个请求的IP数量')
+    parser.add_argument('--d', type=int, default=32, help='指标数量')
+    parser.add_argument('--epochs', type=int, default=200)
+    parser.add_argument('--slots', type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_mode(args)
+        return
+
+    base = [sys.executable, '-W', 'ignore', os.path.abspath(__file__), '--child', '--analysts', str(args.analysts),
+            '--requests', str(args.requests), '--n', str(args.n), '--d', str(args.d), '--epochs', str(args.epochs)]
+    print(f'{args.analysts} 个分析人员 × {args.requests} 个请求，n={args.n}，d={args.d}，CPU核数={os.cpu_count()}')
+    results = {}
+    for label, extra in (('关闭调度', ['--slots', '0']), ('开启调度', [])):
+        output = subprocess.run(base + extra, capture_output=True, text=True, check=True).stdout
+        results[label] = result = json.loads(output.strip().splitlines()[-1])
+        print(f'{label}: {result["throughput"]:.2f} 请求/秒，耗时 {result["seconds"]:.1f}s，'
+              f'延迟 p50 {result["p50"]:.2f}s / p95 {result["p95"]:.2f}s，失败 {result["failures"]}'
+              + (f'，计算槽 {result["slots"]} × {result["threads_per_job"]} 线程，平均排队 {result["mean_wait"]:.2f}s'
+                 if result['slots'] else ''))
+    ratio = results['开启调度']['throughput'] / results['关闭调度']['throughput']
+    print(f'吞吐变化: {ratio:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
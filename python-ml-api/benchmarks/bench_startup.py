@@ -0,0 +1,95 @@
+"""启动耗时基准：逐个模块的导入时间、app 导入到 /api/health 可用的时间、预加载到就绪的时间，以及字体解析冷/热缓存对比
+
+每项测量都在新的子进程中进行（模块缓存不共享），重复多次取中位数。
+用法：python benchmarks/bench_startup.py [--repeat 3] [--modules torch shap ...]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, API_DIR)
+
+from serving import HEAVY_MODULES  # noqa: E402
+
+BASE_MODULES = ('flask', 'numpy', 'pandas', 'matplotlib', 'matplotlib.pyplot')
+
+
+def run_child(code, env=None):
+    """在新的解释器中执行代码，返回其打印的 JSON"""
+    output = subprocess.run([sys.executable, '-W', 'ignore', '-c', code], cwd=API_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def median_of(code, repeat, key, env=None):
+    return statistics.median(run_child(code, env)[key] for _ in range(repeat))
+
+
+IMPORT_CODE = '''
+import json, time
+start = time.perf_counter()
+import {module}
+print(json.dumps({{'seconds': time.perf_counter() - start}}))
+'''
+
+APP_CODE = '''
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter() - start
+response = app.app.test_client().get('/api/health')
+assert response.status_code == 200
+health = time.perf_counter() - start
+import serving
+serving.prepare()
+print(json.dumps({'import_app': imported, 'health': health, 'ready': time.perf_counter() - start}))
+'''
+
+FONT_CODE = '''
+import json, time
+import matplotlib
+import rendering
+start = time.perf_counter()
+rendering.setup_chinese_font()
+print(json.dumps({'seconds': time.perf_counter() - start}))
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser(description='启动耗时基准测试')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--modules', nargs='*', default=list(BASE_MODULES) + list(HEAVY_MODULES),
+                        help='逐个测量导入时间的模块（各自在新进程中导入，包含其依赖）')
+    args = parser.parse_args()
+
+    print('模块导入耗时（新进程，含依赖，中位数）:')
+    for module in args.modules:
+        seconds = median_of(IMPORT_CODE.format(module=module), args.repeat, 'seconds')
+        print(f'  {module:<24s} {seconds:7.3f}s')
+
+    results = [run_child(APP_CODE) for _ in range(args.repeat)]
+    print('服务启动:')
+    print(f'  import app              {statistics.median(r["import_app"] for r in results):7.3f}s')
+    print(f'  /api/health 可用        {statistics.median(r["health"] for r in results):7.3f}s')
+    print(f'  预加载完成（就绪）      {statistics.median(r["ready"] for r in results):7.3f}s')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, ML_FONT_CACHE=os.path.join(tmp, 'font.json'))
+        cold = []
+        for _ in range(args.repeat):
+            if os.path.exists(env['ML_FONT_CACHE']):
+                os.remove(env['ML_FONT_CACHE'])
+            cold.append(run_child(FONT_CODE, env)['seconds'])
+        warm = median_of(FONT_CODE, args.repeat, 'seconds', env)
+    print('中文字体解析:')
+    print(f'  无磁盘缓存（扫描字体列表） {statistics.median(cold):7.3f}s')
+    print(f'  命中磁盘缓存               {warm:7.3f}s')
+
+
+if __name__ == '__main__':
+    main()
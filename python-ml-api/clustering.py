@@ -0,0 +1,189 @@
+"""聚类工具：共享的标准化/PCA矩阵，以及在进程池中并行评估多个k值"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+from scipy.spatial import ConvexHull
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.decomposition import PCA
+from sklearn.metrics import calinski_harabasz_score, silhouette_score
+from sklearn.preprocessing import StandardScaler
+
+from scheduler import compute_cores, limit_worker_threads
+
+# 样本数超过该阈值时改用 MiniBatchKMeans 和抽样轮廓系数（精确轮廓系数为 O(n²)）
+LARGE_DATASET_THRESHOLD = 10000
+SILHOUETTE_SAMPLE_SIZE = 2000
+# 样本数达到该阈值时才使用进程池（小数据集进程间通信开销大于计算本身）
+PARALLEL_MIN_SAMPLES = 2000
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def prepare_clustering_matrix(X, use_pca=True):
+    """标准化后可选降到2维，返回 (聚类矩阵, 方差解释比例或None)"""
+    X_scaled = StandardScaler().fit_transform(X)
+    if use_pca and X.shape[1] > 2:
+        pca = PCA(n_components=2)
+        return pca.fit_transform(X_scaled), pca.explained_variance_ratio_
+    return (X_scaled[:, :2] if X.shape[1] >= 2 else X_scaled), None
+
+
+def cluster_quality(X, labels):
+    """轮廓系数和 Calinski-Harabasz 指数（无法计算时为 None）"""
+    silhouette_avg = None
+    calinski_harabasz = None
+    n_labels = len(set(labels))
+
+    try:
+        # 轮廓系数需要至少2个簇且每个簇至少有1个样本，但当每个样本都是单独簇时会失败
+        if n_labels > 1 and len(X) > n_labels:
+            silhouette_avg = float(silhouette_score(X, labels))
+        else:
+            print(f"无法计算轮廓系数: 样本数={len(X)}, 簇数={n_labels}")
+    except Exception as e:
+        print(f"轮廓系数计算失败: {str(e)}")
+
+    try:
+        # Calinski-Harabasz指数需要至少2个簇
+        if n_labels > 1:
+            calinski_harabasz = float(calinski_harabasz_score(X, labels))
+    except Exception as e:
+        print(f"Calinski-Harabasz指数计算失败: {str(e)}")
+
+    return {'silhouette_score': silhouette_avg, 'calinski_harabasz_score': calinski_harabasz}
+
+
+def convex_hulls(X, labels, n_clusters):
+    """为每个簇计算二维凸包；点数不足3个时返回原始点，凸包退化时使用最小包围矩形"""
+    hulls = []
+    for cluster_id in range(n_clusters):
+        cluster_points = X[labels == cluster_id]
+        if len(cluster_points) >= 3:  # 至少需要3个点才能形成凸包
+            try:
+                hull = ConvexHull(cluster_points)
+                hulls.append({
+                    'cluster_id': cluster_id,
+                    'hull_points': cluster_points[hull.vertices].tolist(),
+                    'area': hull.volume
+                })
+            except Exception:
+                min_x, max_x = cluster_points[:, 0].min(), cluster_points[:, 0].max()
+                min_y, max_y = cluster_points[:, 1].min(), cluster_points[:, 1].max()
+                hulls.append({
+                    'cluster_id': cluster_id,
+                    'hull_points': [[min_x, min_y], [max_x, min_y], [max_x, max_y], [min_x, max_y]],
+                    'area': (max_x - min_x) * (max_y - min_y)
+                })
+        else:
+            hulls.append({
+                'cluster_id': cluster_id,
+                'hull_points': cluster_points.tolist(),
+                'area': 0
+            })
+    return hulls
+
+
+def evaluate_k(X, k, random_state=42, large_threshold=LARGE_DATASET_THRESHOLD,
+               silhouette_sample_size=SILHOUETTE_SAMPLE_SIZE):
+    """对单个k运行聚类并计算质量指标"""
+    start = time.perf_counter()
+    large = len(X) > large_threshold
+    if large:
+        model = MiniBatchKMeans(n_clusters=k, random_state=random_state, n_init=3, batch_size=4096)
+    else:
+        model = KMeans(n_clusters=k, random_state=random_state, n_init=10)
+    labels = model.fit_predict(X)
+
+    silhouette = None
+    calinski_harabasz = None
+    n_labels = len(set(labels))
+    if 1 < n_labels < len(X):
+        sample_size = silhouette_sample_size if large and len(X) > silhouette_sample_size else None
+        silhouette = float(silhouette_score(X, labels, sample_size=sample_size, random_state=random_state))
+        calinski_harabasz = float(calinski_harabasz_score(X, labels))
+    return {
+        'k': k,
+        'algorithm': 'MiniBatchKMeans' if large else 'KMeans',
+        'silhouette_score': silhouette,
+        'silhouette_sampled': bool(large and len(X) > silhouette_sample_size),
+        'calinski_harabasz_score': calinski_harabasz,
+        'inertia': float(model.inertia_),
+        'seconds': time.perf_counter() - start
+    }
+
+
+def _evaluate_k_shared(shm_name, shape, dtype, k, options):
+    """进程池任务：从共享内存读取聚类矩阵，避免每个任务复制一份数据"""
+    # spawn 子进程与父进程共用同一个资源跟踪器，共享内存由父进程 unlink 时统一注销
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        X = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        return evaluate_k(X, k, **options)
+    finally:
+        shm.close()
+
+
+def get_pool():
+    """延迟创建的常驻进程池（spawn 方式，避免 fork 已有线程的父进程）；ML_CLUSTER_WORKERS=0 或1时在请求线程内逐个计算"""
+    global _pool, _pool_workers
+    pool = _pool
+    if pool is None:
+        # 多个计算槽可能同时首次请求，加锁后再检查一次，只创建一个进程池
+        with _pool_lock:
+            if _pool is None:
+                workers = int(os.environ.get('ML_CLUSTER_WORKERS', min(4, compute_cores())))
+                if workers <= 1:
+                    return None
+                _pool_workers = workers
+                # 每个工作进程只用1个计算线程，多个k同时计算时线程数不超过进程数
+                _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                            initializer=limit_worker_threads)
+            pool = _pool
+    return pool
+
+
+def shutdown_pool(wait=True):
+    """关闭进程池（服务退出时调用）"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=wait, cancel_futures=True)
+
+
+def sweep_k(X, k_values, parallel=None, **options):
+    """并行评估一组k值，所有任务共享同一份聚类矩阵；parallel 为 None 时按样本数自动决定"""
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    if parallel is None:
+        parallel = len(X) >= PARALLEL_MIN_SAMPLES
+    pool = get_pool() if parallel and len(k_values) > 1 else None
+    if pool is None:
+        return [evaluate_k(X, k, **options) for k in k_values]
+
+    shm = shared_memory.SharedMemory(create=True, size=max(1, X.nbytes))
+    try:
+        np.ndarray(X.shape, dtype=X.dtype, buffer=shm.buf)[:] = X
+        futures = [pool.submit(_evaluate_k_shared, shm.name, X.shape, X.dtype.str, k, options)
+                   for k in k_values]
+        return [future.result() for future in futures]
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def recommend_k(results):
+    """推荐k：轮廓系数最高者（相同时取较小的k）；无轮廓系数时按 Calinski-Harabasz 指数"""
+    scored = [r for r in results if r['silhouette_score'] is not None]
+    if scored:
+        return max(scored, key=lambda r: (r['silhouette_score'], -r['k']))['k']
+    scored = [r for r in results if r['calinski_harabasz_score'] is not None]
+    if scored:
+        return max(scored, key=lambda r: (r['calinski_harabasz_score'], -r['k']))['k']
+    return None
@@ -0,0 +1,270 @@
+"""服务端数据集注册表：上传一次指标矩阵，之后各分析接口通过 dataset_id 引用
+
+每个数据集一个目录：indicators-<版本>.f32（行优先 float32 原始数据，按内存映射读取）+ meta.json（名称、分组、指标名、内容哈希）。
+追加只在文件末尾写入新行，已映射的读者不受影响；修改会写出新版本文件后原子替换元数据，进行中的分析继续使用旧映射。
+"""
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from errors import InputError
+from model_cache import dataset_fingerprint
+from wire import ip_column, ip_count, ip_matrix
+
+try:
+    import fcntl  # 多个 worker 进程写同一数据集时加文件锁（Windows 上只有进程内锁）
+except ImportError:
+    fcntl = None
+
+DEFAULT_DATASET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'datasets')
+
+
+class Dataset:
+    """一个数据集版本的只读视图"""
+
+    def __init__(self, path, meta):
+        self.path = path
+        self.meta = meta
+        self.id = meta['id']
+        self.n_rows = meta['n_rows']
+        self.n_features = meta['n_features']
+        self.names = meta['names']
+        self.groups = meta['groups']
+        self.feature_names = meta['feature_names']
+        self.content_hash = meta['content_hash']
+        self.version = meta['version']
+        data_path = os.path.join(path, meta['data_file'])
+        if self.n_rows:
+            self.X = np.memmap(data_path, dtype=np.float32, mode='r', shape=(self.n_rows, self.n_features))
+        else:
+            self.X = np.empty((0, self.n_features), dtype=np.float32)
+
+    def as_ips(self):
+        """列式 ips（与 wire 的列式请求格式一致），矩阵直接使用内存映射"""
+        return {'project_name': self.names, 'group_name': self.groups, 'indicators': self.X}
+
+    def info(self):
+        return {key: value for key, value in self.meta.items() if key not in ('names', 'groups')}
+
+
+def _validate_rows(X, n_features=None):
+    if n_features is not None and X.shape[1] != n_features:
+        raise InputError(f'指标数量({X.shape[1]})与数据集({n_features})不一致')
+    if not np.isfinite(X).all():
+        raise InputError('指标数据包含 NaN 或无穷值')
+
+
+def _write_atomic(path, content):
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(content, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+class DatasetRegistry:
+    """数据集的创建、追加、修改和读取（同一进程内按元数据修改时间缓存已打开的映射）"""
+
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+        self._open = {}
+
+    def _dir(self, dataset_id):
+        if not isinstance(dataset_id, str) or not dataset_id or not all(c.isalnum() or c in '-_' for c in dataset_id):
+            raise InputError(f'非法的 dataset_id: {dataset_id}')
+        return os.path.join(self.root, dataset_id)
+
+    def _lock_file(self, path):
+        """跨进程写锁，返回需要在写完后关闭的文件对象；数据集已被删除时抛出 KeyError"""
+        try:
+            handle = open(os.path.join(path, '.lock'), 'a')
+        except FileNotFoundError:
+            raise KeyError(os.path.basename(path))
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        return handle
+
+    def _hash(self, X, meta):
+        return dataset_fingerprint(X, meta['feature_names'], 'dataset',
+                                   {'names': meta['names'], 'groups': meta['groups']})
+
+    def create(self, ips, feature_names=None, name=None):
+        if not ips or not ip_count(ips):
+            raise InputError('数据集至少需要一个IP')
+        X = ip_matrix(ips)
+        _validate_rows(X)
+        n_rows, n_features = X.shape
+        if feature_names and len(feature_names) != n_features:
+            raise InputError(f'指标名称数量({len(feature_names)})与指标数量({n_features})不一致')
+        dataset_id = uuid.uuid4().hex[:16]
+        path = self._dir(dataset_id)
+        os.makedirs(path)
+        now = time.time()
+        meta = {
+            'id': dataset_id,
+            'name': name,
+            'n_rows': n_rows,
+            'n_features': n_features,
+            'feature_names': list(feature_names or []),
+            'names': ip_column(ips, 'project_name', lambda i: f'IP{i+1}'),
+            'groups': ip_column(ips, 'group_name', '未知'),
+            'version': 1,
+            'data_file': 'indicators-1.f32',
+            'created_at': now,
+            'updated_at': now
+        }
+        np.ascontiguousarray(X, dtype=np.float32).tofile(os.path.join(path, meta['data_file']))
+        meta['content_hash'] = self._hash(X, meta)
+        _write_atomic(os.path.join(path, 'meta.json'), meta)
+        return self.get(dataset_id)
+
+    def get(self, dataset_id):
+        """返回最新版本的数据集，不存在时返回 None"""
+        path = self._dir(dataset_id)
+        meta_path = os.path.join(path, 'meta.json')
+        try:
+            stat = os.stat(meta_path)
+        except FileNotFoundError:
+            return None
+        # 元数据通过 os.replace 原子替换，每次写入都会得到新的 inode
+        stamp = (stat.st_ino, stat.st_mtime_ns)
+        with self._lock:
+            cached = self._open.get(dataset_id)
+            if cached is not None and cached[0] == stamp:
+                return cached[1]
+        with open(meta_path, encoding='utf-8') as f:
+            dataset = Dataset(path, json.load(f))
+        with self._lock:
+            self._open[dataset_id] = (stamp, dataset)
+        return dataset
+
+    def _require(self, dataset_id):
+        dataset = self.get(dataset_id)
+        if dataset is None:
+            raise KeyError(dataset_id)
+        return dataset
+
+    def append(self, dataset_id, ips):
+        """在末尾追加IP（原地写入，已有行不变）"""
+        path = self._dir(dataset_id)
+        self._require(dataset_id)
+        handle = self._lock_file(path)
+        try:
+            dataset = self._require(dataset_id)
+            if not ips or not ip_count(ips):
+                raise InputError('没有要追加的IP')
+            X_new = ip_matrix(ips)
+            _validate_rows(X_new, dataset.n_features)
+            offset = dataset.n_rows
+            meta = dict(dataset.meta)
+            meta['names'] = dataset.names + ip_column(ips, 'project_name', lambda i: f'IP{offset + i + 1}')
+            meta['groups'] = dataset.groups + ip_column(ips, 'group_name', '未知')
+            data_path = os.path.join(path, meta['data_file'])
+            with open(data_path, 'r+b') as f:
+                # 截断到已登记的长度，丢弃之前失败的追加留下的残余数据
+                f.truncate(offset * dataset.n_features * 4)
+                f.seek(0, os.SEEK_END)
+                np.ascontiguousarray(X_new, dtype=np.float32).tofile(f)
+            meta['n_rows'] = offset + len(X_new)
+            meta['version'] = dataset.version + 1
+            X = np.memmap(data_path, dtype=np.float32, mode='r', shape=(meta['n_rows'], meta['n_features']))
+            return self._commit(path, meta, X)
+        finally:
+            handle.close()
+
+    def patch(self, dataset_id, updates):
+        """按行号或名称修改指标/名称/分组：写出新版本文件后替换，进行中的分析不受影响"""
+        path = self._dir(dataset_id)
+        self._require(dataset_id)
+        handle = self._lock_file(path)
+        try:
+            dataset = self._require(dataset_id)
+            meta = dict(dataset.meta)
+            meta['names'] = list(dataset.names)
+            meta['groups'] = list(dataset.groups)
+            index_by_name = {name: i for i, name in enumerate(dataset.names)}
+            X = np.array(dataset.X, dtype=np.float32)
+            for update in updates:
+                if 'index' in update:
+                    row = int(update['index'])
+                    if not 0 <= row < dataset.n_rows:
+                        raise InputError(f'行号越界: {row}')
+                elif update.get('project_name') in index_by_name:
+                    row = index_by_name[update['project_name']]
+                else:
+                    raise InputError(f'找不到要修改的IP: {update.get("project_name", update)}')
+                if 'indicators' in update:
+                    values = np.asarray(update['indicators'], dtype=np.float32).reshape(1, -1)
+                    _validate_rows(values, dataset.n_features)
+                    X[row] = values[0]
+                if 'new_name' in update:
+                    meta['names'][row] = update['new_name']
+                if 'group_name' in update:
+                    meta['groups'][row] = update['group_name']
+
+            meta['version'] = dataset.version + 1
+            meta['data_file'] = f'indicators-{meta["version"]}.f32'
+            X.tofile(os.path.join(path, meta['data_file']))
+            committed = self._commit(path, meta, X)
+            # 旧版本文件已被替换；在 POSIX 上删除后已建立的映射仍然有效
+            try:
+                os.remove(os.path.join(path, dataset.meta['data_file']))
+            except OSError:
+                pass
+            return committed
+        finally:
+            handle.close()
+
+    def _commit(self, path, meta, X):
+        meta['updated_at'] = time.time()
+        meta['content_hash'] = self._hash(X, meta)
+        _write_atomic(os.path.join(path, 'meta.json'), meta)
+        return self.get(meta['id'])
+
+    def delete(self, dataset_id):
+        path = self._dir(dataset_id)
+        if not os.path.isdir(path):
+            return False
+        # 与追加、修改使用同一把锁，不会删到写了一半的版本
+        try:
+            handle = self._lock_file(path)
+        except KeyError:
+            return False
+        try:
+            shutil.rmtree(path)
+        finally:
+            handle.close()
+        with self._lock:
+            self._open.pop(dataset_id, None)
+        return True
+
+    def list(self):
+        if not os.path.isdir(self.root):
+            return []
+        datasets = [self.get(dataset_id) for dataset_id in sorted(os.listdir(self.root))]
+        return [dataset.info() for dataset in datasets if dataset is not None]
+
+
+def resolve_dataset(data):
+    """请求中带 dataset_id 时，用已存储的数据集替换 ips（未传指标名称时使用数据集的指标名称）"""
+    dataset_id = data.get('dataset_id')
+    if not dataset_id:
+        return data
+    dataset = registry.get(dataset_id)
+    if dataset is None:
+        raise InputError(f'数据集不存在: {dataset_id}')
+    if data.get('ips') and ip_count(data['ips']):
+        raise InputError('dataset_id 与 ips 不能同时提供')
+    resolved = dict(data)
+    resolved['ips'] = dataset.as_ips()
+    if not resolved.get('feature_names'):
+        resolved['feature_names'] = dataset.feature_names
+    return resolved
+
+
+registry = DatasetRegistry(os.environ.get('ML_DATASET_DIR', DEFAULT_DATASET_DIR))
@@ -0,0 +1,87 @@
+"""批量集成训练：K 个 AdvancedNN 副本堆叠权重后一次向量化训练，用于估计预测不确定性"""
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from models import AdvancedNN, fit_model
+
+
+class BatchedAdvancedNN(nn.Module):
+    """K 个独立 AdvancedNN 的堆叠版本
+
+    每层权重形状为 (K, 输入, 输出)，前向用批量矩阵乘法一次算完所有副本；
+    各副本使用不同随机种子初始化，结构与单个 AdvancedNN 完全一致。
+    """
+
+    layer_names = ('fc1', 'fc2', 'fc3', 'fc4')
+
+    def __init__(self, input_size, n_models, seed=0, dropout=0.2):
+        super().__init__()
+        self.n_models = n_models
+        self.dropout = dropout
+        # 只取层结构（meta 设备上不分配内存、不消耗随机数）；初始化用各副本自己的生成器，不改动进程全局的随机状态
+        with torch.device('meta'):
+            template = AdvancedNN(input_size)
+        generators = [torch.Generator().manual_seed(seed + k) for k in range(n_models)]
+        for name in self.layer_names:
+            fan_out, fan_in = getattr(template, name).weight.shape
+            # 与 nn.Linear 默认初始化相同的分布：权重和偏置均为 U(-1/sqrt(输入), 1/sqrt(输入))
+            bound = 1.0 / fan_in ** 0.5
+            weights, biases = [], []
+            for generator in generators:
+                weights.append(torch.empty(fan_in, fan_out).uniform_(-bound, bound, generator=generator))
+                biases.append(torch.empty(1, fan_out).uniform_(-bound, bound, generator=generator))
+            # 权重为 (输入, 输出)，可直接用于 x @ W
+            setattr(self, f'{name}_weight', nn.Parameter(torch.stack(weights)))
+            setattr(self, f'{name}_bias', nn.Parameter(torch.stack(biases)))
+
+    def forward(self, x):
+        """x 为 (n, 输入) 时所有副本共享输入，为 (K, n, 输入) 时逐副本输入；输出 (K, n, 1)"""
+        if x.dim() == 2:
+            x = x.unsqueeze(0).expand(self.n_models, -1, -1)
+        for i, name in enumerate(self.layer_names):
+            x = torch.baddbmm(getattr(self, f'{name}_bias'), x, getattr(self, f'{name}_weight'))
+            if i < len(self.layer_names) - 1:
+                x = F.relu(x)
+                if i < 2:
+                    x = F.dropout(x, self.dropout, self.training)
+        return x
+
+
+def ensemble_criterion(outputs, targets, sample_weights=None):
+    """每个副本各自的 MSE，返回 (K,) 向量
+
+    训练时对其求和反向传播，各副本梯度互不影响；Adam 按元素更新，等价于 K 个独立优化器。
+    sample_weights 为 (K, n) 的自助采样权重，None 表示所有副本使用全部样本。
+    """
+    squared_error = ((outputs - targets.unsqueeze(0)) ** 2).squeeze(-1)
+    if sample_weights is None:
+        return squared_error.mean(dim=1)
+    return (squared_error * sample_weights).sum(dim=1) / sample_weights.sum(dim=1).clamp_min(1e-8)
+
+
+def train_ensemble(model, data, targets, epochs=500, sample_weights=None, **kwargs):
+    """一次性训练所有副本，返回 fit_model 的训练结果（损失为各副本平均值，学习率调度共享）"""
+    return fit_model(model, data, targets, epochs=epochs, criterion=ensemble_criterion,
+                     sample_weights=sample_weights, **kwargs)
+
+
+def bootstrap_weights(n_models, n_samples, seed=0):
+    """为每个副本生成自助采样计数权重 (K, n)"""
+    generator = torch.Generator().manual_seed(seed)
+    indices = torch.randint(0, n_samples, (n_models, n_samples), generator=generator)
+    weights = torch.zeros(n_models, n_samples)
+    weights.scatter_add_(1, indices, torch.ones(n_models, n_samples))
+    return weights
+
+
+def ensemble_statistics(predictions, interval=0.9):
+    """汇总副本预测 (K, n)：均值、标准差、经验分位数区间"""
+    alpha = (1.0 - interval) / 2
+    quantiles = torch.quantile(predictions, torch.tensor([alpha, 1.0 - alpha], dtype=predictions.dtype), dim=0)
+    return {
+        'mean': predictions.mean(dim=0),
+        'std': predictions.std(dim=0, unbiased=predictions.shape[0] > 1),
+        'lower': quantiles[0],
+        'upper': quantiles[1]
+    }
@@ -0,0 +1,9 @@
+"""API通用异常"""
+
+
+class InputError(ValueError):
+    """请求数据不合法，接口应返回 400"""
+
+
+class ServiceBusy(RuntimeError):
+    """计算资源繁忙（排队已满或等待超时），接口应返回 503"""
@@ -0,0 +1,230 @@
+"""无界面的IP评估流程：打分表（ingest 流式导入）→ AHP权重 → 遗传算法评分 → 排名（一级指标得分）→ PCA+KMeans 聚类，
+以及神经网络预测评分和SHAP解释
+
+test.py 的图形界面和 batch_evaluate.py 命令行共用这些函数；不依赖 Tk/Flask，可以在没有桌面环境的服务器上运行。
+torch、sklearn、shap 在用到时才导入。
+"""
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from ahp import evaluate_hierarchy, evaluate_spec, feature_weights
+from errors import InputError
+from genetic import run_genetic_algorithm
+from indicators import FIRST_LEVEL, hierarchy_rollup, resolve_third_names
+from ingest import ingest_file
+
+NAME_COLUMN = 'project_name'
+GROUP_COLUMN = 'group_name'
+OUTPUT_FORMATS = ('csv', 'parquet')
+BAD_ROWS_SUFFIX = '_坏行'
+
+
+def rank_descending(scores):
+    """按得分从高到低排名（1 为最高，同分按出现顺序）"""
+    ranks = np.empty(len(scores), dtype=np.int32)
+    ranks[np.argsort(-np.asarray(scores), kind='stable')] = np.arange(1, len(scores) + 1)
+    return ranks
+
+
+def score_ips(X, feature_names=None, ahp=None, generations=50, seed=None, **ga_options):
+    """AHP层次权重 + 遗传算法评分
+
+    权重按 一级→二级→三级 指标层级合成（未提供判断矩阵时各项同等重要）；指标列无法对应到指标体系时等权。
+    返回权重、加权评分、逐IP适应度标准差（误差条）、排名和遗传算法的完整结果。
+    """
+    X = np.asarray(X, dtype=np.float32)
+    hierarchy = evaluate_spec(ahp) if ahp else evaluate_hierarchy([])
+    weights = feature_weights(hierarchy, feature_names, X.shape[1])
+    if weights is None:
+        weights = np.full(X.shape[1], 1.0 / X.shape[1])
+    genetic = run_genetic_algorithm(X, weights, generations=generations, seed=seed, **ga_options)
+    scores = X @ weights
+    return {
+        'weights': weights,
+        'scores': scores,
+        'errors': genetic['fitness_std'],
+        'ranks': rank_descending(scores),
+        'genetic': genetic,
+        'ahp': hierarchy
+    }
+
+
+def cluster_ips(X, n_clusters=3, seed=42):
+    """标准化后 PCA 降到2维再做 KMeans，返回二维坐标、簇标签和方差解释比例"""
+    from sklearn.cluster import KMeans
+
+    from clustering import prepare_clustering_matrix
+
+    X = np.asarray(X, dtype=np.float64)
+    if len(X) < 2 or X.shape[1] < 2:
+        raise InputError('交叉分析至少需要2个IP和2个指标')
+    n_clusters = min(n_clusters, len(X))
+    coordinates, explained = prepare_clustering_matrix(X)
+    labels = KMeans(n_clusters=n_clusters, random_state=seed, n_init=10).fit_predict(coordinates)
+    return {
+        'coordinates': coordinates,
+        'labels': labels,
+        'n_clusters': n_clusters,
+        'explained_variance_ratio': explained
+    }
+
+
+def train_scoring_model(X, targets=None, epochs=500, seed=0, store=None, feature_names=None, warm_start_epochs=50):
+    """训练评分预测网络并返回 (模型, 预测评分, 目标评分)；未提供目标评分时使用随机目标（0-10）
+
+    提供 store（model_store.ModelStore）时按 指标名称+输入维度 保存为模型线的新版本：
+    与已保存版本的指标矩阵和目标相同（或版本已固定）时直接加载不再训练，只新增/修改了少量IP时从最新版本热启动，
+    只训练 warm_start_epochs 轮。
+    """
+    import torch
+
+    from models import AdvancedNN, fit_model
+
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    random_targets = targets is None
+    if random_targets:
+        targets = np.random.default_rng(seed).random(len(X)) * 10
+    targets = np.asarray(targets, dtype=np.float32).reshape(-1, 1)
+    torch.manual_seed(seed)
+    model = AdvancedNN(X.shape[1])
+    X_tensor = torch.from_numpy(X)
+
+    mode, saved = 'full', None
+    if store is not None:
+        line_id = store.line_id('scoring', feature_names, X.shape[1])
+        mode, _, saved = store.plan(line_id, X)
+        if saved is not None and random_targets:
+            # 随机目标时沿用已保存版本中相同IP的目标，新增IP的目标才重新生成
+            from model_store import reuse_targets
+
+            targets = reuse_targets(saved, X, lambda n: np.random.default_rng(seed).random((n, 1)) * 10)
+            targets = targets.astype(np.float32)
+        elif mode == 'exact' and not np.array_equal(saved['Y'], targets):
+            mode = 'warm_start'
+    if mode in ('exact', 'pinned'):
+        model.load_state_dict(saved['state_dict'])
+    else:
+        if mode == 'warm_start':
+            model.load_state_dict(saved['state_dict'])
+            epochs = min(warm_start_epochs, epochs)
+        training = fit_model(model, X_tensor, torch.from_numpy(targets), epochs=epochs)
+        if store is not None:
+            store.save(line_id, {'kind': 'scoring', 'feature_names': list(feature_names or []),
+                                 'input_size': X.shape[1]}, model.state_dict(), X, targets, training, mode=mode)
+    model.eval()
+    with torch.no_grad():
+        predictions = model(X_tensor).numpy().ravel()
+    return model, predictions, targets.ravel()
+
+
+def explain_scores(X, targets=None, epochs=500, seed=0, explainer='deep'):
+    """训练评分预测网络后计算每个IP每个指标的SHAP值 (IP数, 指标数)"""
+    from explain import explain_model
+
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    if len(X) < 2 or X.shape[1] < 2:
+        raise InputError('SHAP解释至少需要2个IP和2个指标')
+    model, _, _ = train_scoring_model(X, targets, epochs, seed)
+    return explain_model(model, X, explainer=explainer, seed=seed)['shap_values']
+
+
+def evaluate_ips(ips, ahp=None, generations=50, n_clusters=3, seed=0, predict=False, epochs=500):
+    """完整评估流程，返回 (按排名排序的结果表, 运行信息)
+
+    ips 为 ingest.ingest_file 的返回值（names、groups、n_experts、X、feature_names）。
+    结果表每个IP一行：评分、误差、排名、各一级指标得分、簇标签和PCA坐标，predict=True 时附加神经网络预测评分。
+    """
+    X = ips['X']
+    if len(X) < 2:
+        raise InputError('IP数量太少（<2），无法评估')
+    seconds = {}
+    thirds = resolve_third_names(ips.get('feature_names'), X.shape[1])
+
+    start = time.perf_counter()
+    scored = score_ips(X, thirds, ahp, generations, seed)
+    seconds['score'] = time.perf_counter() - start
+    results = pd.DataFrame({
+        NAME_COLUMN: ips['names'],
+        GROUP_COLUMN: ips['groups'],
+        'n_experts': ips.get('n_experts', np.ones(len(X), dtype=np.int64)),
+        'score': scored['scores'],
+        'error': scored['errors'],
+        'final_fitness': scored['genetic']['final_fitness'],
+        'rank': scored['ranks']
+    })
+
+    if thirds is not None:
+        start = time.perf_counter()
+        _, first_scores = hierarchy_rollup(thirds).rollup(X)
+        for j, name in enumerate(FIRST_LEVEL):
+            results[name] = first_scores[:, j]
+        seconds['rollup'] = time.perf_counter() - start
+
+    clusters = None
+    if n_clusters >= 2 and X.shape[1] >= 2:
+        start = time.perf_counter()
+        clusters = cluster_ips(X, n_clusters, seed)
+        results['cluster'] = clusters['labels']
+        results['pc1'] = clusters['coordinates'][:, 0]
+        results['pc2'] = clusters['coordinates'][:, 1]
+        seconds['cluster'] = time.perf_counter() - start
+
+    if predict:
+        start = time.perf_counter()
+        results['predicted_score'] = train_scoring_model(X, epochs=epochs, seed=seed)[1]
+        seconds['predict'] = time.perf_counter() - start
+
+    info = {
+        'n_ips': len(X),
+        'n_features': X.shape[1],
+        'weights': scored['weights'],
+        'generations_run': scored['genetic']['generations_run'],
+        'converged': scored['genetic']['converged'],
+        'overall_cr': scored['ahp']['overall_cr'],
+        'explained_variance_ratio': clusters['explained_variance_ratio'] if clusters else None,
+        'seconds': seconds
+    }
+    return results.sort_values('rank', kind='stable').reset_index(drop=True), info
+
+
+def write_results(results, path):
+    """按扩展名写出结果表：.csv（UTF-8 带 BOM，Excel 可直接打开）或 .parquet（需要 pyarrow 或 fastparquet）"""
+    ext = os.path.splitext(path)[1].lower().lstrip('.')
+    if ext not in OUTPUT_FORMATS:
+        raise InputError(f'不支持的输出格式: {ext}（支持 {", ".join(OUTPUT_FORMATS)}）')
+    if ext == 'parquet':
+        results.to_parquet(path, index=False)
+    else:
+        results.to_csv(path, index=False, encoding='utf-8-sig')
+    return path
+
+
+def evaluate_file(path, output_path, **options):
+    """导入一个打分表、评估并写出结果，返回运行摘要；有坏行时在结果旁写出坏行报告（CSV）"""
+    start = time.perf_counter()
+    ips = ingest_file(path)
+    results, info = evaluate_ips(ips, **options)
+    write_results(results, output_path)
+    bad_rows_path = None
+    if ips['bad_rows']:
+        stem, _ = os.path.splitext(output_path)
+        bad_rows_path = f'{stem}{BAD_ROWS_SUFFIX}.csv'
+        pd.DataFrame({
+            'row': [item['row'] for item in ips['bad_rows']],
+            NAME_COLUMN: [item['project_name'] for item in ips['bad_rows']],
+            'reasons': ['；'.join(item['reasons']) for item in ips['bad_rows']]
+        }).to_csv(bad_rows_path, index=False, encoding='utf-8-sig')
+    return {
+        'input': path,
+        'output': output_path,
+        'n_ips': info['n_ips'],
+        'n_rows': ips['n_rows'],
+        'n_bad': ips['n_bad'],
+        'bad_rows_output': bad_rows_path,
+        'top': results[NAME_COLUMN].iloc[0],
+        'generations_run': info['generations_run'],
+        'seconds': time.perf_counter() - start
+    }
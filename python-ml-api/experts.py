@@ -0,0 +1,278 @@
+"""多专家评分聚合：长格式 (项目, 组别, 专家, 指标, 评分) -> 每个IP每个指标的均值/中位数/截尾均值/可靠度加权均值，并标记异常评分和异常专家
+
+所有统计量按 (IP, 指标) 单元格分组计算：一次 lexsort 排序后用 bincount/searchsorted 得到各单元格的计数、中位数和截尾区间，
+没有逐IP或逐专家的 Python 循环。
+
+异常检测：
+- 小数点错位：评分的10倍与同一单元格的中位数相差不超过 DECIMAL_SHIFT_TOLERANCE（如 8.2 与 87.2）
+- 偏离共识：与单元格中位数（不含小数点错位的评分）的偏差超过 z_threshold 倍稳健标准差（全部残差的 1.4826×MAD）
+- 异常专家：异常评分占其全部评分的比例不低于 expert_outlier_rate，或存在小数点错位
+可靠度加权：专家权重 1/(残差均方 + 稳健方差)，与加权共识交替迭代 reliability_iterations 次。
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from errors import InputError
+from indicators import ALL_THIRD, INDICATOR_PROPERTY_MAP, indicator_for_header
+
+METHODS = ('mean', 'median', 'trimmed', 'reliability')
+DEFAULT_OPTIONS = {
+    'trim': 0.1,
+    'z_threshold': 3.5,
+    'expert_outlier_rate': 0.1,
+    'exclude_outliers': False,
+    'reliability_iterations': 3
+}
+DECIMAL_SHIFT_TOLERANCE = 0.25
+MAX_REPORTED_OUTLIERS = 1000
+
+
+def parse_expert_options(data):
+    """从请求中读取聚合参数（未提供的使用默认值）"""
+    options = dict(DEFAULT_OPTIONS)
+    try:
+        for key in ('trim', 'z_threshold', 'expert_outlier_rate'):
+            options[key] = float(data.get(key, options[key]))
+        options['reliability_iterations'] = int(data.get('reliability_iterations', options['reliability_iterations']))
+        options['exclude_outliers'] = bool(data.get('exclude_outliers', options['exclude_outliers']))
+    except (TypeError, ValueError) as e:
+        raise InputError(f'聚合参数格式错误: {str(e)}')
+    if not 0.0 <= options['trim'] < 0.5:
+        raise InputError('trim 必须在 [0, 0.5) 之间')
+    if options['z_threshold'] <= 0:
+        raise InputError('z_threshold 必须大于0')
+    if options['reliability_iterations'] < 1:
+        raise InputError('reliability_iterations 必须大于0')
+    return options
+
+
+def _cell_order(cell, scores, mask, n_cells):
+    """对 mask 选中的评分按 (单元格, 评分) 排序，返回 (排序后的单元格, 排序后的评分, 各单元格计数, 起始位置)"""
+    cell, scores = cell[mask], scores[mask]
+    order = np.lexsort((scores, cell))
+    counts = np.bincount(cell, minlength=n_cells)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    return cell[order], scores[order], counts, starts
+
+
+def _median(sorted_scores, counts, starts):
+    median = np.full(len(counts), np.nan)
+    has = counts > 0
+    lo = starts[has] + (counts[has] - 1) // 2
+    hi = starts[has] + counts[has] // 2
+    median[has] = (sorted_scores[lo] + sorted_scores[hi]) / 2
+    return median
+
+
+def _divide(numerator, denominator):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(denominator > 0, numerator / np.where(denominator > 0, denominator, 1), np.nan)
+
+
+def aggregate_codes(ip, expert, indicator, scores, n_ips, n_experts, n_indicators, methods=METHODS,
+                    trim=0.1, z_threshold=3.5, expert_outlier_rate=0.1, exclude_outliers=False,
+                    reliability_iterations=3):
+    """按整数编码的长格式评分聚合
+
+    返回各方法的 (n_ips, n_indicators) 矩阵（没有评分的单元格为 NaN）、每个IP的专家数、
+    每条评分的异常标记和中位数参照，以及每位专家的统计量和可靠度。
+    """
+    unknown = set(methods) - set(METHODS)
+    if unknown:
+        raise InputError(f'未知的聚合方法: {", ".join(sorted(unknown))}（可选: {", ".join(METHODS)}）')
+    scores = np.asarray(scores, dtype=np.float64)
+    n_cells = n_ips * n_indicators
+    cell = ip.astype(np.int64) * n_indicators + indicator
+    everything = np.ones(len(scores), dtype=bool)
+
+    # 小数点错位：与同一单元格的中位数比较（只有两条评分时与较高的一条比较）
+    cell_sorted, sorted_scores, counts, starts = _cell_order(cell, scores, everything, n_cells)
+    cell_max = np.full(n_cells, np.nan)
+    cell_max[counts > 0] = sorted_scores[(starts + counts - 1)[counts > 0]]
+    reference = np.where(counts > 2, _median(sorted_scores, counts, starts), cell_max)[cell]
+    decimal_shift = ((counts[cell] > 1) & (scores * 5 < reference)
+                     & (np.abs(scores * 10 - reference) <= DECIMAL_SHIFT_TOLERANCE * reference))
+
+    # 共识中位数和稳健尺度（不含小数点错位的评分）
+    clean = ~decimal_shift
+    _, clean_sorted, clean_counts, clean_starts = _cell_order(cell, scores, clean, n_cells)
+    median = _median(clean_sorted, clean_counts, clean_starts)
+    residual = scores - median[cell]
+    shared = clean & (clean_counts[cell] > 1)
+    deviations = np.abs(residual[shared])
+    deviations = deviations[deviations > 0]
+    scale = 1.4826 * float(np.median(deviations)) if len(deviations) else 0.0
+    if scale == 0.0:
+        scale = max(1e-6, 0.01 * float(np.nanmax(np.abs(scores))) if len(scores) else 1.0)
+    z = np.where(clean, residual / scale, np.nan)
+    outlier = decimal_shift | (np.abs(np.nan_to_num(z)) > z_threshold)
+
+    used = ~outlier if exclude_outliers else everything
+    if used is not everything:
+        cell_sorted, sorted_scores, counts, starts = _cell_order(cell, scores, used, n_cells)
+    used_cell, used_scores, used_expert = cell[used], scores[used], expert[used]
+
+    aggregates = {}
+    if 'mean' in methods:
+        aggregates['mean'] = _divide(np.bincount(used_cell, weights=used_scores, minlength=n_cells), counts)
+    if 'median' in methods:
+        aggregates['median'] = _median(sorted_scores, counts, starts)
+    if 'trimmed' in methods:
+        # 每个单元格两端各去掉 floor(trim × 评分数) 个评分
+        k = np.floor(trim * counts).astype(np.int64)
+        rank = np.arange(len(cell_sorted)) - starts[cell_sorted]
+        keep = (rank >= k[cell_sorted]) & (rank < (counts - k)[cell_sorted])
+        aggregates['trimmed'] = _divide(np.bincount(cell_sorted[keep], weights=sorted_scores[keep], minlength=n_cells),
+                                        counts - 2 * k)
+
+    # 可靠度：专家残差均方越小权重越大；与加权共识交替迭代
+    weights = np.ones(n_experts)
+    consensus = median if not exclude_outliers else _median(sorted_scores, counts, starts)
+    # 残差按专家的全部评分计算（exclude_outliers 时被排除的异常评分仍计入该专家的可靠度），共识只用保留的评分
+    for _ in range(reliability_iterations):
+        deviation = scores - consensus[cell]
+        known = ~np.isnan(deviation)
+        mean_squared = _divide(np.bincount(expert[known], weights=deviation[known] ** 2, minlength=n_experts),
+                               np.bincount(expert[known], minlength=n_experts))
+        weights = 1.0 / (np.nan_to_num(mean_squared) + scale ** 2)
+        entry_weights = weights[used_expert]
+        consensus = _divide(np.bincount(used_cell, weights=entry_weights * used_scores, minlength=n_cells),
+                            np.bincount(used_cell, weights=entry_weights, minlength=n_cells))
+    if 'reliability' in methods:
+        aggregates['reliability'] = consensus
+    scored_experts = np.bincount(expert, minlength=n_experts) > 0
+    reliability = weights / weights[scored_experts].mean() if scored_experts.any() else weights
+
+    n_scores = np.bincount(expert, minlength=n_experts)
+    n_outliers = np.bincount(expert, weights=outlier, minlength=n_experts).astype(np.int64)
+    n_shifted = np.bincount(expert, weights=decimal_shift, minlength=n_experts).astype(np.int64)
+    outlier_rate = _divide(n_outliers, n_scores)
+    # 每个IP的专家数：该IP出现过的不同专家
+    pairs = np.unique(ip.astype(np.int64) * n_experts + expert)
+    return {
+        'aggregates': {method: values.reshape(n_ips, n_indicators) for method, values in aggregates.items()},
+        'n_experts': np.bincount(pairs // n_experts, minlength=n_ips),
+        'median': median,
+        'z': z,
+        'outlier': outlier,
+        'decimal_shift': decimal_shift,
+        'scale': scale,
+        'expert_stats': {
+            'n_scores': n_scores,
+            'n_outliers': n_outliers,
+            'n_decimal_shift': n_shifted,
+            'outlier_rate': outlier_rate,
+            'mean_abs_deviation': _divide(np.bincount(expert, weights=np.abs(residual), minlength=n_experts),
+                                          n_scores),
+            'reliability': reliability,
+            'flagged': (outlier_rate >= expert_outlier_rate) | (n_shifted > 0)
+        }
+    }
+
+
+def _encode_ips(projects, groups):
+    return pd.factorize(pd.MultiIndex.from_arrays([
+        pd.Series(projects, dtype=object).fillna('').astype(str),
+        pd.Series(groups, dtype=object).fillna('未知').astype(str)
+    ]), sort=False)
+
+
+def _encode_experts(experts):
+    return pd.factorize(pd.Series(experts, dtype=object).fillna('').astype(str), sort=False)
+
+
+def _encode_indicators(labels):
+    """指标名称 -> (按指标体系标准顺序排列的三级指标, 每个名称的指标编号)；同一指标的不同写法合并"""
+    thirds = [indicator_for_header(str(label)) for label in labels]
+    unknown = [str(label) for label, third in zip(labels, thirds) if third is None]
+    if unknown:
+        raise InputError(f'无法识别的指标: {", ".join(unknown[:5])}')
+    present = [third for third in ALL_THIRD if third in set(thirds)]
+    position = {third: j for j, third in enumerate(present)}
+    return present, np.array([position[third] for third in thirds], dtype=np.int64)
+
+
+def _aggregate_encoded(ip_codes, ip_keys, expert_codes, expert_names, indicator_codes, present, scores, methods,
+                       options, start):
+    result = aggregate_codes(ip_codes, expert_codes, indicator_codes, scores, len(ip_keys), len(expert_names),
+                             len(present), methods, **options)
+    outlier_rows = np.flatnonzero(result['outlier'])
+    reported = outlier_rows[:MAX_REPORTED_OUTLIERS]
+    return {
+        'names': [name for name, _ in ip_keys],
+        'groups': [group for _, group in ip_keys],
+        'n_experts': result['n_experts'],
+        'aggregates': result['aggregates'],
+        'indicators': present,
+        'feature_names': [INDICATOR_PROPERTY_MAP[third] for third in present],
+        'experts': {'expert': list(expert_names), **result['expert_stats']},
+        'outliers': {
+            'project_name': [ip_keys[i][0] for i in ip_codes[reported]],
+            'group_name': [ip_keys[i][1] for i in ip_codes[reported]],
+            'expert': [expert_names[i] for i in expert_codes[reported]],
+            'indicator': [present[j] for j in indicator_codes[reported]],
+            'score': scores[reported],
+            'median': result['median'][ip_codes[reported] * len(present) + indicator_codes[reported]],
+            'z': result['z'][reported],
+            'decimal_shift': result['decimal_shift'][reported]
+        },
+        'n_scores': len(scores),
+        'n_outliers': len(outlier_rows),
+        'scale': result['scale'],
+        'seconds': time.perf_counter() - start
+    }
+
+
+def aggregate_scores(projects, groups, experts, indicators, scores, methods=METHODS, **options):
+    """按名称的长格式评分聚合（indicator 为三级指标中文名或英文属性名）
+
+    返回 ips（名称、组别、专家数）、各方法的聚合矩阵（列为 feature_names，按指标体系标准顺序）、
+    专家统计表和异常评分列表（最多 MAX_REPORTED_OUTLIERS 条，n_outliers 为总数）。
+    """
+    start = time.perf_counter()
+    n = len(scores)
+    if not n:
+        raise InputError('没有评分数据')
+    if not all(len(column) == n for column in (projects, groups, experts, indicators)):
+        raise InputError('project_name、group_name、expert、indicator、score 的长度必须一致')
+    scores = pd.to_numeric(pd.Series(np.asarray(scores, dtype=object)), errors='coerce').to_numpy(dtype=np.float64)
+    if np.isnan(scores).any():
+        raise InputError(f'第{int(np.flatnonzero(np.isnan(scores))[0]) + 1}条评分不是数值')
+
+    ip_codes, ip_keys = _encode_ips(projects, groups)
+    expert_codes, expert_names = _encode_experts(experts)
+    label_codes, labels = pd.factorize(pd.Series(indicators, dtype=object).astype(str), sort=False)
+    present, label_indicator = _encode_indicators(labels)
+    return _aggregate_encoded(ip_codes, ip_keys, expert_codes, expert_names, label_indicator[label_codes], present,
+                              scores, methods, options, start)
+
+
+def aggregate_rows(names, groups, experts, X, feature_names, methods=METHODS, **options):
+    """每位专家一行的宽格式（ingest 的 aggregate='none' 结果）聚合，返回值同 aggregate_scores
+
+    名称只在行级别编码一次，再按指标数展开为长格式编号，不生成逐条评分的字符串。
+    """
+    start = time.perf_counter()
+    X = np.asarray(X, dtype=np.float64)
+    n, d = X.shape
+    if not n:
+        raise InputError('没有评分数据')
+    if len(feature_names) != d:
+        raise InputError(f'指标名称数量({len(feature_names)})与指标数量({d})不一致')
+    if np.isnan(X).any():
+        raise InputError(f'第{int(np.argwhere(np.isnan(X))[0][0]) + 1}行评分不是数值')
+    ip_codes, ip_keys = _encode_ips(names, groups)
+    expert_codes, expert_names = _encode_experts(experts)
+    present, column_indicator = _encode_indicators(feature_names)
+    return _aggregate_encoded(np.repeat(ip_codes, d), ip_keys, np.repeat(expert_codes, d), expert_names,
+                              np.tile(column_indicator, n), present, X.ravel(), methods, options, start)
+
+
+def aggregate_wide(names, groups, experts, X, feature_names, method='mean', **options):
+    """宽格式按一种方法聚合 -> (名称, 组别, 专家数, float32 聚合矩阵, 完整结果)；列顺序与 feature_names 一致"""
+    result = aggregate_rows(names, groups, experts, X, feature_names, methods=(method,), **options)
+    _, column_indicator = _encode_indicators(feature_names)
+    matrix = result['aggregates'][method][:, column_indicator].astype(np.float32)
+    return result['names'], result['groups'], result['n_experts'], matrix, result
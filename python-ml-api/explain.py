@@ -0,0 +1,105 @@
+"""有界开销的SHAP解释：固定规模的背景集、分块解释、批量预测，并支持时间/样本预算"""
+import time
+
+import numpy as np
+import shap
+import torch
+from sklearn.cluster import KMeans
+from sklearn.linear_model import LinearRegression
+
+EXPLAINERS = ('deep', 'gradient', 'linear')
+BACKGROUND_METHODS = ('kmeans', 'sample')
+
+
+def summarize_background(X, size=100, method='kmeans', seed=0):
+    """将背景数据压缩为固定规模：k-means 聚类中心或随机抽样"""
+    if len(X) <= size:
+        return X
+    if method == 'kmeans':
+        kmeans = KMeans(n_clusters=size, random_state=seed, n_init=1).fit(X)
+        return kmeans.cluster_centers_.astype(np.float32)
+    rng = np.random.default_rng(seed)
+    return X[rng.choice(len(X), size=size, replace=False)]
+
+
+def _normalize_shap_output(values):
+    """统一不同 shap 版本的输出形状为 (样本数, 特征数)"""
+    if isinstance(values, list):
+        values = values[0]
+    values = np.asarray(values)
+    if values.ndim == 3 and values.shape[-1] == 1:
+        values = values[..., 0]
+    return values
+
+
+def _build_explainer(kind, model, background, X):
+    """构建解释器；linear 模式以线性代理模型拟合网络输出，得到精确的线性SHAP值"""
+    if kind == 'deep':
+        return shap.DeepExplainer(model, torch.from_numpy(background)), None
+    if kind == 'gradient':
+        return shap.GradientExplainer(model, torch.from_numpy(background)), None
+    with torch.no_grad():
+        targets = model(torch.from_numpy(X)).numpy().ravel()
+    surrogate = LinearRegression().fit(X, targets)
+    info = {'surrogate_r2': float(surrogate.score(X, targets))}
+    return shap.LinearExplainer(surrogate, background), info
+
+
+def explain_model(model, X, explainer='deep', background_size=100, background_method='kmeans',
+                  chunk_size=256, max_samples=None, time_budget=None, seed=0):
+    """解释模型预测
+
+    X 为 (n, d) float32 数组。max_samples 限制被解释的样本数（随机抽取），
+    time_budget（秒）到达后停止处理剩余分块（第一块总会解释，结果不会为空）；未解释样本的SHAP值为 None。
+    返回 shap_values (n, d，未解释行为NaN)、predictions、explained_mask 及运行信息。
+    """
+    if explainer not in EXPLAINERS:
+        raise ValueError(f'不支持的解释器: {explainer}，可选: {list(EXPLAINERS)}')
+    if background_method not in BACKGROUND_METHODS:
+        raise ValueError(f'不支持的背景集方法: {background_method}，可选: {list(BACKGROUND_METHODS)}')
+    start = time.perf_counter()
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    n_samples, n_features = X.shape
+
+    model.eval()
+    with torch.no_grad():
+        predictions = model(torch.from_numpy(X)).numpy().ravel()  # 一次批量前向得到全部预测值
+
+    background = summarize_background(X, background_size, background_method, seed)
+    shap_explainer, extra_info = _build_explainer(explainer, model, background, X)
+
+    order = np.arange(n_samples)
+    if max_samples is not None and max_samples < n_samples:
+        order = np.sort(np.random.default_rng(seed).choice(n_samples, size=max_samples, replace=False))
+
+    shap_values = np.full((n_samples, n_features), np.nan, dtype=np.float32)
+    explained_mask = np.zeros(n_samples, dtype=bool)
+    budget_exhausted = False
+    for chunk_start in range(0, len(order), chunk_size):
+        # 背景集和解释器构建可能已用完预算，第一块仍然解释，保证至少有一部分结果
+        if chunk_start and time_budget is not None and time.perf_counter() - start > time_budget:
+            budget_exhausted = True
+            break
+        rows = order[chunk_start:chunk_start + chunk_size]
+        chunk = X[rows]
+        values = shap_explainer.shap_values(chunk if explainer == 'linear' else torch.from_numpy(chunk))
+        shap_values[rows] = _normalize_shap_output(values).reshape(len(rows), n_features)
+        explained_mask[rows] = True
+
+    info = {
+        'explainer': explainer,
+        'background_size': int(len(background)),
+        'background_method': background_method if len(background) < n_samples else 'full',
+        'explained_samples': int(explained_mask.sum()),
+        'total_samples': int(n_samples),
+        'budget_exhausted': budget_exhausted,
+        'elapsed_seconds': time.perf_counter() - start
+    }
+    if extra_info:
+        info.update(extra_info)
+    return {
+        'shap_values': shap_values,
+        'predictions': predictions,
+        'explained_mask': explained_mask,
+        'info': info
+    }
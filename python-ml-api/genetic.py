@@ -0,0 +1,171 @@
+"""向量化遗传算法引擎：锦标赛选择、算术交叉、高斯变异和精英保留，整个种群的适应度每代一次矩阵-向量乘积
+
+初始种群为IP指标矩阵（每个IP一个个体）。每代第 i 个位置的个体由后代替换，精英保留在原位置，
+因此 fitness_history[:, i] 可以按IP绘制（与原 genetic_algorithm_per_ip 的输出形状一致）。
+最优适应度连续 patience 代没有提升时提前终止。
+"""
+import time
+
+import numpy as np
+
+from errors import InputError
+
+DEFAULT_OPTIONS = {
+    'generations': 50,
+    'elite_fraction': 0.1,
+    'tournament_size': 3,
+    'crossover_rate': 0.9,
+    'mutation_rate': 0.05,
+    'mutation_scale': 0.1,
+    'tol': 1e-6,
+    'patience': 20,
+    'seed': None
+}
+
+
+def parse_ga_options(data):
+    """从请求中读取遗传算法参数（未提供的使用默认值）"""
+    options = dict(DEFAULT_OPTIONS)
+    try:
+        for key in ('generations', 'tournament_size', 'patience'):
+            options[key] = int(data.get(key, options[key]))
+        for key in ('elite_fraction', 'crossover_rate', 'mutation_rate', 'mutation_scale', 'tol'):
+            options[key] = float(data.get(key, options[key]))
+        if data.get('seed') is not None:
+            options['seed'] = int(data['seed'])
+    except (TypeError, ValueError) as e:
+        raise InputError(f'遗传算法参数格式错误: {str(e)}')
+
+    if not 1 <= options['generations'] <= 100000:
+        raise InputError('generations 必须在 1 到 100000 之间')
+    if options['tournament_size'] < 1:
+        raise InputError('tournament_size 必须大于0')
+    if options['patience'] < 0:
+        raise InputError('patience 不能为负数（0 表示不提前终止）')
+    for key in ('elite_fraction', 'crossover_rate', 'mutation_rate'):
+        if not 0.0 <= options[key] <= 1.0:
+            raise InputError(f'{key} 必须在 0 到 1 之间')
+    if options['mutation_scale'] < 0:
+        raise InputError('mutation_scale 不能为负数')
+    return options
+
+
+def _bounds(value, default, n_features, name):
+    """指标上下界：单个数值（所有指标相同）或每个指标一个数值"""
+    if value is None:
+        return default
+    try:
+        bounds = np.broadcast_to(np.asarray(value, dtype=np.float32), (n_features,))
+    except (TypeError, ValueError):
+        raise InputError(f'{name} 必须是一个数值或 {n_features} 个数值的列表（与指标数量一致）')
+    if not np.all(np.isfinite(bounds)):
+        raise InputError(f'{name} 必须是有限数值')
+    return np.ascontiguousarray(bounds)
+
+
+def run_genetic_algorithm(X, weights, generations=50, elite_fraction=0.1, tournament_size=3,
+                          crossover_rate=0.9, mutation_rate=0.05, mutation_scale=0.1,
+                          lower=None, upper=None, tol=1e-6, patience=20, seed=None, record_history=True):
+    """以IP指标矩阵为初始种群运行遗传算法
+
+    适应度为指标的加权线性组合；变异后的基因裁剪到 [lower, upper]（默认各指标的观测范围）。
+    record_history=False 时不保存逐代逐IP的适应度矩阵（大规模数据时节省内存），只保留每代统计量。
+    """
+    start = time.perf_counter()
+    population = np.array(X, dtype=np.float32)
+    if population.ndim != 2 or population.size == 0:
+        raise InputError('种群必须是非空的二维指标矩阵')
+    if generations < 1:
+        raise InputError('generations 必须大于0')
+    n, d = population.shape
+    w = np.asarray(weights, dtype=np.float32).reshape(-1)
+    if len(w) != d:
+        raise InputError(f'权重数量({len(w)})与指标数量({d})不一致')
+    lower = _bounds(lower, population.min(axis=0), d, 'lower')
+    upper = _bounds(upper, population.max(axis=0), d, 'upper')
+    if np.any(lower > upper):
+        raise InputError('指标下界不能大于上界')
+
+    rng = np.random.default_rng(seed)
+    n_elite = min(n, int(round(elite_fraction * n)))
+    tournament_size = min(tournament_size, n)
+    history = np.empty((generations, n), dtype=np.float32) if record_history else None
+    best = np.empty(generations)
+    mean = np.empty(generations)
+    std = np.empty(generations)
+    # 逐IP位置的适应度一阶/二阶累计量，用于误差条（不需要保存完整历史）
+    fitness_sum = np.zeros(n)
+    fitness_sq_sum = np.zeros(n)
+
+    fitness = population @ w
+    initial_fitness = fitness.copy()
+    converged = False
+    stall = 0
+    for g in range(generations):
+        if history is not None:
+            history[g] = fitness
+        best[g] = fitness.max()
+        mean[g] = fitness.mean()
+        std[g] = fitness.std()
+        fitness_sum += fitness
+        fitness_sq_sum += np.square(fitness, dtype=np.float64)
+        if g == generations - 1:
+            break
+        if g > 0:
+            stall = stall + 1 if best[g] - best[g - 1] <= tol * max(1.0, abs(best[g - 1])) else 0
+            if patience and stall >= patience:
+                converged = True
+                break
+
+        # 锦标赛选择：每个后代的两个父代各取 tournament_size 个随机个体中适应度最高者
+        winners = rng.integers(0, n, 2 * n)
+        for _ in range(tournament_size - 1):
+            contenders = rng.integers(0, n, 2 * n)
+            winners = np.where(fitness[contenders] > fitness[winners], contenders, winners)
+        parents_a = np.take(population, winners[:n], axis=0)
+        parents_b = np.take(population, winners[n:], axis=0)
+
+        # 算术交叉：child = α·a + (1-α)·b，未发生交叉的后代直接复制父代 a
+        alpha = rng.random(n, dtype=np.float32)
+        alpha[rng.random(n) >= crossover_rate] = 1.0
+        children = parents_a
+        children -= parents_b
+        children *= alpha[:, None]
+        children += parents_b
+
+        # 高斯变异：只为被选中的基因生成随机数（变异率低时远少于 n×d）；
+        # 交叉结果是两个界内父代的凸组合，只有变异后的基因需要裁剪
+        n_mutations = rng.binomial(n * d, mutation_rate)
+        if n_mutations and mutation_scale > 0:
+            genes = children.reshape(-1)
+            positions = rng.integers(0, n * d, n_mutations)
+            columns = positions % d
+            mutated = genes[positions] + rng.normal(0.0, mutation_scale, n_mutations).astype(np.float32)
+            genes[positions] = np.clip(mutated, lower[columns], upper[columns])
+
+        # 精英保留：本代适应度最高的个体原样留在原位置
+        if n_elite:
+            elite = np.argpartition(fitness, n - n_elite)[n - n_elite:]
+            children[elite] = population[elite]
+
+        population = children
+        fitness = population @ w
+
+    generations_run = g + 1
+    fitness_mean = fitness_sum / generations_run
+    fitness_std = np.sqrt(np.maximum(fitness_sq_sum / generations_run - fitness_mean ** 2, 0.0))
+    best_index = int(fitness.argmax())
+    return {
+        'fitness_history': history[:generations_run] if history is not None else None,
+        'best_fitness': best[:generations_run],
+        'mean_fitness': mean[:generations_run],
+        'std_fitness': std[:generations_run],
+        'initial_fitness': initial_fitness,
+        'final_fitness': fitness,
+        'fitness_std': fitness_std,
+        'best_individual': population[best_index],
+        'population': population,
+        'generations_run': generations_run,
+        'converged': converged,
+        'seconds': time.perf_counter() - start
+    }
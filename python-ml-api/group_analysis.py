@@ -0,0 +1,204 @@
+"""按组别（县）并行分析：一次分组后，每个组别独立完成 评分 → 标准化+PCA → KMeans 聚类 → 指标重要性，并给出跨组别比较
+
+各组别的任务在常驻进程池中并行执行（spawn 方式，每个工作进程的计算线程数为1，避免多个组别同时计算时线程过量）；
+AHP 权重在父进程中只计算一次，所有组别共用，因此各组别的评分可以直接比较。
+跨组别比较（组别均值、一级指标均值、组间差异F值、全部IP的总排名）在父进程中按分组编号向量化计算。
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from errors import InputError
+from evaluation import rank_descending
+from indicators import hierarchy_rollup
+from scheduler import compute_cores, limit_worker_threads
+
+DEFAULT_OPTIONS = {
+    'generations': 50,
+    'n_clusters': 3,
+    'seed': 0,
+    'importance_strategy': 'mean'
+}
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def partition_groups(groups):
+    """一次分组：组别名 -> (组别列表（按首次出现顺序）, 每个IP的组别编号, 每个组别的行索引列表)"""
+    codes, keys = pd.factorize(pd.Series(groups, dtype=object).fillna('未知').astype(str), sort=False)
+    order = np.argsort(codes, kind='stable')
+    bounds = np.cumsum(np.bincount(codes, minlength=len(keys)))[:-1]
+    return list(keys), codes, np.split(order, bounds)
+
+
+def analyze_group(X, weights, thirds=None, generations=50, n_clusters=3, seed=0, importance_strategy='mean'):
+    """单个组别的分析（进程池任务）：评分和误差条、组内排名、PCA坐标和聚类、指标重要性"""
+    import torch
+
+    from clustering import cluster_quality
+    from evaluation import cluster_ips
+    from genetic import run_genetic_algorithm
+    from importance import compute_feature_importance, normalize_importance
+
+    start = time.perf_counter()
+    X = np.asarray(X, dtype=np.float32)
+    genetic = run_genetic_algorithm(X, weights, generations=generations, seed=seed, record_history=False)
+    scores = X @ weights
+    result = {
+        'scores': scores,
+        'errors': genetic['fitness_std'],
+        'ranks': rank_descending(scores),
+        'generations_run': genetic['generations_run'],
+        'warnings': []
+    }
+    if thirds is not None:
+        result['first_level'] = hierarchy_rollup(thirds).rollup(X)[1]
+
+    if len(X) >= 2 and X.shape[1] >= 2:
+        clusters = cluster_ips(X, min(n_clusters, len(X)), seed)
+        result.update({
+            'coordinates': clusters['coordinates'],
+            'clusters': clusters['labels'],
+            'n_clusters': clusters['n_clusters'],
+            'explained_variance_ratio': clusters['explained_variance_ratio'],
+            'quality': cluster_quality(clusters['coordinates'], clusters['labels'])
+        })
+    else:
+        result['warnings'].append('IP数量少于2个，跳过PCA和聚类')
+
+    # 指标重要性：扰动各指标后组内评分的平均变化
+    w = torch.from_numpy(np.asarray(weights, dtype=np.float32)).reshape(-1, 1)
+    importance = compute_feature_importance(lambda batch: batch @ w, torch.from_numpy(X), importance_strategy,
+                                            seed=seed)
+    result['importance'] = normalize_importance(importance['importance'])
+    result['raw_importance'] = importance['importance']
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def get_pool():
+    """延迟创建的常驻进程池；ML_GROUP_WORKERS=0 或1时在请求线程内逐个组别计算"""
+    global _pool, _pool_workers
+    pool = _pool
+    if pool is None:
+        # 并发的首次请求加锁后再检查一次，只创建一个进程池
+        with _pool_lock:
+            if _pool is None:
+                workers = int(os.environ.get('ML_GROUP_WORKERS', min(4, compute_cores())))
+                if workers <= 1:
+                    return None
+                _pool_workers = workers
+                _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                            initializer=limit_worker_threads)
+            pool = _pool
+    return pool
+
+
+def shutdown_pool(wait=True):
+    """关闭进程池（服务退出时调用）"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=wait, cancel_futures=True)
+
+
+def compare_groups(codes, n_groups, X, scores, first_level=None):
+    """跨组别比较（按组别编号向量化）：IP数、评分均值/标准差/最高分、组别排名、各指标和一级指标的组别均值，
+    以及每个指标的组间差异 F 值（单因素方差分析，组间均方/组内均方）"""
+    X = np.asarray(X, dtype=np.float64)
+    counts = np.bincount(codes, minlength=n_groups)
+    mean_score = np.bincount(codes, weights=scores, minlength=n_groups) / counts
+    variance = np.bincount(codes, weights=(scores - mean_score[codes]) ** 2, minlength=n_groups) / counts
+    # 每个组别评分最高的IP（同分取首次出现）：按 (组别, 评分降序) 排序后取每组第一个
+    order = np.lexsort((-scores, codes))
+    best = order[np.concatenate(([0], np.cumsum(counts)[:-1]))]
+
+    sums = np.zeros((n_groups, X.shape[1]))
+    np.add.at(sums, codes, X)
+    group_means = sums / counts[:, None]
+    between = (counts[:, None] * (group_means - X.mean(axis=0)) ** 2).sum(axis=0)
+    within = ((X - group_means[codes]) ** 2).sum(axis=0)
+    df_between, df_within = n_groups - 1, len(X) - n_groups
+    with np.errstate(divide='ignore', invalid='ignore'):
+        f = np.where(within > 0, (between / max(df_between, 1)) / (within / max(df_within, 1)), np.nan)
+    if df_between < 1 or df_within < 1:
+        f = np.full(X.shape[1], np.nan)
+
+    comparison = {
+        'n_ips': counts,
+        'mean_score': mean_score,
+        'std_score': np.sqrt(variance),
+        'max_score': scores[best],
+        'best_index': best,
+        'rank': rank_descending(mean_score),
+        'mean_indicators': group_means,
+        'f_statistic': f
+    }
+    if first_level is not None:
+        first_sums = np.zeros((n_groups, first_level.shape[1]))
+        np.add.at(first_sums, codes, first_level)
+        comparison['first_level'] = first_sums / counts[:, None]
+    return comparison
+
+
+def analyze_groups(X, groups, weights, thirds=None, selected=None, parallel=None, **options):
+    """按组别分析全部IP
+
+    selected 为要分析的组别列表（默认全部）；parallel 为 None 时有进程池且多于1个组别时并行。
+    返回 组别列表、每个IP的组别编号、每个组别的结果（或 error）、跨组别比较、全部IP的总排名和运行信息。
+    """
+    start = time.perf_counter()
+    options = {**DEFAULT_OPTIONS, **options}
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    names, codes, members = partition_groups(groups)
+    if selected:
+        unknown = [group for group in selected if group not in names]
+        if unknown:
+            raise InputError(f'组别不存在: {", ".join(map(str, unknown))}')
+        keep = np.isin(codes, [names.index(group) for group in selected])
+        names, codes, members = partition_groups(np.asarray(groups, dtype=object)[keep])
+        X = X[keep]
+    else:
+        keep = None
+    weights = np.asarray(weights, dtype=np.float32)
+
+    pool = get_pool() if parallel is not False and len(names) > 1 else None
+    use_pool = pool is not None
+    if use_pool:
+        futures = [pool.submit(analyze_group, X[index], weights, thirds, **options) for index in members]
+        tasks = [future.result for future in futures]
+    else:
+        tasks = [lambda index=index: analyze_group(X[index], weights, thirds, **options) for index in members]
+    # 单个组别的输入错误记录在该组别的 error 中，不影响其它组别
+    results = []
+    for task in tasks:
+        try:
+            results.append(task())
+        except InputError as e:
+            results.append({'error': str(e)})
+
+    scores = X @ weights
+    first_level = None
+    if thirds is not None:
+        first_level = hierarchy_rollup(thirds).rollup(X)[1]
+    return {
+        'groups': names,
+        'codes': codes,
+        'members': members,
+        'kept': keep,
+        'results': results,
+        'comparison': compare_groups(codes, len(names), X, scores.astype(np.float64), first_level),
+        'scores': scores,
+        'overall_ranks': rank_descending(scores),
+        'parallel': use_pool,
+        'workers': _pool_workers if use_pool else 1,
+        'seconds': time.perf_counter() - start
+    }
@@ -0,0 +1,46 @@
+"""生产环境 gunicorn 配置：gunicorn -c gunicorn.conf.py app:app
+
+preload_app 在 fork 之前导入 app，on_starting 预加载 torch / sklearn / shap 等重型依赖，各 worker 以写时复制方式共享这些内存页；
+进程池和线程池都是延迟创建的，fork 之前不会启动任何线程。每个 worker 在开始接收请求前执行一次预热（只预热本进程，不启动进程池）。
+"""
+import os
+
+bind = os.environ.get('ML_API_BIND', '0.0.0.0:5001')
+workers = int(os.environ.get('ML_API_WORKERS', min(4, os.cpu_count() or 1)))
+threads = int(os.environ.get('ML_API_THREADS', 4))
+# 计算调度和各进程池按每个 worker 分到的核数确定大小（见 scheduler.py）
+os.environ.setdefault('ML_COMPUTE_CORES', str(max(1, (os.cpu_count() or 1) // workers)))
+worker_class = 'gthread'
+preload_app = True
+# 同步训练请求可能持续数分钟
+timeout = int(os.environ.get('ML_API_TIMEOUT', 600))
+graceful_timeout = int(os.environ.get('ML_API_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+accesslog = '-'
+
+
+def on_starting(server):
+    """master 进程在加载 app 之前导入重型依赖，fork 后各 worker 共享"""
+    import serving
+    serving.preload_modules()
+    server.log.info(f'重型依赖预加载完成: {serving.readiness()["import_seconds"]}')
+
+
+def post_worker_init(worker):
+    """worker 初始化完成、开始接收请求之前执行预热"""
+    import serving
+    if os.environ.get('ML_API_WARMUP', '1') == '0':
+        serving.mark_ready()
+        return
+    try:
+        timings = serving.prepare(worker.wsgi)
+        worker.log.info(f'worker {worker.pid} 预热完成: {timings}')
+    except Exception as e:
+        # 预热失败不阻止服务启动，首个请求会承担初始化开销
+        serving.mark_ready()
+        worker.log.warning(f'worker {worker.pid} 预热失败: {str(e)}')
+
+
+def worker_exit(server, worker):
+    import serving
+    serving.shutdown(wait=True)
@@ -0,0 +1,173 @@
+"""评估历史：每次评估追加写入 SQLite（摘要列 + 压缩的 npz 数组），内存中只保留最近读取的少量记录（LRU）
+
+列表按页只读取摘要列，不解压数组；对比两次评估时只读取这两条记录。
+超过 max_runs 条时删除最早的记录，长时间运行时磁盘和内存占用都有上限。
+"""
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from errors import InputError
+from model_cache import ModelCache
+
+DEFAULT_HISTORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'history', 'evaluations.sqlite')
+SUMMARY_KEYS = ('id', 'created_at', 'label', 'n_ips', 'n_features', 'generations', 'best_name', 'best_score',
+                'mean_score')
+_SUMMARY_COLUMNS = ', '.join(SUMMARY_KEYS)
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    label TEXT NOT NULL,
+    n_ips INTEGER NOT NULL,
+    n_features INTEGER NOT NULL,
+    generations INTEGER NOT NULL,
+    best_name TEXT,
+    best_score REAL,
+    mean_score REAL,
+    names TEXT NOT NULL,
+    group_names TEXT NOT NULL,
+    arrays BLOB NOT NULL
+)
+'''
+
+
+def _pack(arrays):
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def _unpack(blob):
+    with np.load(io.BytesIO(blob)) as archive:
+        return {key: archive[key] for key in archive.files}
+
+
+def _summary(run):
+    return {key: run[key] for key in SUMMARY_KEYS}
+
+
+class EvaluationHistory:
+    """评估历史存储（线程安全）：append 追加、page 分页列出摘要、load 读取完整记录、compare 对比两次评估"""
+
+    def __init__(self, path=DEFAULT_HISTORY_PATH, max_runs=5000, cache_entries=8):
+        self.path = path
+        self.max_runs = max_runs
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(_SCHEMA)
+        self._connection.commit()
+        self._lock = threading.Lock()
+        self._cache = ModelCache(max_entries=cache_entries, max_bytes=64 * 1024 * 1024)
+
+    def append(self, names, groups, X, fitness_history, scores, errors=None, weights=None, label=''):
+        """追加一次评估，返回记录编号"""
+        scores = np.asarray(scores, dtype=np.float32)
+        arrays = {
+            'X': np.asarray(X, dtype=np.float32),
+            'fitness_history': np.asarray(fitness_history, dtype=np.float32),
+            'scores': scores,
+            'errors': np.asarray(errors if errors is not None else np.zeros(len(scores)), dtype=np.float32),
+            'weights': np.asarray(weights if weights is not None else [], dtype=np.float32)
+        }
+        best = int(np.argmax(scores)) if len(scores) else None
+        row = (time.time(), label, len(scores), arrays['X'].shape[1] if arrays['X'].ndim == 2 else 0,
+               len(arrays['fitness_history']), names[best] if best is not None else None,
+               float(scores[best]) if best is not None else None,
+               float(scores.mean()) if len(scores) else None,
+               json.dumps(list(names), ensure_ascii=False), json.dumps(list(groups), ensure_ascii=False),
+               _pack(arrays))
+        with self._lock:
+            cursor = self._connection.execute(
+                'INSERT INTO runs (created_at, label, n_ips, n_features, generations, best_name, best_score, '
+                'mean_score, names, group_names, arrays) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', row)
+            run_id = cursor.lastrowid
+            if self.max_runs:
+                self._connection.execute(
+                    'DELETE FROM runs WHERE id <= (SELECT id FROM runs ORDER BY id DESC LIMIT 1 OFFSET ?)',
+                    (self.max_runs,))
+            self._connection.commit()
+        return run_id
+
+    def count(self):
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM runs').fetchone()[0]
+
+    def __len__(self):
+        return self.count()
+
+    def page(self, offset=0, limit=50):
+        """按时间倒序列出一页记录摘要（不读取数组）"""
+        with self._lock:
+            rows = self._connection.execute(
+                f'SELECT {_SUMMARY_COLUMNS} FROM runs ORDER BY id DESC LIMIT ? OFFSET ?',
+                (limit, offset)).fetchall()
+        return [dict(zip(SUMMARY_KEYS, row)) for row in rows]
+
+    def load(self, run_id):
+        """读取一条完整记录（摘要、IP名称/组别和全部数组），最近读取的记录保留在内存中"""
+        cached = self._cache.get(run_id)
+        if cached is not None:
+            return cached
+        with self._lock:
+            row = self._connection.execute(
+                f'SELECT {_SUMMARY_COLUMNS}, names, group_names, arrays FROM runs WHERE id = ?', (run_id,)).fetchone()
+        if row is None:
+            raise InputError(f'评估记录不存在: {run_id}')
+        run = {**dict(zip(SUMMARY_KEYS, row[:-3])), 'names': json.loads(row[-3]), 'groups': json.loads(row[-2]),
+               **_unpack(row[-1])}
+        self._cache.put(run_id, run)
+        return run
+
+    def compare(self, base_id, other_id):
+        """对比两次评估：按 (名称, 组别) 匹配IP（同名同组的IP按出现顺序匹配），给出评分和排名变化、新增/移除的IP、权重变化"""
+        base, other = self.load(base_id), self.load(other_id)
+
+        def ranked(run):
+            ranks = np.empty(len(run['scores']), dtype=np.int64)
+            ranks[np.argsort(-run['scores'], kind='stable')] = np.arange(1, len(ranks) + 1)
+            seen = {}
+            entries = {}
+            for name, group, score, rank in zip(run['names'], run['groups'], run['scores'], ranks):
+                occurrence = seen[name, group] = seen.get((name, group), -1) + 1
+                entries[name, group, occurrence] = (float(score), int(rank))
+            return entries
+
+        before, after = ranked(base), ranked(other)
+        changes = [{
+            'name': key[0],
+            'group': key[1],
+            'score_before': before[key][0],
+            'score_after': after[key][0],
+            'score_change': after[key][0] - before[key][0],
+            'rank_before': before[key][1],
+            'rank_after': after[key][1],
+            'rank_change': before[key][1] - after[key][1]
+        } for key in after if key in before]
+        changes.sort(key=lambda item: -abs(item['score_change']))
+        weight_change = None
+        if base['weights'].shape == other['weights'].shape and len(base['weights']):
+            weight_change = other['weights'] - base['weights']
+        return {
+            'base': _summary(base),
+            'other': _summary(other),
+            'changes': changes,
+            'added': [{'name': key[0], 'group': key[1]} for key in after if key not in before],
+            'removed': [{'name': key[0], 'group': key[1]} for key in before if key not in after],
+            'weight_change': weight_change
+        }
+
+    def cache_stats(self):
+        return self._cache.stats()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
@@ -0,0 +1,66 @@
+"""向量化特征重要性：把所有扰动副本堆叠成一个批次，一次前向计算完成打分"""
+import numpy as np
+import torch
+
+STRATEGIES = ('zero', 'mean', 'permutation')
+
+# 单批次张量元素上限（约 64MB float32），超出时按扰动单元分块
+MAX_BATCH_ELEMENTS = 1 << 24
+
+
+def _build_masks(n_features, groups):
+    """扰动单元掩码 (单元数, 特征数)：每个单元是一个特征或一组特征"""
+    if groups is None:
+        return torch.eye(n_features, dtype=torch.bool)
+    masks = torch.zeros(len(groups), n_features, dtype=torch.bool)
+    for i, cols in enumerate(groups):
+        masks[i, cols] = True
+    return masks
+
+
+def compute_feature_importance(predict, X, strategy='zero', n_repeats=5, groups=None, seed=0):
+    """计算特征（或特征组）重要性
+
+    predict: 输入 (m, d) 张量、输出 (m, 1) 预测的函数
+    strategy: zero 置零 / mean 替换为均值基线 / permutation 行置换（重复 n_repeats 次）
+    groups: 列索引列表的列表，提供时按组整体扰动（如二级/一级指标）
+    返回 {'importance': (单元数,), 'std': (单元数,)}，重要性为预测变化绝对值的均值
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f'不支持的特征重要性策略: {strategy}，可选: {list(STRATEGIES)}')
+    n_samples, n_features = X.shape
+    masks = _build_masks(n_features, groups)
+    n_units = masks.shape[0]
+    repeats = n_repeats if strategy == 'permutation' else 1
+
+    if strategy == 'permutation':
+        generator = torch.Generator().manual_seed(seed)
+        # 每次重复使用一个行置换，组内各列共用同一置换以保留组内相关性
+        replacements = torch.stack([X[torch.randperm(n_samples, generator=generator)] for _ in range(repeats)])
+    else:
+        baseline = torch.zeros(n_features) if strategy == 'zero' else X.mean(dim=0)
+        replacements = baseline.expand(1, n_samples, n_features)
+
+    with torch.no_grad():
+        reference = predict(X).reshape(1, 1, n_samples)
+        units_per_batch = max(1, MAX_BATCH_ELEMENTS // (repeats * n_samples * n_features))
+        scores = []
+        for start in range(0, n_units, units_per_batch):
+            chunk = masks[start:start + units_per_batch]
+            # (单元, 重复, 样本, 特征)：被扰动的列取替换值，其余保持原值
+            batch = torch.where(chunk[:, None, None, :], replacements.unsqueeze(0), X.expand(1, 1, -1, -1))
+            perturbed = predict(batch.reshape(-1, n_features)).reshape(len(chunk), repeats, n_samples)
+            scores.append(torch.abs(perturbed - reference).mean(dim=2))
+        scores = torch.cat(scores).numpy()  # (单元, 重复)，只在最后同步一次
+
+    return {
+        'importance': scores.mean(axis=1),
+        'std': scores.std(axis=1)
+    }
+
+
+def normalize_importance(values):
+    """按最大值归一化到 [0, 1]"""
+    values = np.asarray(values, dtype=np.float64)
+    max_value = values.max() if len(values) else 0
+    return values / max_value if max_value > 0 else values
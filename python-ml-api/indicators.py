@@ -0,0 +1,174 @@
+"""IP评估指标体系（一级/二级/三级指标），与 test.py 及 Node 端 ipEvaluationService 保持一致"""
+import functools
+
+import numpy as np
+
+FIRST_LEVEL = ["文化价值", "市场潜力", "社会效益", "创新性"]
+
+SECOND_LEVEL = ["历史继承性", "民族特色", "文化传播力", "社会认同感",
+                "市场需求", "竞争环境", "商业化路径", "文化传承",
+                "社会影响力", "技术创新", "模式创新", "传播创新"]
+
+FIRST_TO_SECOND = {
+    "文化价值": ["历史继承性", "民族特色", "文化传播力", "社会认同感"],
+    "市场潜力": ["市场需求", "竞争环境", "商业化路径"],
+    "社会效益": ["文化传承", "社会影响力"],
+    "创新性": ["技术创新", "模式创新", "传播创新"]
+}
+
+SECOND_TO_THIRD = {
+    "历史继承性": ["历史渊源", "文化象征性", "民族记忆"],
+    "民族特色": ["独特性", "跨民族文化联系", "跨民族文化认同"],
+    "文化传播力": ["传播渠道", "媒体关注度", "跨平台传播"],
+    "社会认同感": ["社会关注度", "民众参与度", "政府支持度"],
+    "市场需求": ["消费者需求", "市场成熟度"],
+    "竞争环境": ["市场增长潜力", "竞争者数量", "竞争者创新能力"],
+    "商业化路径": ["竞争壁垒", "商业模式多样性", "品牌价值", "合作机会"],
+    "文化传承": ["民族文化传承", "民族文化融合", "民族自豪感"],
+    "社会影响力": ["教育意义", "社会和谐"],
+    "技术创新": ["规则创新", "场地设备创新"],
+    "模式创新": ["商业化创新", "跨界合作创新"],
+    "传播创新": ["媒体传播创新", "社交平台创新"]
+}
+
+ALL_THIRD = ["历史渊源", "文化象征性", "民族记忆", "独特性", "跨民族文化联系", "跨民族文化认同",
+             "传播渠道", "媒体关注度", "跨平台传播", "社会关注度", "民众参与度", "政府支持度",
+             "消费者需求", "市场成熟度", "市场增长潜力", "竞争者数量", "竞争者创新能力",
+             "竞争壁垒", "商业模式多样性", "品牌价值", "合作机会", "民族文化传承", "民族文化融合",
+             "民族自豪感", "教育意义", "社会和谐", "规则创新", "场地设备创新", "商业化创新",
+             "跨界合作创新", "媒体传播创新", "社交平台创新"]
+
+# 中文指标名 -> 英文属性名（与 Node 端 indicatorPropertyMap 一致）
+INDICATOR_PROPERTY_MAP = {
+    "历史渊源": "historicalOrigin",
+    "文化象征性": "culturalSymbolism",
+    "民族记忆": "ethnicMemory",
+    "独特性": "uniqueness",
+    "跨民族文化联系": "interEthnicCulturalConnection",
+    "跨民族文化认同": "interEthnicCulturalIdentity",
+    "传播渠道": "communicationChannels",
+    "媒体关注度": "mediaAttention",
+    "跨平台传播": "crossPlatformCommunication",
+    "社会关注度": "socialAttention",
+    "民众参与度": "publicParticipation",
+    "政府支持度": "governmentSupport",
+    "消费者需求": "consumerDemand",
+    "市场成熟度": "marketMaturity",
+    "市场增长潜力": "marketGrowthPotential",
+    "竞争者数量": "competitorCount",
+    "竞争者创新能力": "competitorInnovationCapability",
+    "竞争壁垒": "competitiveBarriers",
+    "商业模式多样性": "businessModelDiversity",
+    "品牌价值": "brandValue",
+    "合作机会": "cooperationOpportunities",
+    "民族文化传承": "ethnicCulturalHeritage",
+    "民族文化融合": "ethnicCulturalIntegration",
+    "民族自豪感": "ethnicPride",
+    "教育意义": "educationalSignificance",
+    "社会和谐": "socialHarmony",
+    "规则创新": "ruleInnovation",
+    "场地设备创新": "venueEquipmentInnovation",
+    "商业化创新": "commercializationInnovation",
+    "跨界合作创新": "crossSectorCooperationInnovation",
+    "媒体传播创新": "mediaCommunicationInnovation",
+    "社交平台创新": "socialPlatformInnovation"
+}
+
+PROPERTY_INDICATOR_MAP = {prop: name for name, prop in INDICATOR_PROPERTY_MAP.items()}
+
+THIRD_TO_SECOND = {third: second for second, thirds in SECOND_TO_THIRD.items() for third in thirds}
+SECOND_TO_FIRST = {second: first for first, seconds in FIRST_TO_SECOND.items() for second in seconds}
+_PROPERTY_BY_LOWER = {prop.lower(): name for prop, name in PROPERTY_INDICATOR_MAP.items()}
+
+
+def resolve_third_names(feature_names, n_features):
+    """将传入的指标名称（中文或英文属性名）解析为三级指标中文名；无法识别时返回 None"""
+    if not feature_names or len(feature_names) != n_features:
+        # 未提供名称且维度与完整指标体系一致时，按标准顺序对应
+        return list(ALL_THIRD) if n_features == len(ALL_THIRD) else None
+    resolved = []
+    for name in feature_names:
+        third = name if name in THIRD_TO_SECOND else PROPERTY_INDICATOR_MAP.get(name)
+        if third is None:
+            return None
+        resolved.append(third)
+    return resolved
+
+
+def indicator_for_header(header):
+    """表格列名 -> 三级指标中文名：中文名、英文属性名（不区分大小写），或被截断的属性名的唯一前缀；不是指标列时返回 None"""
+    name = str(header).strip()
+    if name in THIRD_TO_SECOND:
+        return name
+    lowered = name.lower()
+    if lowered in _PROPERTY_BY_LOWER:
+        return _PROPERTY_BY_LOWER[lowered]
+    # Excel 导出的列名可能被截断（如 socialPlatformInnovatio）
+    if len(lowered) >= 8:
+        candidates = [third for prop, third in _PROPERTY_BY_LOWER.items() if prop.startswith(lowered)]
+        if len(candidates) == 1:
+            return candidates[0]
+    return None
+
+
+def hierarchy_groups(feature_names, n_features, level):
+    """按 'second'（二级）或 'first'（一级）指标对特征列分组，返回 [(分组名, [列索引]), ...]"""
+    thirds = resolve_third_names(feature_names, n_features)
+    if thirds is None:
+        return None
+    order = SECOND_LEVEL if level == 'second' else FIRST_LEVEL
+    columns = {name: [] for name in order}
+    for col, third in enumerate(thirds):
+        second = THIRD_TO_SECOND[third]
+        columns[second if level == 'second' else SECOND_TO_FIRST[second]].append(col)
+    return [(name, cols) for name, cols in columns.items() if cols]
+
+
+class HierarchyRollup:
+    """三级指标列 -> 二级/一级指标得分的稀疏聚合矩阵
+
+    to_second 为 (列数, 12)、to_first 为 (列数, 4) 的 CSR 矩阵，每个非零元是该列在所属分组内的归一化权重
+    （默认等权，即分组内已选三级指标的平均值，与原雷达图逐IP逐指标查找的结果相同）。
+    一级指标直接由其下的三级指标聚合；没有任何已选指标的分组得分为 0，可按 second_counts/first_counts 识别。
+    """
+
+    def __init__(self, third_names, weights=None):
+        from scipy import sparse
+
+        self.third_names = list(third_names)
+        n = len(self.third_names)
+        w = np.ones(n) if weights is None else np.asarray(weights, dtype=np.float64)
+        rows = np.array([i for i, t in enumerate(self.third_names) if t in THIRD_TO_SECOND], dtype=np.int64)
+        second_index = {name: j for j, name in enumerate(SECOND_LEVEL)}
+        first_index = {name: j for j, name in enumerate(FIRST_LEVEL)}
+        seconds = [THIRD_TO_SECOND[self.third_names[i]] for i in rows]
+        second_cols = np.array([second_index[s] for s in seconds], dtype=np.int64)
+        first_cols = np.array([first_index[SECOND_TO_FIRST[s]] for s in seconds], dtype=np.int64)
+
+        def build(cols, n_groups):
+            totals = np.bincount(cols, weights=w[rows], minlength=n_groups)
+            values = w[rows] / np.where(totals[cols] > 0, totals[cols], 1.0)
+            return sparse.csr_matrix((values, (rows, cols)), shape=(n, n_groups))
+
+        self.to_second = build(second_cols, len(SECOND_LEVEL))
+        self.to_first = build(first_cols, len(FIRST_LEVEL))
+        self.second_counts = np.bincount(second_cols, minlength=len(SECOND_LEVEL))
+        self.first_counts = np.bincount(first_cols, minlength=len(FIRST_LEVEL))
+
+    def rollup(self, X):
+        """X: (IP数, 列数) -> (二级指标得分 (IP数, 12), 一级指标得分 (IP数, 4))，各一次稀疏矩阵乘积"""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != len(self.third_names):
+            raise ValueError(f'指标矩阵列数与聚合矩阵({len(self.third_names)}列)不一致')
+        return X @ self.to_second, X @ self.to_first
+
+
+@functools.lru_cache(maxsize=64)
+def _cached_rollup(third_names, weights):
+    return HierarchyRollup(third_names, weights)
+
+
+def hierarchy_rollup(third_names, weights=None):
+    """按指标列（三级指标中文名）取聚合矩阵；同一指标筛选条件和权重只构建一次"""
+    key = None if weights is None else tuple(float(w) for w in np.asarray(weights).reshape(-1))
+    return _cached_rollup(tuple(third_names), key)
@@ -0,0 +1,141 @@
+"""只推理的批量评分：用已保存的模型版本为新IP打分，不训练
+
+推理前把 X 的标准化（scaler_X）折叠进第一层、把评分的反标准化（scaler_Y）折叠进最后一层，Dropout 在推理时为恒等变换直接去掉，
+单模型和集成模型统一为 (副本数, 输入, 输出) 的堆叠权重；之后用 TorchScript 跟踪并冻结（权重成为常量），
+在 inference_mode 下按 chunk_size 分块前向。编译好的模型按 模型线+版本 缓存，重复请求只做一次前向计算。
+"""
+import time
+
+import numpy as np
+
+from errors import InputError
+from model_cache import ModelCache
+
+ENGINES = ('script', 'eager')
+# 每块行数：中间激活留在 CPU 缓存中时最快（单模型约1024行，集成按副本数缩小，16个副本约256行）
+DEFAULT_CHUNK_SIZE = 1024
+LAYER_NAMES = ('fc1', 'fc2', 'fc3', 'fc4')
+
+predictor_cache = ModelCache(max_entries=16, max_bytes=64 * 1024 * 1024)
+
+
+def fold_layers(state_dict, scaler_X=None, scaler_Y=None):
+    """state_dict（AdvancedNN 或 BatchedAdvancedNN）→ 每层 (权重 (K, 输入, 输出), 偏置 (K, 1, 输出))，标准化器已折叠进首尾两层"""
+    if 'fc1.weight' in state_dict:
+        layers = [(state_dict[f'{name}.weight'].detach().t().unsqueeze(0).double(),
+                   state_dict[f'{name}.bias'].detach().reshape(1, 1, -1).double()) for name in LAYER_NAMES]
+    else:
+        layers = [(state_dict[f'{name}_weight'].detach().double(), state_dict[f'{name}_bias'].detach().double())
+                  for name in LAYER_NAMES]
+    import torch
+
+    if scaler_X is not None:
+        # ((x - mean) / scale) @ W + b = x @ (W / scale) + (b - (mean / scale) @ W)
+        mean = torch.as_tensor(scaler_X.mean_, dtype=torch.float64)
+        scale = torch.as_tensor(scaler_X.scale_, dtype=torch.float64)
+        weight, bias = layers[0]
+        layers[0] = (weight / scale[:, None], bias - ((mean / scale) @ weight).unsqueeze(1))
+    if scaler_Y is not None:
+        # (h @ W + b) * scale + mean
+        mean, scale = float(scaler_Y.mean_[0]), float(scaler_Y.scale_[0])
+        weight, bias = layers[-1]
+        layers[-1] = (weight * scale, bias * scale + mean)
+    return [(weight.float().contiguous(), bias.float().contiguous()) for weight, bias in layers]
+
+
+def _folded_module(layers):
+    import torch
+    import torch.nn as nn
+    import torch.nn.functional as F
+
+    class FoldedMLP(nn.Module):
+        """折叠后的推理网络：输入 (n, 输入)，输出 (K, n)；单模型时用二维矩阵乘法"""
+
+        def __init__(self):
+            super().__init__()
+            self.n_models = layers[0][0].shape[0]
+            for i, (weight, bias) in enumerate(layers):
+                if self.n_models == 1:
+                    weight, bias = weight[0], bias[0, 0]
+                self.register_buffer(f'weight{i}', weight)
+                self.register_buffer(f'bias{i}', bias)
+
+        def forward(self, x):
+            if self.n_models > 1:
+                x = x.unsqueeze(0).expand(self.n_models, -1, -1)
+            for i in range(len(LAYER_NAMES)):
+                weight, bias = getattr(self, f'weight{i}'), getattr(self, f'bias{i}')
+                x = torch.addmm(bias, x, weight) if self.n_models == 1 else torch.baddbmm(bias, x, weight)
+                if i < len(LAYER_NAMES) - 1:
+                    x = F.relu(x)
+            return x.reshape(self.n_models, -1)
+
+    return FoldedMLP().eval()
+
+
+class Predictor:
+    """已编译的推理模型：predict(X) 返回各副本的原始尺度评分 (K, n)"""
+
+    def __init__(self, layers, engine='script', chunk_size=None):
+        import torch
+
+        if engine not in ENGINES:
+            raise InputError(f'不支持的推理引擎: {engine}，可选: {list(ENGINES)}')
+        self.engine = engine
+        self.input_size = layers[0][0].shape[1]
+        self.n_models = layers[0][0].shape[0]
+        self.chunk_size = chunk_size or max(128, DEFAULT_CHUNK_SIZE * 4 // max(self.n_models, 4))
+        start = time.perf_counter()
+        module = _folded_module(layers)
+        if engine == 'script':
+            with torch.inference_mode():
+                example = torch.zeros(2, self.input_size)
+                module = torch.jit.freeze(torch.jit.trace(module, example))
+                # 冻结后的图在前两次调用时做剖析和优化，编译时先跑完
+                for _ in range(2):
+                    module(example)
+        self.module = module
+        self.compile_seconds = time.perf_counter() - start
+
+    def predict(self, X, chunk_size=None):
+        import torch
+
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.input_size:
+            raise InputError(f'指标数量与模型不一致：模型需要 {self.input_size} 个指标，实际 {X.shape[1] if X.ndim == 2 else 0} 个')
+        chunk_size = chunk_size or self.chunk_size
+        output = np.empty((self.n_models, len(X)), dtype=np.float32)
+        with torch.inference_mode():
+            for start in range(0, len(X), chunk_size):
+                chunk = torch.from_numpy(X[start:start + chunk_size])
+                output[:, start:start + chunk_size] = self.module(chunk).numpy()
+        return output
+
+
+def get_predictor(store, model_id, version=None, engine='script'):
+    """指定模型线的推理模型（版本：指定 > 固定 > 最新），返回 (Predictor, 版本信息, 模型线元数据)；模型线不存在时返回 (None, None, None)"""
+    meta = store.meta(model_id)
+    if meta is None:
+        return None, None, None
+    info = store.resolve(model_id, version)
+    if info is None:
+        return None, None, None
+    # 删除后重建的模型线会复用版本号，用创建时间区分
+    key = (model_id, info['version'], info['created_at'], engine)
+    predictor = predictor_cache.get(key)
+    if predictor is None:
+        payload = store.load(model_id, info['version'])
+        predictor = Predictor(fold_layers(payload['state_dict'], payload['scaler_X'], payload['scaler_Y']), engine)
+        predictor_cache.put(key, predictor)
+    return predictor, info, meta
+
+
+def align_features(X, feature_names, trained_names):
+    """按训练时的指标名称重排请求的指标列；请求未提供名称或模型线没有记录名称时按原顺序"""
+    if not feature_names or not trained_names or list(feature_names) == list(trained_names):
+        return X
+    missing = [name for name in trained_names if name not in feature_names]
+    if missing:
+        raise InputError(f'缺少模型需要的指标: {", ".join(map(str, missing[:10]))}')
+    index = {name: i for i, name in enumerate(feature_names)}
+    return np.asarray(X)[:, [index[name] for name in trained_names]]
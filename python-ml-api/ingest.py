@@ -0,0 +1,266 @@
+"""专家打分表的流式导入：xlsx（openpyxl 只读模式）或 CSV 逐行读取，按块向量化校验并直接写入 float32 指标矩阵
+
+表头第一行，列名映射到32个三级指标（中文名、英文属性名或被截断的属性名）以及 expert/project_name/group_name 等信息列。
+每 chunk_size 行转换一次：整块数值化、检查缺失/非数值/超出范围，坏行记录行号和原因后跳过，不中断导入。
+内存只保留当前块的原始单元格和已转换的 float32 结果（每行 4×指标数 字节）。
+"""
+import codecs
+import csv
+import io
+import os
+import time
+import zipfile
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+
+from errors import InputError
+from experts import METHODS as EXPERT_METHODS, aggregate_wide
+from indicators import ALL_THIRD, INDICATOR_PROPERTY_MAP, indicator_for_header
+
+DEFAULT_CHUNK_SIZE = 5000
+MAX_REPORTED_ROWS = 1000
+SNIFF_BYTES = 64 * 1024
+DEFAULT_RANGE = (0.0, 100.0)
+INFO_COLUMNS = {
+    'expert': ('expert', '专家', '专家姓名'),
+    'project_name': ('project_name', '项目名称', '项目'),
+    'group_name': ('group_name', '组别', '组别名称')
+}
+_INFO_BY_HEADER = {alias.lower(): key for key, aliases in INFO_COLUMNS.items() for alias in aliases}
+AGGREGATIONS = ('none',) + EXPERT_METHODS
+
+
+def _xlsx_rows(source, sheet=None):
+    """逐行读取 xlsx 工作表：openpyxl 只读模式流式读取，只保留当前行；公式单元格取缓存的计算结果
+
+    单元格返回数值、布尔值、文本（富文本合并为纯文本，错误值如 "#N/A" 为文本，由校验阶段记为非数值）或 None，
+    空行返回空元组以保持行号。"""
+    try:
+        workbook = load_workbook(source, read_only=True, data_only=True)
+    except (InvalidFileException, zipfile.BadZipFile, KeyError, ValueError) as e:
+        raise InputError(f'无法读取 xlsx 文件: {str(e)}')
+    try:
+        names = workbook.sheetnames
+        if not names:
+            raise InputError('xlsx 文件中没有工作表')
+        if sheet is not None and sheet not in names:
+            raise InputError(f'工作表不存在: {sheet}（可选: {", ".join(names)}）')
+        yield from workbook[sheet if sheet is not None else names[0]].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _csv_rows(source):
+    """CSV 逐行读取，按 UTF-8（可带 BOM）解码；开头一段不是合法 UTF-8 时按 Excel 另存的 GBK 编码读取"""
+    owned = isinstance(source, (str, os.PathLike))
+    handle = open(source, 'rb') if owned else source
+    sample = handle.read(SNIFF_BYTES)
+    handle.seek(0)
+    try:
+        codecs.getincrementaldecoder('utf-8-sig')().decode(sample, final=False)
+        encoding = 'utf-8-sig'
+    except UnicodeDecodeError:
+        encoding = 'gb18030'
+    text = io.TextIOWrapper(handle, encoding=encoding, newline='')
+    try:
+        yield from csv.reader(text)
+    finally:
+        if owned:
+            text.close()
+        else:
+            text.detach()
+
+
+def iter_rows(source, filename, sheet=None):
+    """按扩展名逐行读取文件（路径或二进制文件对象），每行为单元格值的元组"""
+    ext = os.path.splitext(filename)[1].lower()
+    if ext in ('.xlsx', '.xlsm'):
+        return _xlsx_rows(source, sheet)
+    if ext == '.csv':
+        return _csv_rows(source)
+    if ext == '.xls':
+        raise InputError('不支持旧版 .xls 文件，请另存为 .xlsx 或 .csv')
+    raise InputError(f'不支持的文件类型: {ext or filename}（支持 xlsx、csv）')
+
+
+def map_headers(header):
+    """表头 -> (指标列 {列号: 三级指标}, 信息列 {expert/project_name/group_name: 列号}, 未识别的列名)"""
+    indicator_columns, info_columns, ignored = {}, {}, []
+    seen = set()
+    for col, value in enumerate(header):
+        if value is None or str(value).strip() == '':
+            continue
+        name = str(value).strip()
+        third = indicator_for_header(name)
+        if third is not None and third not in seen:
+            indicator_columns[col] = third
+            seen.add(third)
+        elif name.lower() in _INFO_BY_HEADER and _INFO_BY_HEADER[name.lower()] not in info_columns:
+            info_columns[_INFO_BY_HEADER[name.lower()]] = col
+        else:
+            ignored.append(name)
+    return indicator_columns, info_columns, ignored
+
+
+def _cell_text(value):
+    return '' if value is None else str(value).strip()
+
+
+class _ChunkValidator:
+    """一块原始行 -> float32 指标矩阵 + 信息列；坏行写入报告"""
+
+    def __init__(self, indicator_columns, info_columns, value_range, max_reported):
+        # 输出列按指标体系的标准顺序排列
+        ordered = sorted(indicator_columns.items(), key=lambda item: ALL_THIRD.index(item[1]))
+        self.columns = np.array([col for col, _ in ordered], dtype=np.intp)
+        self.thirds = [third for _, third in ordered]
+        self.info_columns = info_columns
+        self.low, self.high = value_range
+        self.width = max([*indicator_columns, *info_columns.values()]) + 1
+        self.max_reported = max_reported
+        self.bad_rows = []
+        self.n_bad = 0
+
+    def _info(self, block, key, default):
+        col = self.info_columns.get(key)
+        if col is None:
+            return np.full(len(block), default, dtype=object)
+        return np.array([_cell_text(value) for value in block[:, col]], dtype=object)
+
+    def __call__(self, rows, row_numbers):
+        # 补齐/截断到相同宽度后整块转为对象数组
+        block = np.empty((len(rows), self.width), dtype=object)
+        for i, row in enumerate(rows):
+            row = row[:self.width]
+            block[i, :len(row)] = row
+        raw = block[:, self.columns]
+        try:
+            # 整块都是数值（或数值字符串）时直接转换；含空值或文本时逐元素容错转换
+            values = raw.astype(np.float64)
+        except (TypeError, ValueError):
+            values = pd.to_numeric(pd.Series(raw.ravel()), errors='coerce').to_numpy(dtype=np.float64).reshape(raw.shape)
+
+        missing = pd.isna(raw) | (raw == '')
+        non_numeric = np.isnan(values) & ~missing
+        out_of_range = (values < self.low) | (values > self.high)
+        if 'project_name' in self.info_columns:
+            names = self._info(block, 'project_name', '')
+        else:
+            names = np.array([f'IP{number}' for number in row_numbers], dtype=object)
+        no_name = names == ''
+        bad = missing.any(axis=1) | non_numeric.any(axis=1) | out_of_range.any(axis=1) | no_name
+
+        for i in np.flatnonzero(bad):
+            self.n_bad += 1
+            if len(self.bad_rows) >= self.max_reported:
+                continue
+            reasons = []
+            if no_name[i]:
+                reasons.append('缺少项目名称')
+            for j in np.flatnonzero(missing[i]):
+                reasons.append(f'{self.thirds[j]}: 缺失')
+            for j in np.flatnonzero(non_numeric[i]):
+                reasons.append(f'{self.thirds[j]}: 非数值 {raw[i, j]!r}')
+            for j in np.flatnonzero(out_of_range[i]):
+                reasons.append(f'{self.thirds[j]}: {values[i, j]:g} 超出范围 [{self.low:g}, {self.high:g}]')
+            self.bad_rows.append({'row': row_numbers[i], 'project_name': names[i], 'reasons': reasons})
+
+        good = ~bad
+        return {
+            'X': values[good].astype(np.float32),
+            'names': names[good].tolist(),
+            'groups': [group or '未知' for group in self._info(block, 'group_name', '未知')[good]],
+            'experts': self._info(block, 'expert', '')[good].tolist()
+        }
+
+
+def group_mean(names, groups, X):
+    """同一项目+组别的多位专家评分取平均 -> (名称, 组别, 专家数, 平均评分矩阵)，保持首次出现的顺序"""
+    keys = pd.MultiIndex.from_arrays([names, groups])
+    codes, uniques = pd.factorize(keys, sort=False)
+    counts = np.bincount(codes, minlength=len(uniques))
+    sums = np.zeros((len(uniques), X.shape[1]), dtype=np.float64)
+    np.add.at(sums, codes, X)
+    return ([name for name, _ in uniques], [group for _, group in uniques], counts,
+            (sums / counts[:, None]).astype(np.float32))
+
+
+def ingest_rows(rows, chunk_size=DEFAULT_CHUNK_SIZE, value_range=DEFAULT_RANGE, aggregate='mean',
+                max_reported=MAX_REPORTED_ROWS):
+    """从逐行迭代器导入打分表
+
+    返回 names、groups、experts（aggregate='none' 时为每行的专家名）、n_experts（聚合时）、
+    X (float32，列为 feature_names 对应的三级指标，按指标体系标准顺序)、坏行报告和列映射信息。
+    aggregate 为 median/trimmed/reliability 时由 experts 模块聚合，并附带异常评分数 n_outliers 和被标记的专家 flagged_experts。
+    """
+    if aggregate not in AGGREGATIONS:
+        raise InputError(f'aggregate 必须是 {"、".join(AGGREGATIONS)} 之一')
+    start = time.perf_counter()
+    rows = iter(rows)
+    header, header_row = None, 0
+    for header_row, row in enumerate(rows, start=1):
+        if row and any(_cell_text(value) for value in row):
+            header = row
+            break
+    if header is None:
+        raise InputError('文件为空')
+    indicator_columns, info_columns, ignored = map_headers(header)
+    if not indicator_columns:
+        raise InputError('表头中没有可识别的指标列（列名应为三级指标的中文名或英文属性名）')
+
+    validator = _ChunkValidator(indicator_columns, info_columns, value_range, max_reported)
+    parts = []
+    n_rows = 0
+    chunk, row_numbers = [], []  # 行号与表格中的行号一致（从1开始，含表头）
+    for row_number, row in enumerate(rows, start=header_row + 1):
+        if not row or not any(_cell_text(value) for value in row):
+            continue
+        chunk.append(row)
+        row_numbers.append(row_number)
+        if len(chunk) >= chunk_size:
+            parts.append(validator(chunk, row_numbers))
+            n_rows += len(chunk)
+            chunk, row_numbers = [], []
+    if chunk:
+        parts.append(validator(chunk, row_numbers))
+        n_rows += len(chunk)
+
+    n_features = len(validator.thirds)
+    X = np.concatenate([part['X'] for part in parts]) if parts else np.empty((0, n_features), dtype=np.float32)
+    names = [name for part in parts for name in part['names']]
+    groups = [group for part in parts for group in part['groups']]
+    result = {
+        'n_rows': n_rows,
+        'n_valid': len(X),
+        'n_bad': validator.n_bad,
+        'bad_rows': validator.bad_rows,
+        'feature_names': [INDICATOR_PROPERTY_MAP[third] for third in validator.thirds],
+        'indicators': validator.thirds,
+        'missing_indicators': [third for third in ALL_THIRD if third not in validator.thirds],
+        'ignored_columns': ignored,
+        'aggregate': aggregate
+    }
+    experts = [expert for part in parts for expert in part['experts']]
+    if aggregate == 'none':
+        result['experts'] = experts
+    elif not len(X):
+        result['n_experts'] = np.zeros(0, dtype=np.int64)
+    elif aggregate == 'mean':
+        names, groups, result['n_experts'], X = group_mean(names, groups, X)
+    else:
+        names, groups, result['n_experts'], X, aggregated = aggregate_wide(
+            names, groups, experts, X, result['feature_names'], aggregate)
+        result['n_outliers'] = aggregated['n_outliers']
+        stats = aggregated['experts']
+        result['flagged_experts'] = [name for name, flagged in zip(stats['expert'], stats['flagged']) if flagged]
+    result.update({'names': names, 'groups': groups, 'X': X, 'seconds': time.perf_counter() - start})
+    return result
+
+
+def ingest_file(source, filename=None, sheet=None, **options):
+    """导入文件（路径或二进制文件对象，后者需提供 filename 以判断格式）"""
+    filename = filename or source
+    return ingest_rows(iter_rows(source, filename, sheet), **options)
@@ -0,0 +1,172 @@
+"""异步训练任务队列：提交即返回任务ID，后台线程池执行，支持进度轮询与取消"""
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from errors import InputError
+
+
+class JobCancelled(Exception):
+    """任务在执行过程中被取消"""
+
+
+class Job:
+    """单个后台任务的状态"""
+
+    def __init__(self, kind, dedup_key=None, client=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.dedup_key = dedup_key
+        self.client = client  # 提交任务的客户端，计算调度按客户端公平排队
+        self.status = 'queued'  # queued / running / succeeded / failed / cancelled
+        self.progress = {'epoch': 0, 'epochs': 0}
+        self.training_losses = []
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel_event = threading.Event()
+        self._future = None
+
+    @property
+    def done(self):
+        return self.status in ('succeeded', 'failed', 'cancelled')
+
+    @property
+    def cancel_requested(self):
+        return self._cancel_event.is_set()
+
+    def report_progress(self, epoch, epochs, losses):
+        """训练回调：记录进度与部分损失曲线，收到取消请求时中断训练"""
+        self.progress = {'epoch': epoch + 1, 'epochs': epochs}
+        if len(losses) > len(self.training_losses):
+            self.training_losses.extend(losses[len(self.training_losses):])
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+
+    def to_dict(self, since=0):
+        elapsed_end = self.finished_at or time.time()
+        return {
+            'job_id': self.id,
+            'type': self.kind,
+            'status': self.status,
+            'progress': self.progress,
+            'training_losses': self.training_losses[since:],
+            'loss_offset': since,
+            'error': self.error,
+            'created_at': self.created_at,
+            'queued_seconds': (self.started_at or elapsed_end) - self.created_at,
+            'running_seconds': elapsed_end - self.started_at if self.started_at else 0
+        }
+
+
+class JobManager:
+    """后台任务管理：限制并发、按数据集去重、保留最近完成的任务"""
+
+    def __init__(self, max_workers=2, max_finished=200):
+        self.max_workers = max_workers
+        self.max_finished = max_finished
+        self._jobs = OrderedDict()
+        self._active_by_key = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _get_executor(self):
+        # 延迟创建线程池，避免在 fork 之前启动线程
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='ml-job')
+        return self._executor
+
+    def submit(self, kind, fn, payload, dedup_key=None, client=None):
+        """提交任务，返回 (job, 是否复用了已有任务)"""
+        with self._lock:
+            if dedup_key is not None:
+                existing_id = self._active_by_key.get(dedup_key)
+                existing = self._jobs.get(existing_id)
+                if existing is not None and existing.status in ('queued', 'running', 'succeeded'):
+                    return existing, True
+            job = Job(kind, dedup_key, client)
+            self._jobs[job.id] = job
+            if dedup_key is not None:
+                self._active_by_key[dedup_key] = job.id
+            self._evict_finished()
+            job._future = self._get_executor().submit(self._run, job, fn, payload)
+            return job, False
+
+    def _run(self, job, fn, payload):
+        if job.cancel_requested:
+            self._finish(job, 'cancelled')
+            return
+        job.status = 'running'
+        job.started_at = time.time()
+        try:
+            job.result = fn(payload, job)
+            self._finish(job, 'succeeded')
+        except JobCancelled:
+            self._finish(job, 'cancelled')
+        except InputError as e:
+            job.error = str(e)
+            self._finish(job, 'failed')
+        except Exception as e:
+            print(f"后台任务 {job.id} 执行错误: {str(e)}")
+            job.error = str(e)
+            self._finish(job, 'failed')
+
+    def _finish(self, job, status):
+        job.status = status
+        job.finished_at = time.time()
+        if status != 'succeeded':
+            with self._lock:
+                if self._active_by_key.get(job.dedup_key) == job.id:
+                    del self._active_by_key[job.dedup_key]
+
+    def _evict_finished(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            job = self._jobs.pop(job_id)
+            if self._active_by_key.get(job.dedup_key) == job_id:
+                del self._active_by_key[job.dedup_key]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is None:
+            return None
+        if not job.done:
+            job._cancel_event.set()
+            if job._future is not None and job._future.cancel():
+                self._finish(job, 'cancelled')
+        return job
+
+    def shutdown(self, wait=True):
+        """停止接收任务：取消排队中的任务，通知运行中的任务在下一个进度回报点退出"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            if not job.done:
+                self.cancel(job.id)
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {
+            'max_workers': self.max_workers,
+            'queued': statuses.count('queued'),
+            'running': statuses.count('running'),
+            'succeeded': statuses.count('succeeded'),
+            'failed': statuses.count('failed'),
+            'cancelled': statuses.count('cancelled')
+        }
+
+
+job_manager = JobManager(max_workers=int(os.environ.get('ML_JOB_WORKERS', 2)))
@@ -0,0 +1,114 @@
+"""训练模型缓存：按数据集指纹复用已训练好的神经网络"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def dataset_fingerprint(X, feature_names=None, target_mode='', params=None):
+    """计算数据集指纹（指标矩阵 + 指标名称 + 目标模式 + 超参数）"""
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    hasher = hashlib.sha256()
+    hasher.update(str(X.shape).encode())
+    hasher.update(X.tobytes())
+    meta = {
+        'feature_names': list(feature_names or []),
+        'target_mode': target_mode,
+        'params': params or {}
+    }
+    hasher.update(json.dumps(meta, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+    return hasher.hexdigest()
+
+
+def estimate_nbytes(obj):
+    """粗略估算缓存条目占用的内存字节数"""
+    if obj is None:
+        return 0
+    if hasattr(obj, 'element_size') and hasattr(obj, 'numel'):  # torch.Tensor
+        return obj.element_size() * obj.numel()
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, (bytes, bytearray, str)):
+        return len(obj)
+    if isinstance(obj, dict):
+        return sum(estimate_nbytes(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(estimate_nbytes(v) for v in obj)
+    if hasattr(obj, '__dict__'):  # StandardScaler 等对象，统计其数组属性
+        return sum(estimate_nbytes(v) for v in vars(obj).values() if isinstance(v, np.ndarray))
+    return 8
+
+
+class ModelCache:
+    """LRU + 内存预算淘汰的缓存（线程安全），也用于渲染图片缓存"""
+
+    def __init__(self, max_entries=32, max_bytes=256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def current_bytes(self):
+        return sum(self._sizes.values())
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        size = estimate_nbytes(entry)
+        with self._lock:
+            if size > self.max_bytes:
+                # 单个条目超出预算时不缓存
+                return False
+            if key in self._entries:
+                del self._entries[key]
+                del self._sizes[key]
+            self._entries[key] = entry
+            self._sizes[key] = size
+            while len(self._entries) > self.max_entries or self.current_bytes > self.max_bytes:
+                old_key, _ = self._entries.popitem(last=False)
+                del self._sizes[old_key]
+                self.evictions += 1
+            return True
+
+    def clear(self):
+        """清空条目和命中统计"""
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / total if total else 0.0
+            }
+
+
+model_cache = ModelCache(
+    max_entries=int(os.environ.get('ML_MODEL_CACHE_ENTRIES', 32)),
+    max_bytes=int(os.environ.get('ML_MODEL_CACHE_MB', 256)) * 1024 * 1024
+)
@@ -0,0 +1,307 @@
+"""模型持久化：训练好的网络参数、标准化器和指标结构按“模型线”保存在磁盘上，服务重启后继续使用
+
+模型线由 模型类型 + 指标名称 + 输入维度 + 结构参数（集成副本数等）+ 数据集 决定，每次训练保存为该模型线的一个新版本：
+v<版本>.pt（state_dict）+ v<版本>.npz（标准化器参数、训练矩阵和目标值）+ meta.json（版本列表、固定版本）。
+新请求的指标矩阵与最新版本的训练矩阵相同时直接复用；只新增或修改了少量IP时从最新版本热启动，少量轮数微调即可；
+固定（pin）版本后只用该版本预测，不再训练。每条模型线最多保留 max_versions 个版本（固定的版本不会被删除）。
+"""
+import hashlib
+import io
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from errors import InputError
+from model_cache import ModelCache, dataset_fingerprint
+
+try:
+    import fcntl  # 多个 worker 进程写同一模型线时加文件锁（Windows 上只有进程内锁）
+except ImportError:
+    fcntl = None
+
+DEFAULT_MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'models')
+# 热启动条件：新矩阵中至少这一比例的行与已保存版本的训练行完全相同
+WARM_START_MIN_OVERLAP = 0.5
+MODES = ('exact', 'pinned', 'warm_start', 'full')
+# 版本元数据中保存的训练摘要（逐轮损失保存在 npz 中）
+TRAINING_KEYS = ('epochs_used', 'max_epochs', 'stop_reason', 'best_epoch', 'best_loss', 'seconds', 'seconds_per_epoch')
+
+
+def _write_atomic(path, content):
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def _scaler_arrays(scaler, prefix):
+    if scaler is None:
+        return {}
+    return {f'{prefix}_{name}': np.asarray(getattr(scaler, name)) for name in ('mean_', 'scale_', 'var_')}
+
+
+def _restore_scaler(arrays, prefix):
+    """从保存的参数重建 StandardScaler（transform / inverse_transform 只需要 mean_ 和 scale_）"""
+    if f'{prefix}_mean_' not in arrays:
+        return None
+    from sklearn.preprocessing import StandardScaler
+
+    scaler = StandardScaler()
+    for name in ('mean_', 'scale_', 'var_'):
+        setattr(scaler, name, arrays[f'{prefix}_{name}'])
+    scaler.n_features_in_ = len(scaler.mean_)
+    scaler.n_samples_seen_ = len(arrays['X'])
+    return scaler
+
+
+def match_rows(X_saved, X):
+    """X 的每一行在已保存训练矩阵中的行号（按 float32 字节完全相同匹配，找不到为 -1）"""
+    X_saved = np.ascontiguousarray(X_saved, dtype=np.float32)
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    index = {row.tobytes(): i for i, row in enumerate(X_saved)}
+    return np.array([index.get(row.tobytes(), -1) for row in X], dtype=np.int64)
+
+
+def reuse_targets(payload, X, new_targets):
+    """沿用已保存版本中相同IP的目标值，新增的IP由 new_targets(行数) 生成，保证热启动时旧IP的目标不变"""
+    matched = match_rows(payload['X'], X)
+    Y = np.empty((len(X), payload['Y'].shape[1]), dtype=payload['Y'].dtype)
+    known = matched >= 0
+    Y[known] = payload['Y'][matched[known]]
+    if (~known).any():
+        Y[~known] = new_targets(int((~known).sum()))
+    return Y
+
+
+def parse_version(version):
+    """请求中的版本号 -> int（None 表示未指定）；不是整数时抛出 InputError"""
+    if version is None:
+        return None
+    if not isinstance(version, bool):
+        try:
+            number = int(version)
+            if number == float(version):
+                return number
+        except (TypeError, ValueError, OverflowError):
+            pass
+    raise InputError(f'版本号必须是整数: {version!r}')
+
+
+class ModelStore:
+    """模型线的保存、版本解析、固定和删除（同一进程内按元数据修改时间缓存已读取的元数据）"""
+
+    def __init__(self, root, max_versions=10, cache_entries=8):
+        self.root = root
+        self.max_versions = max_versions
+        self._lock = threading.Lock()
+        self._meta = {}
+        self._payloads = ModelCache(max_entries=cache_entries, max_bytes=128 * 1024 * 1024)
+
+    def _dir(self, line_id):
+        if not line_id or not all(c.isalnum() for c in line_id):
+            raise InputError(f'非法的模型编号: {line_id}')
+        return os.path.join(self.root, line_id)
+
+    def _lock_file(self, path):
+        handle = open(os.path.join(path, '.lock'), 'a')
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        return handle
+
+    @staticmethod
+    def line_id(kind, feature_names, input_size, params=None):
+        """模型线编号：模型类型、指标名称、输入维度和结构参数相同的训练共用一条模型线"""
+        payload = json.dumps([kind, list(feature_names or []), input_size, params or {}],
+                             sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+    def meta(self, line_id):
+        """模型线元数据，不存在时返回 None"""
+        meta_path = os.path.join(self._dir(line_id), 'meta.json')
+        try:
+            stat = os.stat(meta_path)
+        except FileNotFoundError:
+            return None
+        stamp = (stat.st_ino, stat.st_mtime_ns)
+        with self._lock:
+            cached = self._meta.get(line_id)
+            if cached is not None and cached[0] == stamp:
+                return cached[1]
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+        with self._lock:
+            self._meta[line_id] = (stamp, meta)
+        return meta
+
+    def resolve(self, line_id, version=None):
+        """要使用的版本：指定版本 > 固定版本 > 最新版本；模型线不存在时返回 None"""
+        version = parse_version(version)
+        meta = self.meta(line_id)
+        if meta is None or not meta['versions']:
+            if version is not None:
+                raise InputError(f'模型版本不存在: {line_id} v{version}')
+            return None
+        wanted = version if version is not None else meta.get('pinned')
+        if wanted is None:
+            return meta['versions'][-1]
+        for info in meta['versions']:
+            if info['version'] == wanted:
+                return info
+        raise InputError(f'模型版本不存在: {line_id} v{wanted}')
+
+    def load(self, line_id, version):
+        """读取一个版本：state_dict、标准化器、训练矩阵 X、目标值 Y 和训练过程（最近读取的版本保留在内存中）"""
+        import torch
+
+        info = self.resolve(line_id, version)
+        # 删除后重建的模型线会复用版本号，缓存键带上版本的创建时间
+        key = f'{line_id}:{info["version"]}:{info["created_at"]}'
+        payload = self._payloads.get(key)
+        if payload is not None:
+            return payload
+        path = self._dir(line_id)
+        try:
+            state_dict = torch.load(os.path.join(path, f'v{version}.pt'), map_location='cpu', weights_only=True)
+            with np.load(os.path.join(path, f'v{version}.npz')) as archive:
+                arrays = {name: archive[name] for name in archive.files}
+        except FileNotFoundError:
+            raise InputError(f'模型版本不存在: {line_id} v{version}')
+        payload = {
+            'state_dict': state_dict,
+            'scaler_X': _restore_scaler(arrays, 'scaler_X'),
+            'scaler_Y': _restore_scaler(arrays, 'scaler_Y'),
+            'X': arrays['X'],
+            'Y': arrays['Y'],
+            'training': {
+                **{name: info.get(name) for name in TRAINING_KEYS},
+                'losses': arrays['losses'].tolist(),
+                'val_losses': arrays['val_losses'].tolist() if 'val_losses' in arrays else None
+            }
+        }
+        self._payloads.put(key, payload)
+        return payload
+
+    def plan(self, line_id, X, version=None, warm_start=True):
+        """决定本次请求如何得到模型，返回 (方式, 版本信息, 已保存的版本内容)：
+        exact 训练矩阵相同直接复用；pinned 指定或固定了版本，只预测；warm_start 从最新版本微调；full 从头训练"""
+        info = self.resolve(line_id, version)
+        if info is None:
+            return 'full', None, None
+        meta = self.meta(line_id)
+        pinned = version is not None or meta.get('pinned') is not None
+        if not pinned and info['x_fingerprint'] != dataset_fingerprint(X):
+            if not warm_start:
+                return 'full', None, None
+            payload = self.load(line_id, info['version'])
+            overlap = float((match_rows(payload['X'], X) >= 0).mean())
+            if overlap < WARM_START_MIN_OVERLAP:
+                return 'full', None, None
+            return 'warm_start', {**info, 'overlap': overlap}, payload
+        return ('pinned' if pinned else 'exact'), info, self.load(line_id, info['version'])
+
+    def save(self, line_id, line_info, state_dict, X, Y, training, scaler_X=None, scaler_Y=None, mode='full'):
+        """保存为模型线的新版本并返回版本信息（training 为 models.fit_model 的返回值）；
+        超出 max_versions 时删除最早的未固定版本"""
+        import torch
+
+        path = self._dir(line_id)
+        os.makedirs(path, exist_ok=True)
+        handle = self._lock_file(path)
+        try:
+            os.makedirs(path, exist_ok=True)  # 等锁期间模型线可能已被删除
+            meta = self.meta(line_id) or {'id': line_id, **line_info, 'versions': [], 'pinned': None,
+                                          'created_at': time.time()}
+            meta = {**meta, 'versions': list(meta['versions'])}
+            version = meta['versions'][-1]['version'] + 1 if meta['versions'] else 1
+            buffer = io.BytesIO()
+            torch.save({k: v.detach().cpu() for k, v in state_dict.items()}, buffer)
+            _write_atomic(os.path.join(path, f'v{version}.pt'), buffer.getvalue())
+            buffer = io.BytesIO()
+            losses = {'losses': np.asarray(training['losses'], dtype=np.float64)}
+            if training.get('val_losses') is not None:
+                losses['val_losses'] = np.asarray(training['val_losses'], dtype=np.float64)
+            np.savez_compressed(buffer, X=np.asarray(X, dtype=np.float32), Y=np.asarray(Y), **losses,
+                                **_scaler_arrays(scaler_X, 'scaler_X'), **_scaler_arrays(scaler_Y, 'scaler_Y'))
+            _write_atomic(os.path.join(path, f'v{version}.npz'), buffer.getvalue())
+
+            info = {
+                'version': version,
+                'created_at': time.time(),
+                'n_rows': len(X),
+                'x_fingerprint': dataset_fingerprint(X),
+                'mode': mode,
+                'final_loss': training['losses'][-1] if training['losses'] else None,
+                **{name: training.get(name) for name in TRAINING_KEYS}
+            }
+            meta['versions'].append(info)
+            while len(meta['versions']) > self.max_versions:
+                removable = [v for v in meta['versions'][:-1] if v['version'] != meta['pinned']]
+                if not removable:
+                    break
+                meta['versions'].remove(removable[0])
+                for ext in ('pt', 'npz'):
+                    try:
+                        os.remove(os.path.join(path, f'v{removable[0]["version"]}.{ext}'))
+                    except OSError:
+                        pass
+            meta['updated_at'] = time.time()
+            _write_atomic(os.path.join(path, 'meta.json'), json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+            return info
+        finally:
+            handle.close()
+
+    def pin(self, line_id, version=None):
+        """固定版本（version 为 None 时取消固定）"""
+        path = self._dir(line_id)
+        version = parse_version(version)
+        if self.meta(line_id) is None:
+            raise KeyError(line_id)
+        handle = self._lock_file(path)
+        try:
+            meta = dict(self.meta(line_id))
+            if version is not None:
+                if all(info['version'] != version for info in meta['versions']):
+                    raise InputError(f'模型版本不存在: {line_id} v{version}')
+            meta['pinned'] = version
+            meta['updated_at'] = time.time()
+            _write_atomic(os.path.join(path, 'meta.json'), json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+            return meta
+        finally:
+            handle.close()
+
+    def delete(self, line_id):
+        path = self._dir(line_id)
+        if not os.path.isdir(path):
+            return False
+        handle = self._lock_file(path)
+        try:
+            shutil.rmtree(path)
+        finally:
+            handle.close()
+        with self._lock:
+            self._meta.pop(line_id, None)
+        return True
+
+    def list(self):
+        if not os.path.isdir(self.root):
+            return []
+        lines = [self.meta(line_id) for line_id in sorted(os.listdir(self.root))]
+        return [meta for meta in lines if meta is not None]
+
+    def preload(self):
+        """启动时读取全部模型线的元数据和最新（或固定）版本，之后的请求直接命中内存"""
+        loaded = 0
+        for meta in self.list():
+            info = self.resolve(meta['id'])
+            if info is not None:
+                self.load(meta['id'], info['version'])
+                loaded += 1
+        return loaded
+
+
+model_store = ModelStore(os.environ.get('ML_MODEL_DIR', DEFAULT_MODEL_DIR),
+                         max_versions=int(os.environ.get('ML_MODEL_VERSIONS', 10)))
@@ -0,0 +1,146 @@
+"""神经网络模型定义与训练"""
+import time
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+import torch.optim as optim
+
+
+class AdvancedNN(nn.Module):
+    """IP评分预测网络：输入→64→32→16→1，含Dropout"""
+
+    def __init__(self, input_size):
+        super(AdvancedNN, self).__init__()
+        self.fc1 = nn.Linear(input_size, 64)
+        self.relu1 = nn.ReLU()
+        self.dropout1 = nn.Dropout(0.2)
+        self.fc2 = nn.Linear(64, 32)
+        self.relu2 = nn.ReLU()
+        self.dropout2 = nn.Dropout(0.2)
+        self.fc3 = nn.Linear(32, 16)
+        self.relu3 = nn.ReLU()
+        self.fc4 = nn.Linear(16, 1)
+
+    def forward(self, x):
+        x = self.fc1(x)
+        x = self.relu1(x)
+        x = self.dropout1(x)
+        x = self.fc2(x)
+        x = self.relu2(x)
+        x = self.dropout2(x)
+        x = self.fc3(x)
+        x = self.relu3(x)
+        x = self.fc4(x)
+        return x
+
+
+def mse_criterion(outputs, targets, sample_weights=None):
+    """默认损失：均方误差"""
+    return F.mse_loss(outputs, targets)
+
+
+def fit_model(model, data, targets, epochs=500, criterion=mse_criterion, sample_weights=None,
+              patience=None, min_delta=0.0, time_budget=None, validation_split=0.0,
+              check_interval=10, seed=0, callback=None):
+    """带收敛判断的训练循环
+
+    - 每轮损失写入张量缓冲区，每 check_interval 轮才同步一次到主机，用于学习率调度、
+      早停判断、打印日志和进度回调（学习率下调因此最多滞后 check_interval 轮）
+    - patience 不为 None 时启用早停：监控值连续 patience 轮未下降超过 min_delta 即停止
+    - time_budget（秒）为训练时长上限；validation_split > 0 时划出验证集，并以验证损失作为监控值
+    - criterion(outputs, targets, sample_weights) 可返回标量或每个副本的损失向量，
+      反向传播使用其和，记录与监控使用其均值
+    - callback(epoch, epochs, losses) 在每次同步后调用；抛出异常即可中断训练
+    """
+    n_samples = data.shape[0]
+    if validation_split > 0:
+        n_val = max(1, int(round(n_samples * validation_split)))
+        if n_samples - n_val < 2:
+            raise ValueError('验证集划分后训练样本不足')
+        rows = torch.randperm(n_samples, generator=torch.Generator().manual_seed(seed))
+        val_rows, train_rows = rows[:n_val], rows[n_val:]
+        train_data, train_targets = data[train_rows], targets[train_rows]
+        val_data, val_targets = data[val_rows], targets[val_rows]
+        train_weights = sample_weights[..., train_rows] if sample_weights is not None else None
+        val_weights = sample_weights[..., val_rows] if sample_weights is not None else None
+    else:
+        train_data, train_targets, train_weights = data, targets, sample_weights
+        val_data = None
+
+    optimizer = optim.Adam(model.parameters(), lr=0.001, weight_decay=1e-5)
+    scheduler = optim.lr_scheduler.ReduceLROnPlateau(optimizer, patience=50)
+
+    loss_buffer = torch.zeros(epochs)
+    val_buffer = torch.zeros(epochs) if val_data is not None else None
+    losses, val_losses = [], []
+    best_value = float('inf')
+    best_epoch = 0
+    stale_epochs = 0
+    stop_reason = 'max_epochs'
+    window_start = 0
+    start = time.perf_counter()
+
+    for epoch in range(epochs):
+        model.train()
+        optimizer.zero_grad()
+        loss = criterion(model(train_data), train_targets, train_weights)
+        loss.sum().backward()
+        optimizer.step()
+        loss_buffer[epoch] = loss.detach().mean()
+        if val_buffer is not None:
+            model.eval()
+            with torch.no_grad():
+                val_buffer[epoch] = criterion(model(val_data), val_targets, val_weights).mean()
+
+        if epoch + 1 - window_start < check_interval and epoch != epochs - 1:
+            continue
+
+        # 同步本窗口的损失（每个窗口只传输一次）
+        window = loss_buffer[window_start:epoch + 1].tolist()
+        val_window = val_buffer[window_start:epoch + 1].tolist() if val_buffer is not None else None
+        monitored = val_window if val_window is not None else window
+        for offset, value in enumerate(monitored):
+            current_epoch = window_start + offset
+            scheduler.step(value)
+            if current_epoch % 100 == 0:
+                print(f'Epoch [{current_epoch}/{epochs}], Loss: {window[offset]:.4f}')
+            if value < best_value - min_delta:
+                best_value, best_epoch, stale_epochs = value, current_epoch, 0
+            else:
+                stale_epochs += 1
+            if patience is not None and stale_epochs >= patience:
+                stop_reason = 'early_stopping'
+        losses.extend(window)
+        if val_window is not None:
+            val_losses.extend(val_window)
+        window_start = epoch + 1
+
+        if callback is not None:
+            callback(epoch, epochs, losses)
+        if stop_reason == 'early_stopping':
+            break
+        if time_budget is not None and time.perf_counter() - start > time_budget and epoch != epochs - 1:
+            stop_reason = 'time_budget'
+            break
+
+    seconds = time.perf_counter() - start
+    epochs_used = len(losses)
+    if stop_reason != 'max_epochs':
+        print(f'训练提前结束（{stop_reason}），实际训练 {epochs_used}/{epochs} 轮')
+    return {
+        'losses': losses,
+        'val_losses': val_losses if val_buffer is not None else None,
+        'epochs_used': epochs_used,
+        'max_epochs': epochs,
+        'stop_reason': stop_reason,
+        'best_epoch': best_epoch,
+        'best_loss': best_value,
+        'seconds': seconds,
+        'seconds_per_epoch': seconds / epochs_used if epochs_used else 0.0
+    }
+
+
+def train_nn(model, data, targets, epochs=500, callback=None):
+    """训练神经网络模型（固定轮数），返回每轮损失"""
+    return fit_model(model, data, targets, epochs=epochs, callback=callback)['losses']
@@ -0,0 +1,158 @@
+"""持久化PCA投影服务：按数据集保存标准化参数和主成分，支持新IP投影、增量更新和漂移检测"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from sklearn.decomposition import PCA, IncrementalPCA
+from sklearn.preprocessing import StandardScaler
+
+# 样本数达到该阈值时使用随机化SVD
+RANDOMIZED_SVD_MIN_SAMPLES = 2000
+# 为支持增量更新而保留标准化训练数据的最大行数
+MAX_RETAINED_ROWS = 100000
+
+
+class PCAProjection:
+    """一个已拟合的 标准化 + PCA 投影"""
+
+    def __init__(self, X, n_components, incremental=False, batch_size=None, drift_threshold=2.0,
+                 scaler=None, X_scaled=None):
+        """scaler/X_scaled：调用方已拟合的标准化参数和标准化后的矩阵（分析流水线共享），省略时在此拟合"""
+        X = np.asarray(X, dtype=np.float64)
+        self.n_components = n_components
+        self.n_features = X.shape[1]
+        self.drift_threshold = drift_threshold
+        self.scaler = scaler if scaler is not None else StandardScaler().fit(X)
+        if X_scaled is None:
+            X_scaled = self.scaler.transform(X)
+
+        if incremental:
+            self.pca = IncrementalPCA(n_components=n_components, batch_size=batch_size)
+            self.pca.fit(X_scaled)
+            self.method = 'incremental'
+        else:
+            svd_solver = 'randomized' if len(X) >= RANDOMIZED_SVD_MIN_SAMPLES else 'full'
+            self.pca = PCA(n_components=n_components, svd_solver=svd_solver, random_state=42)
+            self.pca.fit(X_scaled)
+            self.method = svd_solver
+        # 批量 PCA 转为增量模式时需要原始（标准化后）数据作为初始批次
+        self._retained = X_scaled if not incremental and len(X) <= MAX_RETAINED_ROWS else None
+
+        self.n_samples_fit = len(X)
+        self.n_samples_seen = len(X)
+        self.fitted_at = time.time()
+        self.updated_at = self.fitted_at
+        self._compile()
+        self.baseline_error = float(self.reconstruction_error(X).mean())
+        self.last_drift = None
+        self._lock = threading.Lock()
+
+    def _compile(self):
+        """把标准化和投影合并为一次仿射变换：coords = X @ W - b"""
+        scale = self.scaler.scale_
+        components = self.pca.components_
+        weights = components.T / scale[:, None]
+        offset = (self.scaler.mean_ / scale + self.pca.mean_) @ components.T
+        self._affine = (weights, offset)  # 整体替换，投影时读取到的总是一致的一对参数
+
+    def project(self, X):
+        weights, offset = self._affine
+        return np.asarray(X, dtype=np.float64) @ weights - offset
+
+    def reconstruction_error(self, X):
+        """标准化空间中的逐样本重构误差（均方）"""
+        X_centered = (np.asarray(X, dtype=np.float64) - self.scaler.mean_) / self.scaler.scale_ - self.pca.mean_
+        reconstructed = (X_centered @ self.pca.components_.T) @ self.pca.components_
+        return np.mean((X_centered - reconstructed) ** 2, axis=1)
+
+    def _drift(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        error = float(self.reconstruction_error(X).mean())
+        error_ratio = error / self.baseline_error if self.baseline_error > 0 else (0.0 if error == 0 else float('inf'))
+        mean_shift = float(np.abs((X.mean(axis=0) - self.scaler.mean_) / self.scaler.scale_).mean())
+        report = {
+            'reconstruction_error': error,
+            'baseline_error': self.baseline_error,
+            'error_ratio': error_ratio,
+            'mean_shift': mean_shift,
+            'needs_refit': error_ratio > self.drift_threshold or mean_shift > 1.0
+        }
+        # 基线误差为0时 error_ratio 为 inf，JSON 响应中记为 null（needs_refit 仍为 true）
+        return report
+
+    def drift_report(self, X):
+        """比较新数据与拟合时的重构误差和均值偏移，判断是否需要重新拟合"""
+        with self._lock:
+            report = self._drift(X)
+            self.last_drift = report
+            return report
+
+    def partial_fit(self, X):
+        """用新批次增量更新主成分（标准化参数保持不变，保证坐标空间稳定）"""
+        X = np.asarray(X, dtype=np.float64)
+        if len(X) < self.n_components:
+            raise ValueError(f'增量批次样本数({len(X)})少于主成分数量({self.n_components})')
+        with self._lock:
+            drift = self._drift(X)
+            self.last_drift = drift
+            if not isinstance(self.pca, IncrementalPCA):
+                if self._retained is None:
+                    raise ValueError('该PCA模型未保留训练数据，无法转换为增量模式，请重新拟合')
+                ipca = IncrementalPCA(n_components=self.n_components)
+                ipca.partial_fit(self._retained)
+                self.pca = ipca
+                self.method = 'incremental'
+                self._retained = None
+            self.pca.partial_fit(self.scaler.transform(X))
+            self.n_samples_seen += len(X)
+            self.updated_at = time.time()
+            self._compile()
+            return drift
+
+    def info(self):
+        with self._lock:
+            explained_variance_ratio = self.pca.explained_variance_ratio_
+            return {
+                'n_components': self.n_components,
+                'n_features': self.n_features,
+                'method': self.method,
+                'n_samples_fit': self.n_samples_fit,
+                'n_samples_seen': self.n_samples_seen,
+                'explained_variance_ratio': explained_variance_ratio.tolist(),
+                'total_variance_explained': float(np.sum(explained_variance_ratio)),
+                'fitted_at': self.fitted_at,
+                'updated_at': self.updated_at,
+                'last_drift': self.last_drift
+            }
+
+
+class PCAStore:
+    """按数据集ID保存已拟合的PCA投影（LRU淘汰，线程安全）"""
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, pca_id):
+        with self._lock:
+            projection = self._entries.get(pca_id)
+            if projection is not None:
+                self._entries.move_to_end(pca_id)
+            return projection
+
+    def put(self, pca_id, projection):
+        with self._lock:
+            self._entries[pca_id] = projection
+            self._entries.move_to_end(pca_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+pca_store = PCAStore(max_entries=int(os.environ.get('ML_PCA_STORE_ENTRIES', 64)))
@@ -0,0 +1,370 @@
+"""分析流水线：标准化 → PCA → K-means → 凸包 → 指标重要性/SHAP → 渲染，按声明的阶段列表一次请求返回全部结果
+
+依赖的阶段按需计算，同一请求内只计算一次；每个阶段的缓存键由上游阶段的键和本阶段参数链式计算，
+相同数据和参数的中间结果跨请求复用（LRU）。PCA 投影保存在 pca_store 中，返回的 pca_id 可继续用于投影和增量更新。
+/api/pca/analysis 和 /api/clustering/advanced 也通过本模块计算，与流水线共享中间结果。
+"""
+import base64
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from errors import InputError
+from model_cache import ModelCache, dataset_fingerprint
+from rendering import FORMATS as RENDER_FORMATS, parse_render_options, render_cached
+from wire import Records, ip_column, ip_count, ip_matrix, to_json
+
+STAGES = ('standardize', 'pca', 'kmeans', 'hulls', 'importance', 'shap', 'render')
+DEFAULT_STAGES = ('pca', 'kmeans', 'hulls', 'render')
+
+
+def _chain_key(stage, params, upstream):
+    """阶段缓存键：阶段名 + 参数 + 上游阶段的键"""
+    payload = json.dumps([stage, params, upstream], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class Pipeline:
+    """一次分析请求的阶段图：run() 返回阶段的内部结果，artifact() 返回接口输出"""
+
+    def __init__(self, data, params=None, runners=None):
+        self.data = data
+        self.ips = data.get('ips', [])
+        self.params = params or {}
+        self.runners = runners or {}
+        self.report = []
+        self._X = None
+        self._base_key = None
+        self._done = {}
+        self._failed = {}
+        self._artifacts = {}
+        self._own_seconds = 0.0
+
+    @property
+    def X(self):
+        if self._X is None:
+            self._X = ip_matrix(self.ips, dtype=np.float64)
+        return self._X
+
+    def key(self, stage):
+        """阶段结果的缓存键（需要时先计算该阶段）"""
+        self.run(stage)
+        return self._done[stage][0]
+
+    def chain_key(self, stage, params, upstream=()):
+        if not upstream:
+            if self._base_key is None:
+                self._base_key = dataset_fingerprint(self.X, None, 'pipeline')
+            return _chain_key(stage, params, [self._base_key])
+        return _chain_key(stage, params, [self.key(name) for name in upstream])
+
+    def memoize(self, key, compute):
+        """按键读取跨请求缓存，未命中时计算并写入，返回 (键, 结果, 是否命中)"""
+        value = stage_cache.get(key)
+        if value is not None:
+            return key, value, True
+        value = compute()
+        stage_cache.put(key, value)
+        return key, value, False
+
+    def run(self, stage):
+        if stage in self._failed:
+            raise self._failed[stage]
+        if stage not in self._done:
+            start = time.perf_counter()
+            nested_before = self._own_seconds
+            try:
+                key, value, cache_hit = _STAGE_FUNCTIONS[stage](self, self.params.get(stage, {}))
+            except InputError as e:
+                self._failed[stage] = e
+                raise
+            # 只记录本阶段自身的耗时（扣除期间按需计算的上游阶段）
+            seconds = time.perf_counter() - start - (self._own_seconds - nested_before)
+            self._own_seconds += seconds
+            self._done[stage] = (key, value)
+            self.report.append({'stage': stage, 'cache_hit': cache_hit, 'seconds': round(seconds, 4)})
+        return self._done[stage][1]
+
+    def artifact(self, stage):
+        if stage not in self._artifacts:
+            self._artifacts[stage] = _ARTIFACTS[stage](self, self.run(stage))
+        return self._artifacts[stage]
+
+
+def _standardize(pipe, params):
+    from sklearn.preprocessing import StandardScaler
+
+    def compute():
+        scaler = StandardScaler().fit(pipe.X)
+        return {'scaler': scaler, 'X_scaled': scaler.transform(pipe.X)}
+
+    return pipe.memoize(pipe.chain_key('standardize', {}), compute)
+
+
+def _pca(pipe, params):
+    from pca_service import PCAProjection, pca_store
+
+    n_components = int(params.get('n_components', 2))
+    if ip_count(pipe.ips) < 2:
+        raise InputError('IP数量太少，无法进行PCA分析')
+    if pipe.X.shape[1] < n_components:
+        raise InputError(f'指标数量({pipe.X.shape[1]})少于降维目标维度({n_components})')
+
+    # 同一数据集复用已拟合的标准化参数和主成分（refit=true 强制重新拟合）；
+    # 已被 /api/pca/partial-fit 更新过的投影不再是这份数据的拟合结果，分析时重新拟合并替换
+    incremental = bool(params.get('incremental', False))
+    pca_id = dataset_fingerprint(pipe.X, None, 'pca', {'n_components': n_components, 'incremental': incremental})
+    projection = None if params.get('refit') else pca_store.get(pca_id)
+    if projection is not None and projection.updated_at != projection.fitted_at:
+        projection = None
+    reused = projection is not None
+    if projection is None:
+        standardized = pipe.run('standardize')
+        projection = PCAProjection(pipe.X, n_components, incremental=incremental,
+                                   batch_size=params.get('batch_size'),
+                                   drift_threshold=float(params.get('drift_threshold', 2.0)),
+                                   scaler=standardized['scaler'], X_scaled=standardized['X_scaled'])
+        pca_store.put(pca_id, projection)
+
+    value = {'pca_id': pca_id, 'projection': projection, 'coordinates': projection.project(pipe.X), 'reused': reused}
+    # 投影可能被 /api/pca/partial-fit 更新或重新拟合，下游阶段的缓存键包含更新时间
+    return f'{pca_id}:{projection.updated_at}', value, reused
+
+
+def _kmeans(pipe, params):
+    from sklearn.cluster import KMeans
+    from clustering import cluster_quality
+
+    n_clusters = int(params.get('n_clusters', 2))
+    use_pca = params.get('use_pca', True)
+    if ip_count(pipe.ips) < n_clusters:
+        raise InputError(f'IP数量({ip_count(pipe.ips)})少于聚类数量({n_clusters})')
+
+    # 标准化 + 可选的PCA降维（取PCA阶段的前两个主成分）
+    if use_pca and pipe.X.shape[1] > 2:
+        upstream = ('pca',)
+        pca = pipe.run('pca')
+        if pca['coordinates'].shape[1] < 2:
+            raise InputError('PCA降维聚类需要至少2个主成分')
+        X_cluster = pca['coordinates'][:, :2]
+        variance_explained = pca['projection'].pca.explained_variance_ratio_[:2]
+    else:
+        upstream = ('standardize',)
+        X_scaled = pipe.run('standardize')['X_scaled']
+        X_cluster = X_scaled[:, :2] if X_scaled.shape[1] >= 2 else X_scaled
+        variance_explained = None
+
+    def compute():
+        kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
+        labels = kmeans.fit_predict(X_cluster)
+        return {
+            'X': X_cluster,
+            'labels': labels,
+            'centroids': kmeans.cluster_centers_,
+            'n_clusters': n_clusters,
+            'quality': cluster_quality(X_cluster, labels),
+            'use_pca': use_pca,
+            'variance_explained': variance_explained
+        }
+
+    key = pipe.chain_key('kmeans', {'n_clusters': n_clusters, 'use_pca': bool(use_pca)}, upstream)
+    return pipe.memoize(key, compute)
+
+
+def _hulls(pipe, params):
+    from clustering import convex_hulls
+
+    clustered = pipe.run('kmeans')
+    return pipe.memoize(pipe.chain_key('hulls', {}, ('kmeans',)),
+                        lambda: convex_hulls(clustered['X'], clustered['labels'], clustered['n_clusters']))
+
+
+def _external(stage):
+    """由 app 注入的训练类阶段（自身已按数据集指纹缓存模型）"""
+    def run(pipe, params):
+        runner = pipe.runners.get(stage)
+        if runner is None:
+            raise InputError(f'阶段 {stage} 在此接口中不可用')
+        request_data = {key: value for key, value in pipe.data.items() if key not in ('stages', 'dataset_id')}
+        result = runner({**request_data, **params})
+        cache_hit = result.get('cache_hit', result.get('model_info', {}).get('cache_hit', False))
+        return None, result, bool(cache_hit)
+    return run
+
+
+def _clustering_plot_data(pipe):
+    clustered = pipe.artifact('kmeans')
+    return {
+        'clustering_results': clustered['clustering_results'],
+        'convex_hulls': pipe.artifact('hulls'),
+        'pca_info': clustered['pca_info']
+    }
+
+
+def _biplot_data(pipe):
+    pca = pipe.artifact('pca')
+    return {
+        'pca_results': pca['pca_results'],
+        'components': pca['components'],
+        'pca_info': {'x_axis_label': pca['x_axis_label'], 'y_axis_label': pca['y_axis_label']}
+    }
+
+
+_PLOT_DATA = {
+    'clustering_with_hull': _clustering_plot_data,
+    'pca_biplot': _biplot_data
+}
+
+
+def _render(pipe, params):
+    plot_type = params.get('plot_type', 'clustering_with_hull')
+    if plot_type not in _PLOT_DATA:
+        raise InputError(f'plot_type 必须是 {", ".join(_PLOT_DATA)} 之一')
+    fmt, dpi = parse_render_options(params)
+    image, cache_hit = render_cached(plot_type, to_json(_PLOT_DATA[plot_type](pipe)), fmt, dpi)
+    return None, {'plot_type': plot_type, 'format': fmt, 'dpi': dpi, 'image': image, 'cache_hit': cache_hit}, cache_hit
+
+
+_STAGE_FUNCTIONS = {
+    'standardize': _standardize,
+    'pca': _pca,
+    'kmeans': _kmeans,
+    'hulls': _hulls,
+    'importance': _external('importance'),
+    'shap': _external('shap'),
+    'render': _render
+}
+
+
+def _standardize_artifact(pipe, value):
+    return {'mean': value['scaler'].mean_, 'scale': value['scaler'].scale_}
+
+
+def _pca_artifact(pipe, value):
+    projection = value['projection']
+    explained_variance_ratio = projection.pca.explained_variance_ratio_
+    cumulative_variance = np.cumsum(explained_variance_ratio)
+    axis_labels = [f'主成分{i+1} ({ratio * 100:.1f}%方差)' for i, ratio in enumerate(explained_variance_ratio)]
+
+    print(f"PCA分析完成：")
+    print(f"- 主成分数量: {projection.n_components}")
+    print(f"- 轴标签: {axis_labels}")
+    print(f"- 累计方差解释率: {cumulative_variance[-1]*100:.1f}%")
+
+    return {
+        'pca_results': Records(
+            name=ip_column(pipe.ips, 'project_name'),
+            coordinates=value['coordinates'],
+            group=ip_column(pipe.ips, 'group_name', '未知')
+        ),
+        'explained_variance_ratio': explained_variance_ratio.tolist(),
+        'cumulative_variance': cumulative_variance.tolist(),
+        'components': projection.pca.components_,
+        'n_components': projection.n_components,
+        'total_variance_explained': float(cumulative_variance[-1]),
+        'axis_labels': axis_labels,
+        'x_axis_label': axis_labels[0] if len(axis_labels) > 0 else 'PC1',
+        'y_axis_label': axis_labels[1] if len(axis_labels) > 1 else 'PC2',
+        'pca_id': value['pca_id'],  # 用于后续投影新IP或增量更新
+        'pca_info': {**projection.info(), 'reused': value['reused']}
+    }
+
+
+def _kmeans_artifact(pipe, value):
+    X, labels, centroids = value['X'], value['labels'], value['centroids']
+    variance_explained = value['variance_explained']
+    use_pca = value['use_pca']
+    return {
+        'clustering_results': Records(
+            name=ip_column(pipe.ips, 'project_name'),
+            group=ip_column(pipe.ips, 'group_name', '未知'),
+            coordinates=X,
+            cluster=labels.astype(np.int32),
+            distance_to_centroid=np.linalg.norm(X - centroids[labels], axis=1)
+        ),
+        'centroids': centroids,
+        'quality_metrics': value['quality'],
+        'pca_info': {
+            'used': use_pca,
+            'variance_explained': variance_explained.tolist() if variance_explained is not None else None,
+            'x_axis_label': f'主成分1 ({variance_explained[0]*100:.1f}%方差)' if use_pca and variance_explained is not None else '维度1',
+            'y_axis_label': f'主成分2 ({variance_explained[1]*100:.1f}%方差)' if use_pca and variance_explained is not None and len(variance_explained) > 1 else '维度2',
+            'total_variance': f'{sum(variance_explained)*100:.1f}%' if variance_explained is not None else None
+        }
+    }
+
+
+def _result_artifact(pipe, value):
+    return {key: item for key, item in value.items() if key != 'success'}
+
+
+def _render_artifact(pipe, value):
+    image_base64 = base64.b64encode(value['image']).decode()
+    return {
+        'image': f'data:{RENDER_FORMATS[value["format"]]};base64,{image_base64}',
+        'plot_type': value['plot_type'],
+        'format': value['format'],
+        'dpi': value['dpi'],
+        'cache_hit': value['cache_hit']
+    }
+
+
+_ARTIFACTS = {
+    'standardize': _standardize_artifact,
+    'pca': _pca_artifact,
+    'kmeans': _kmeans_artifact,
+    'hulls': lambda pipe, value: value,
+    'importance': _result_artifact,
+    'shap': _result_artifact,
+    'render': _render_artifact
+}
+
+
+def parse_stages(stages):
+    """阶段列表 -> {阶段名: 参数}（保持顺序）；每项可以是阶段名或 {"stage": 名称, ...参数}"""
+    if not isinstance(stages, (list, tuple)) or not stages:
+        raise InputError('stages 必须是非空列表')
+    parsed = {}
+    for item in stages:
+        if isinstance(item, str):
+            name, params = item, {}
+        elif isinstance(item, dict):
+            params = dict(item)
+            name = params.pop('stage', None)
+        else:
+            raise InputError(f'无法识别的阶段: {item}')
+        if name not in STAGES:
+            raise InputError(f'未知阶段: {name}（可用: {", ".join(STAGES)}）')
+        parsed[name] = params
+    return parsed
+
+
+def run_pipeline(data, runners=None):
+    """执行请求的全部阶段；单个阶段的输入错误记录在 errors 中，不影响其它阶段"""
+    start = time.perf_counter()
+    params = parse_stages(data.get('stages') or list(DEFAULT_STAGES))
+    if not ip_count(data.get('ips', [])):
+        raise InputError('没有IP数据')
+    pipe = Pipeline(data, params, runners)
+    artifacts = {}
+    errors = {}
+    for stage in params:
+        try:
+            artifacts[stage] = pipe.artifact(stage)
+        except InputError as e:
+            errors[stage] = str(e)
+    return {
+        'artifacts': artifacts,
+        'errors': errors,
+        'stages': pipe.report,
+        'total_seconds': round(time.perf_counter() - start, 4)
+    }
+
+
+stage_cache = ModelCache(
+    max_entries=int(os.environ.get('ML_PIPELINE_CACHE_ENTRIES', 64)),
+    max_bytes=int(os.environ.get('ML_PIPELINE_CACHE_MB', 256)) * 1024 * 1024
+)
@@ -0,0 +1,288 @@
+"""线程安全的图表渲染：面向对象的 Figure 绘图、独立渲染进程池和按内容哈希的图片缓存
+
+matplotlib 只在实际渲染时导入；使用渲染进程池时，API 主进程不会加载 matplotlib。
+"""
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from errors import InputError
+from model_cache import ModelCache
+from scheduler import compute_cores
+
+PLOT_TYPES = ('clustering_with_hull', 'pca_biplot')
+FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+    'webp': 'image/webp'
+}
+MIN_DPI = 50
+MAX_DPI = 600
+CHINESE_FONTS = [
+    'PingFang SC',      # macOS 默认中文字体
+    'Heiti SC',         # 黑体-简
+    'STHeiti',          # 华文黑体
+    'Arial Unicode MS', # 支持中文的 Arial
+    'SimHei',           # Windows 黑体
+    'Microsoft YaHei',  # 微软雅黑
+    'WenQuanYi Micro Hei' # Linux 文泉驿字体
+]
+FONT_CACHE_PATH = os.environ.get(
+    'ML_FONT_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'python-ml-api', 'chinese_font.json'))
+
+_pool = None
+_pool_lock = threading.Lock()
+_matplotlib_lock = threading.Lock()
+_matplotlib_ready = False
+
+
+def _read_font_cache(matplotlib_version):
+    try:
+        with open(FONT_CACHE_PATH, encoding='utf-8') as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cached.get('matplotlib') != matplotlib_version:
+        return None
+    if cached.get('path') and not os.path.exists(cached['path']):
+        return None
+    return cached
+
+
+def _write_font_cache(cached):
+    try:
+        os.makedirs(os.path.dirname(FONT_CACHE_PATH), exist_ok=True)
+        tmp_path = f'{FONT_CACHE_PATH}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(cached, f, ensure_ascii=False)
+        os.replace(tmp_path, FONT_CACHE_PATH)
+    except OSError as e:
+        print(f"写入字体缓存失败: {str(e)}")
+
+
+def resolve_chinese_font():
+    """返回可用的中文字体名（无则为 None）；结果缓存在磁盘上，避免每次启动扫描全部字体"""
+    import matplotlib
+
+    cached = _read_font_cache(matplotlib.__version__)
+    if cached is not None:
+        return cached.get('font')
+
+    from matplotlib import font_manager
+    available = {f.name: f.fname for f in font_manager.fontManager.ttflist}
+    font = next((name for name in CHINESE_FONTS if name in available), None)
+    _write_font_cache({'font': font, 'path': available.get(font), 'matplotlib': matplotlib.__version__})
+    return font
+
+
+def setup_chinese_font():
+    """设置中文字体，优先使用系统可用字体"""
+    import matplotlib
+
+    font = resolve_chinese_font()
+    if font is not None:
+        matplotlib.rcParams['font.sans-serif'] = [font]
+    else:
+        matplotlib.rcParams['font.sans-serif'] = ['PingFang SC', 'Heiti SC', 'STHeiti', 'Arial Unicode MS']
+
+    matplotlib.rcParams['axes.unicode_minus'] = False
+
+
+def _ensure_matplotlib():
+    """首次渲染时导入 matplotlib 并设置非交互式后端和中文字体"""
+    global _matplotlib_ready
+    if _matplotlib_ready:
+        return
+    with _matplotlib_lock:
+        if not _matplotlib_ready:
+            import matplotlib
+            matplotlib.use('Agg')  # 使用非交互式后端
+            setup_chinese_font()
+            _matplotlib_ready = True
+
+
+def _draw_clustering_with_hull(ax, plot_data):
+    """聚类图与凸包"""
+    clustering_results = plot_data.get('clustering_results', [])
+    convex_hulls = plot_data.get('convex_hulls', [])
+    pca_info = plot_data.get('pca_info', {})
+
+    # 绘制散点
+    colors = ['red', 'blue', 'green', 'orange', 'purple', 'brown', 'pink', 'gray']
+    for result in clustering_results:
+        cluster = result['cluster']
+        coords = result['coordinates']
+        color = colors[cluster % len(colors)]
+        ax.scatter(coords[0], coords[1], c=color, s=100, alpha=0.7,
+                  label=f'簇 {cluster + 1}' if cluster < 8 else None)
+        ax.annotate(result['name'], (coords[0], coords[1]),
+                   xytext=(5, 5), textcoords='offset points', fontsize=8)
+
+    # 绘制凸包
+    for hull_info in convex_hulls:
+        hull_points = np.array(hull_info['hull_points'])
+        if len(hull_points) > 2:
+            # 闭合凸包
+            hull_points = np.vstack([hull_points, hull_points[0]])
+            cluster_id = hull_info['cluster_id']
+            color = colors[cluster_id % len(colors)]
+            ax.plot(hull_points[:, 0], hull_points[:, 1],
+                   color=color, linestyle='--', linewidth=2, alpha=0.8)
+            ax.fill(hull_points[:, 0], hull_points[:, 1],
+                   color=color, alpha=0.2)
+
+    # 设置友好的轴标签
+    x_label = pca_info.get('x_axis_label', '维度1')
+    y_label = pca_info.get('y_axis_label', '维度2')
+    total_variance = pca_info.get('total_variance', '')
+
+    ax.set_xlabel(x_label, fontsize=12)
+    ax.set_ylabel(y_label, fontsize=12)
+
+    # 设置标题，包含方差信息
+    title = '聚类分析结果（含凸包）'
+    if total_variance:
+        title += f' - 总方差解释: {total_variance}'
+    ax.set_title(title, fontsize=14)
+
+    ax.legend()
+    ax.grid(True, alpha=0.3)
+
+
+def _draw_pca_biplot(ax, plot_data):
+    """PCA双标图"""
+    pca_results = plot_data.get('pca_results', [])
+    components = plot_data.get('components', [])
+    pca_info = plot_data.get('pca_info', {})
+
+    # 绘制数据点
+    for result in pca_results:
+        coords = result['coordinates']
+        ax.scatter(coords[0], coords[1], s=100, alpha=0.7)
+        ax.annotate(result['name'], (coords[0], coords[1]),
+                   xytext=(5, 5), textcoords='offset points', fontsize=8)
+
+    # 绘制变量向量（如果有足够的成分信息）
+    if len(components) >= 2:
+        for i, (pc1, pc2) in enumerate(zip(components[0], components[1])):
+            ax.arrow(0, 0, pc1, pc2, head_width=0.05, head_length=0.05,
+                    fc='red', ec='red', alpha=0.7)
+            ax.text(pc1*1.1, pc2*1.1, f'指标{i+1}', fontsize=8,
+                   ha='center', va='center')
+
+    # 使用友好的轴标签
+    x_label = pca_info.get('x_axis_label', '主成分1')
+    y_label = pca_info.get('y_axis_label', '主成分2')
+
+    ax.set_xlabel(x_label, fontsize=12)
+    ax.set_ylabel(y_label, fontsize=12)
+    ax.set_title('PCA双标图', fontsize=14)
+    ax.grid(True, alpha=0.3)
+    ax.axhline(y=0, color='k', linestyle='-', alpha=0.3)
+    ax.axvline(x=0, color='k', linestyle='-', alpha=0.3)
+
+
+_DRAWERS = {
+    'clustering_with_hull': _draw_clustering_with_hull,
+    'pca_biplot': _draw_pca_biplot
+}
+
+
+def render_plot(plot_type, plot_data, fmt='png', dpi=150):
+    """在独立的 Figure 上绘图并返回图片字节（不使用 pyplot 全局状态，可并发调用）"""
+    _ensure_matplotlib()
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(10, 8))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    drawer = _DRAWERS.get(plot_type)
+    if drawer is not None:
+        drawer(ax, plot_data)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=fmt, dpi=dpi, bbox_inches='tight')
+    return buffer.getvalue()
+
+
+def parse_render_options(data):
+    """解析输出格式和分辨率"""
+    fmt = str(data.get('format', 'png')).lower()
+    if fmt not in FORMATS:
+        raise InputError(f'format 必须是 {", ".join(FORMATS)} 之一')
+    try:
+        dpi = int(data.get('dpi', 150))
+    except (TypeError, ValueError):
+        raise InputError('dpi 必须是整数')
+    if not MIN_DPI <= dpi <= MAX_DPI:
+        raise InputError(f'dpi 必须在 {MIN_DPI} 到 {MAX_DPI} 之间')
+    return fmt, dpi
+
+
+def render_key(plot_type, plot_data, fmt, dpi):
+    """图表内容哈希：相同的数据、格式和分辨率得到相同的图片"""
+    payload = json.dumps([plot_type, plot_data, fmt, dpi], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _init_worker():
+    # 渲染一张空白小图，提前加载字体文件和 Agg 渲染器
+    render_plot(None, {}, dpi=MIN_DPI)
+
+
+def pool_size():
+    """渲染进程数（ML_RENDER_WORKERS，默认2且不超过本进程分到的核数）；0 表示在请求线程内渲染"""
+    return int(os.environ.get('ML_RENDER_WORKERS', min(2, compute_cores())))
+
+
+def get_pool():
+    """延迟创建的渲染进程池；ML_RENDER_WORKERS=0 时在请求线程内渲染"""
+    global _pool
+    pool = _pool
+    if pool is None:
+        # 并发的首次渲染请求加锁后再检查一次，只创建一个进程池
+        with _pool_lock:
+            if _pool is None:
+                workers = pool_size()
+                if workers <= 0:
+                    return None
+                _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                            initializer=_init_worker)
+            pool = _pool
+    return pool
+
+
+def shutdown_pool(wait=True):
+    """关闭进程池（服务退出时调用）"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=wait, cancel_futures=True)
+
+
+def render_cached(plot_type, plot_data, fmt='png', dpi=150):
+    """带缓存的渲染，返回 (图片字节, 是否命中缓存)"""
+    key = render_key(plot_type, plot_data, fmt, dpi)
+    image = render_cache.get(key)
+    if image is not None:
+        return image, True
+    pool = get_pool()
+    if pool is None:
+        image = render_plot(plot_type, plot_data, fmt, dpi)
+    else:
+        image = pool.submit(render_plot, plot_type, plot_data, fmt, dpi).result()
+    render_cache.put(key, image)
+    return image, False
+
+
+render_cache = ModelCache(
+    max_entries=int(os.environ.get('ML_RENDER_CACHE_ENTRIES', 256)),
+    max_bytes=int(os.environ.get('ML_RENDER_CACHE_MB', 64)) * 1024 * 1024
+)
@@ -0,0 +1,207 @@
+"""计算调度：限制同时运行的重计算（训练、SHAP、聚类、PCA 等）数量，并给每个计算明确的线程预算
+
+torch、BLAS 和 sklearn（OpenMP）默认各自按全部核数开线程，多个请求同时计算时线程数成倍超出核数，吞吐反而下降。
+调度器只允许 max_concurrent 个计算同时运行，每个计算的 torch / BLAS / OpenMP 线程数为 threads_per_job
+（两者之积不超过分配给本进程的核数；所有计算槽共用同一个 threads_per_job，见 _apply_thread_budget）；其余请求按客户端轮流排队（同一客户端内先到先得），
+一个客户端一次提交很多请求不会挡住其他客户端。队列已满或等待超过 queue_timeout 秒时抛出 ServiceBusy（接口返回503）。
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+import numpy as np
+
+from errors import ServiceBusy
+
+# 等待时间/运行时间统计保留最近的样本数
+STATS_WINDOW = 1000
+_DEFAULT = object()
+
+
+def _summary(samples):
+    if not samples:
+        return {'count': 0, 'mean': None, 'p50': None, 'p95': None, 'max': None}
+    values = np.fromiter(samples, dtype=np.float64, count=len(samples))
+    p50, p95 = np.percentile(values, [50, 95])
+    return {'count': len(values), 'mean': float(values.mean()), 'p50': float(p50), 'p95': float(p95),
+            'max': float(values.max())}
+
+
+class _Ticket:
+    __slots__ = ('client', 'kind', 'granted', 'enqueued_at')
+
+    def __init__(self, client, kind):
+        self.client = client
+        self.kind = kind
+        self.granted = False
+        self.enqueued_at = time.perf_counter()
+
+
+class ComputeScheduler:
+    """计算槽调度（线程安全）：with scheduler.slot(kind, client): ... 在获得计算槽后执行
+
+    max_concurrent 为0时不限制并发、也不设置线程数（关闭调度）。同一线程内嵌套的 slot 直接执行，不重复排队。
+    """
+
+    def __init__(self, max_concurrent, threads_per_job=1, max_queue=64, queue_timeout=300.0):
+        self.max_concurrent = max_concurrent
+        self.threads_per_job = threads_per_job
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        self._queues = OrderedDict()  # 客户端 -> 排队的请求；调度时轮流取各客户端的队首
+        self._queued = 0
+        self._running = {}
+        self._local = threading.local()
+        self._waits = deque(maxlen=STATS_WINDOW)
+        self._runs = deque(maxlen=STATS_WINDOW)
+        self._by_kind = {}
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    @property
+    def enabled(self):
+        return self.max_concurrent > 0
+
+    def _dispatch(self):
+        """有空闲计算槽时按客户端轮流放行（调用方持有锁）"""
+        granted = False
+        while sum(self._running.values()) < self.max_concurrent and self._queues:
+            client, queue = self._queues.popitem(last=False)
+            ticket = queue.popleft()
+            if queue:
+                self._queues[client] = queue  # 该客户端排到最后
+            ticket.granted = True
+            self._queued -= 1
+            self._running[ticket.kind] = self._running.get(ticket.kind, 0) + 1
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def _acquire(self, kind, client, timeout):
+        ticket = _Ticket(client, kind)
+        with self._cond:
+            if not self._queues and sum(self._running.values()) < self.max_concurrent:
+                self._running[kind] = self._running.get(kind, 0) + 1
+                return 0.0
+            if self._queued >= self.max_queue:
+                self.rejected += 1
+                raise ServiceBusy(f'计算资源繁忙：排队请求已达上限 {self.max_queue}，请稍后重试')
+            self._queues.setdefault(client, deque()).append(ticket)
+            self._queued += 1
+            deadline = None if timeout is None else ticket.enqueued_at + timeout
+            while not ticket.granted:
+                remaining = None if deadline is None else deadline - time.perf_counter()
+                if remaining is not None and remaining <= 0:
+                    queue = self._queues[client]
+                    queue.remove(ticket)
+                    if not queue:
+                        del self._queues[client]
+                    self._queued -= 1
+                    self.timed_out += 1
+                    raise ServiceBusy(f'计算资源繁忙：排队超过 {timeout:g} 秒，请稍后重试')
+                self._cond.wait(remaining)
+            return time.perf_counter() - ticket.enqueued_at
+
+    def _release(self, kind, waited, seconds):
+        with self._cond:
+            self._running[kind] -= 1
+            self.completed += 1
+            self._waits.append(waited)
+            self._runs.append(seconds)
+            stats = self._by_kind.setdefault(kind, {'completed': 0, 'wait_seconds': 0.0, 'run_seconds': 0.0})
+            stats['completed'] += 1
+            stats['wait_seconds'] += waited
+            stats['run_seconds'] += seconds
+            self._dispatch()
+
+    def _apply_thread_budget(self):
+        """设置 torch 和 BLAS / OpenMP 的线程数
+
+        torch.set_num_threads 和 OpenBLAS / MKL 的线程数是进程级设置，不能按计算分别指定；这里之所以正确，
+        是因为所有计算槽使用同一个 threads_per_job，各线程设置的是同一个值。只有 OpenMP 的线程数按调用线程生效，
+        所以每个执行线程仍要设置一次（之后跳过）。
+        """
+        if getattr(self._local, 'threads', None) == self.threads_per_job:
+            return
+        import torch
+        from threadpoolctl import threadpool_limits
+
+        torch.set_num_threads(self.threads_per_job)
+        threadpool_limits(limits=self.threads_per_job)
+        self._local.threads = self.threads_per_job
+
+    @contextmanager
+    def slot(self, kind, client=None, timeout=_DEFAULT):
+        """获得计算槽后执行 with 块；timeout 为 None 时一直等待（后台任务），默认 queue_timeout"""
+        depth = getattr(self._local, 'depth', 0)
+        if not self.enabled or depth:
+            self._local.depth = depth + 1
+            try:
+                yield
+            finally:
+                self._local.depth = depth
+            return
+        waited = self._acquire(kind, client or 'anonymous', self.queue_timeout if timeout is _DEFAULT else timeout)
+        self._local.depth = 1
+        start = time.perf_counter()
+        try:
+            self._apply_thread_budget()
+            yield
+        finally:
+            self._local.depth = 0
+            self._release(kind, waited, time.perf_counter() - start)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'enabled': self.enabled,
+                'max_concurrent': self.max_concurrent,
+                'threads_per_job': self.threads_per_job,
+                'running': sum(self._running.values()),
+                'running_by_kind': {kind: n for kind, n in self._running.items() if n},
+                'queued': self._queued,
+                'queued_by_client': {client: len(queue) for client, queue in self._queues.items()},
+                'max_queue': self.max_queue,
+                'queue_timeout': self.queue_timeout,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+                'wait_seconds': _summary(self._waits),
+                'run_seconds': _summary(self._runs),
+                'by_kind': {kind: {
+                    'completed': stats['completed'],
+                    'mean_wait_seconds': stats['wait_seconds'] / stats['completed'],
+                    'mean_run_seconds': stats['run_seconds'] / stats['completed']
+                } for kind, stats in self._by_kind.items()}
+            }
+
+
+def limit_worker_threads(threads=1):
+    """进程池工作进程的初始化函数：已加载的 BLAS 由 threadpoolctl 限制，之后才导入的 sklearn（OpenMP）和 torch 读取环境变量"""
+    for name in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[name] = str(threads)
+    from threadpoolctl import threadpool_limits
+
+    threadpool_limits(limits=threads)
+
+
+def compute_cores():
+    """分配给本进程的核数（ML_COMPUTE_CORES，gunicorn 下为 核数/worker数），计算槽和各进程池的默认大小都按它计算"""
+    return max(1, int(os.environ.get('ML_COMPUTE_CORES', os.cpu_count() or 1)))
+
+
+def default_scheduler():
+    """按分配给本进程的核数配置：默认每个计算2个线程"""
+    cores = compute_cores()
+    threads = int(os.environ.get('ML_COMPUTE_THREADS', min(2, cores)))
+    slots = int(os.environ.get('ML_COMPUTE_SLOTS', max(1, cores // max(threads, 1))))
+    return ComputeScheduler(slots, max(1, threads),
+                            max_queue=int(os.environ.get('ML_COMPUTE_MAX_QUEUE', 64)),
+                            queue_timeout=float(os.environ.get('ML_COMPUTE_QUEUE_TIMEOUT', 300)))
+
+
+compute_scheduler = default_scheduler()
@@ -0,0 +1,189 @@
+"""服务生命周期：重型依赖预加载与就绪状态、启动预热（在接收流量前把每个接口跑一遍）和优雅退出
+
+存活（/api/health）只表示进程能响应请求；就绪（/api/ready）表示重型依赖已加载、预热已完成。
+"""
+import importlib
+import sys
+import threading
+import time
+
+import numpy as np
+
+# 各分析接口依赖的重型模块（按依赖顺序），接口内延迟导入，预加载时一次性导入
+HEAVY_MODULES = (
+    'torch',
+    'sklearn.cluster',
+    'sklearn.decomposition',
+    'sklearn.metrics',
+    'scipy.spatial',
+    'shap',
+    'models',
+    'ensemble',
+    'importance',
+    'explain',
+    'pca_service',
+    'clustering',
+    'rendering'
+)
+
+WARMUP_SAMPLES = 16
+WARMUP_FEATURES = 32
+
+_lock = threading.Lock()
+_state = {
+    'started_at': time.time(),
+    'ready_at': None,
+    'import_seconds': {},
+    'warmup_seconds': None,
+    'models_loaded': None,
+    'error': None
+}
+
+
+def preload_modules():
+    """导入全部重型模块并记录每个模块的导入耗时（fork 前已在 master 中导入的模块保留原记录）"""
+    for name in HEAVY_MODULES:
+        if name in _state['import_seconds']:
+            continue
+        start = time.perf_counter()
+        importlib.import_module(name)
+        with _lock:
+            _state['import_seconds'][name] = round(time.perf_counter() - start, 3)
+
+
+def preload_models():
+    """读取磁盘上保存的全部模型线（最新或固定版本）并编译推理模型，重启后的第一次请求不必重新训练或编译"""
+    from inference import get_predictor
+    from model_store import model_store
+
+    start = time.perf_counter()
+    loaded = model_store.preload()
+    for meta in model_store.list():
+        get_predictor(model_store, meta['id'])
+    with _lock:
+        _state['models_loaded'] = {'count': loaded, 'seconds': round(time.perf_counter() - start, 3)}
+    return loaded
+
+
+def mark_ready(warmup_seconds=None):
+    with _lock:
+        _state['ready_at'] = time.time()
+        _state['warmup_seconds'] = warmup_seconds
+
+
+def readiness():
+    with _lock:
+        loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+        return {
+            'ready': _state['ready_at'] is not None,
+            'started_at': _state['started_at'],
+            'ready_at': _state['ready_at'],
+            'startup_seconds': _state['ready_at'] - _state['started_at'] if _state['ready_at'] else None,
+            'loaded_modules': loaded,
+            'pending_modules': [name for name in HEAVY_MODULES if name not in loaded],
+            'import_seconds': dict(_state['import_seconds']),
+            'warmup_seconds': _state['warmup_seconds'],
+            'models_loaded': _state['models_loaded'],
+            'error': _state['error']
+        }
+
+
+def prepare(app=None):
+    """预加载重型模块并（可选）预热，完成后标记为就绪；失败时记录错误，接口仍可按需加载"""
+    try:
+        preload_modules()
+        preload_models()
+        timings = warm_up(app) if app is not None else None
+        mark_ready(timings)
+        return timings
+    except Exception as e:
+        with _lock:
+            _state['error'] = str(e)
+        raise
+
+
+def prepare_in_background(app=None):
+    """开发服务器使用：后台线程预加载，/api/health 立即可用，/api/ready 在加载完成后返回200"""
+    def run():
+        try:
+            prepare(app)
+        except Exception as e:
+            print(f"后台预加载失败: {str(e)}")
+
+    thread = threading.Thread(target=run, name='ml-preload', daemon=True)
+    thread.start()
+    return thread
+
+
+def _warmup_ips(seed=0):
+    """合成的小规模数据集，只用于预热"""
+    rng = np.random.default_rng(seed)
+    X = rng.uniform(1, 10, size=(WARMUP_SAMPLES, WARMUP_FEATURES))
+    return [{'project_name': f'warmup-{i}', 'group_name': 'warmup', 'indicators': row.tolist()}
+            for i, row in enumerate(X)]
+
+
+def warm_up(app):
+    """用合成数据依次请求各分析接口，触发本进程内的torch算子初始化和字体加载；
+    结束后清空预热产生的缓存，返回每个接口的耗时
+
+    只预热本进程的状态：渲染、聚类和分组分析进程池在首次需要时才创建（每个 gunicorn worker 各自一组，
+    预热时全部启动会让解释器数量成倍增加），预热请求都在请求线程内计算。
+    """
+    import rendering
+    from inference import Predictor, fold_layers
+    from models import AdvancedNN
+    from model_cache import model_cache
+    from pca_service import pca_store
+    from pipeline import stage_cache
+
+    ips = _warmup_ips()
+    client = app.test_client()
+    timings = {}
+
+    def call(method, path, payload=None):
+        start = time.perf_counter()
+        response = client.open(path, method=method, json=payload)
+        timings[path] = round(time.perf_counter() - start, 3)
+        if response.status_code != 200:
+            raise RuntimeError(f'预热请求 {path} 失败: {response.status_code} {response.get_data(as_text=True)[:200]}')
+        return response.get_json()
+
+    # 渲染进程池开启时，预热渲染只会启动进程池，本进程内没有需要预热的状态
+    render_in_process = rendering.pool_size() <= 0
+    call('GET', '/api/health')
+    call('POST', '/api/neural-network/train', {'ips': ips, 'max_epochs': 5, 'persist': False})
+    call('POST', '/api/shap/explain', {'ips': ips, 'max_epochs': 5, 'background_size': 8})
+    pca = call('POST', '/api/pca/analysis', {'ips': ips, 'n_components': 2})
+    call('POST', '/api/pca/project', {'pca_id': pca['pca_id'], 'ips': ips[:2]})
+    clustered = call('POST', '/api/clustering/advanced', {'ips': ips, 'n_clusters': 3})
+    call('POST', '/api/clustering/k-sweep', {'ips': ips, 'k_min': 2, 'k_max': 4, 'parallel': False})
+    if render_in_process:
+        call('POST', '/api/visualization/advanced-plot', {
+            'plot_type': 'clustering_with_hull',
+            'data': {key: clustered[key] for key in ('clustering_results', 'convex_hulls', 'pca_info')}
+        })
+    stages = ['standardize', 'pca', 'kmeans', 'hulls'] + (['render'] if render_in_process else [])
+    call('POST', '/api/pipeline', {'ips': ips, 'stages': stages})
+    call('POST', '/api/groups/analyze', {'ips': ips, 'generations': 5, 'parallel': False})
+    # 首次 TorchScript 跟踪有约1秒的一次性初始化，之后编译每个模型只需几十毫秒
+    start = time.perf_counter()
+    Predictor(fold_layers(AdvancedNN(WARMUP_FEATURES).state_dict())).predict(np.zeros((1, WARMUP_FEATURES)))
+    timings['torchscript'] = round(time.perf_counter() - start, 3)
+
+    model_cache.clear()
+    rendering.render_cache.clear()
+    pca_store.clear()
+    stage_cache.clear()
+    return timings
+
+
+def shutdown(wait=True):
+    """优雅退出：取消后台任务并关闭渲染、聚类和分组分析进程池（未加载的模块无需处理）"""
+    from jobs import job_manager
+
+    job_manager.shutdown(wait=wait)
+    for name in ('rendering', 'clustering', 'group_analysis'):
+        module = sys.modules.get(name)
+        if module is not None:
+            module.shutdown_pool(wait=wait)
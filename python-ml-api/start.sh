@@ -16,7 +16,13 @@ source venv/bin/activate
 echo "📥 安装Python依赖..."
 pip install -r requirements.txt
 
-# 启动Flask应用
+# 启动服务：./start.sh prod 使用 gunicorn 多进程模式，默认使用Flask开发服务器
+if [ "$1" = "prod" ]; then
+    echo "🌟 以生产模式启动（gunicorn，预加载 + 多worker）..."
+    echo "API服务将在 ${ML_API_BIND:-0.0.0.0:5001} 启动，各worker预热完成后开始接收请求"
+    exec gunicorn -c gunicorn.conf.py app:app
+fi
+
 echo "🌟 启动Flask应用..."
 echo "API服务将在 http://localhost:5001 启动"
 echo "按 Ctrl+C 停止服务"
@@ -0,0 +1,148 @@
+"""二进制列式请求/响应格式：msgpack + 原始数组缓冲区，与 JSON 按内容协商
+
+请求体 Content-Type 为 application/msgpack 时按 msgpack 解码；数组以
+{"__ndarray__": true, "dtype": "<f4", "shape": [n, d], "data": <bin>} 表示，解码时直接引用请求缓冲区（零拷贝）。
+`ips` 除逐行对象列表外还可以是列式对象：{"project_name": [...], "group_name": [...], "indicators": <n×d 数组>}。
+Accept 为 application/msgpack（或请求本身为 msgpack 且未指定 Accept）时，响应同样以 msgpack 返回：
+浮点数组以 float32 原始缓冲区传输，Records 保持列式；JSON 响应中数组展开为列表，Records 展开为逐行对象。
+"""
+import math
+
+import msgpack
+import numpy as np
+from flask import Response, jsonify, request
+
+from errors import InputError
+
+MSGPACK_MIMETYPE = 'application/msgpack'
+MSGPACK_MIMETYPES = (MSGPACK_MIMETYPE, 'application/x-msgpack')
+NDARRAY_KEY = '__ndarray__'
+
+
+class Records(dict):
+    """列式记录表：列名 -> 等长的列表或数组（二维数组的每行对应一条记录）"""
+
+    def n_rows(self):
+        return len(next(iter(self.values()))) if self else 0
+
+    def rows(self):
+        """展开为逐行对象列表（JSON 响应的原有格式）"""
+        columns = list(self.items())
+        return [{name: to_json(column[i]) for name, column in columns} for i in range(self.n_rows())]
+
+
+def encode_ndarray(array):
+    """数组 -> msgpack 可序列化的字典（浮点数组压缩为 float32）"""
+    array = np.asarray(array)
+    if array.dtype.kind == 'f' and array.dtype != np.float32:
+        array = array.astype(np.float32)
+    elif array.dtype.kind == 'b':
+        array = array.astype(np.uint8)
+    array = np.ascontiguousarray(array)
+    return {NDARRAY_KEY: True, 'dtype': array.dtype.str, 'shape': list(array.shape), 'data': memoryview(array).cast('B')}
+
+
+def decode_ndarray(obj):
+    """msgpack 字典 -> 只读 NumPy 数组（直接引用解码得到的字节缓冲区，不复制）"""
+    try:
+        dtype = np.dtype(obj['dtype'])
+        shape = tuple(int(s) for s in obj['shape'])
+        return np.frombuffer(obj['data'], dtype=dtype).reshape(shape)
+    except (KeyError, TypeError, ValueError) as e:
+        raise InputError(f'二进制数组格式错误: {str(e)}')
+
+
+def _object_hook(obj):
+    return decode_ndarray(obj) if obj.get(NDARRAY_KEY) is True else obj
+
+
+def _msgpack_default(obj):
+    if isinstance(obj, np.ndarray):
+        return encode_ndarray(obj)
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f'无法序列化的类型: {type(obj).__name__}')
+
+
+def to_json(value):
+    """数组和 NumPy 标量转为 JSON 可表示的值（JSON 无法表示 NaN 和 ±inf：这些值及全部为这些值的行记为 null，数组中的这些元素记为 null）"""
+    if isinstance(value, Records):
+        return value.rows()
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind == 'f' and value.size:
+            missing = ~np.isfinite(value)
+            if missing.all():
+                return None
+            if missing.any():
+                return np.where(missing, None, value.astype(object)).tolist()
+        return value.tolist()
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, dict):
+        return {k: to_json(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json(v) for v in value]
+    return value
+
+
+def is_msgpack_request():
+    return request.mimetype in MSGPACK_MIMETYPES
+
+
+def read_request():
+    """按 Content-Type 解析请求体（替代 request.json）"""
+    if is_msgpack_request():
+        try:
+            return msgpack.unpackb(request.get_data(cache=False), raw=False, object_hook=_object_hook)
+        except (ValueError, msgpack.UnpackException) as e:
+            raise InputError(f'msgpack 请求体解析失败: {str(e) or type(e).__name__}')
+    return request.json
+
+
+def wants_msgpack():
+    accept = request.accept_mimetypes
+    if not accept or accept.best == '*/*':
+        return is_msgpack_request()
+    return accept.best_match(('application/json',) + MSGPACK_MIMETYPES) in MSGPACK_MIMETYPES
+
+
+def respond(payload, status=200):
+    """按协商结果返回 msgpack 或 JSON（替代 jsonify）"""
+    if wants_msgpack():
+        body = msgpack.packb(payload, default=_msgpack_default, use_bin_type=True)
+        return Response(body, status=status, mimetype=MSGPACK_MIMETYPE)
+    return jsonify(to_json(payload)), status
+
+
+def ip_count(ips):
+    if isinstance(ips, dict):
+        return len(ips.get('indicators', []))
+    return len(ips)
+
+
+def ip_column(ips, key, default=None):
+    """取出所有IP的某个字段（兼容逐行和列式两种 ips 格式）"""
+    if isinstance(ips, dict):
+        values = ips.get(key)
+        if values is None:
+            return [default(i) if callable(default) else default for i in range(ip_count(ips))]
+        return list(values)
+    return [ip.get(key, default(i) if callable(default) else default) for i, ip in enumerate(ips)]
+
+
+def ip_matrix(ips, dtype=np.float32):
+    """从IP列表或列式 ips 中构建指标矩阵；二进制输入的类型匹配时不复制数据"""
+    if isinstance(ips, dict):
+        X = np.asarray(ips.get('indicators', []), dtype=dtype)
+        if X.ndim != 2 or X.shape[1] == 0:
+            raise InputError('列式 ips 的 indicators 必须是非空的二维数组')
+        return X
+    X = []
+    for ip in ips:
+        indicators = ip.get('indicators', [])
+        if not indicators:
+            raise InputError(f'IP {ip.get("project_name", "未知")} 缺少指标数据')
+        X.append(indicators)
+    return np.array(X, dtype=dtype)
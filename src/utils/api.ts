@@ -426,12 +426,155 @@ export const pythonMLApi = {
       return data.error ? { success: false, error: data.error } : { success: true, data };
     }),
 
+  // 上传数据集，之后分析接口可只传 dataset_id
+  createDataset: (ips: any[], featureNames?: string[], name?: string) => 
+    fetch(`${PYTHON_ML_API_BASE}/datasets`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ ips, feature_names: featureNames, name })
+    }).then(res => res.json()).then(data => {
+      return data.error ? { success: false, error: data.error } : { success: true, ...data };
+    }),
+
+  // 向数据集追加IP
+  appendDataset: (datasetId: string, ips: any[]) => 
+    fetch(`${PYTHON_ML_API_BASE}/datasets/${datasetId}/append`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ ips })
+    }).then(res => res.json()).then(data => {
+      return data.error ? { success: false, error: data.error } : { success: true, ...data };
+    }),
+
+  // 修改数据集中的IP（按 index 或 project_name 定位）
+  patchDataset: (datasetId: string, updates: any[]) => 
+    fetch(`${PYTHON_ML_API_BASE}/datasets/${datasetId}`, {
+      method: 'PATCH',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ updates })
+    }).then(res => res.json()).then(data => {
+      return data.error ? { success: false, error: data.error } : { success: true, ...data };
+    }),
+
+  // 删除数据集
+  deleteDataset: (datasetId: string) => 
+    fetch(`${PYTHON_ML_API_BASE}/datasets/${datasetId}`, { method: 'DELETE' })
+      .then(res => res.json()).then(data => {
+        return data.error ? { success: false, error: data.error } : { success: true, ...data };
+      }),
+
+  // 计算调度统计（排队数、等待时间）
+  getSchedulerStats: () => 
+    fetch(`${PYTHON_ML_API_BASE}/scheduler/stats`).then(res => res.json()).then(data => {
+      return data.error ? { success: false, error: data.error } : { success: true, ...data };
+    }),
+
+  // 已保存的模型及版本
+  listModels: () => 
+    fetch(`${PYTHON_ML_API_BASE}/models`).then(res => res.json()).then(data => {
+      return data.error ? { success: false, error: data.error } : { success: true, ...data };
+    }),
+
+  // 用已保存的模型批量评分，不训练（options: model_version、feature_names、engine、chunk_size）
+  predictScores: (modelId: string, ips: any[], options: Record<string, any> = {}) => 
+    fetch(`${PYTHON_ML_API_BASE}/predict`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ model_id: modelId, ips, ...options })
+    }).then(res => res.json()).then(data => {
+      return data.error ? { success: false, error: data.error } : { success: true, ...data };
+    }),
+
+  // 固定模型版本（version 为 null 时取消固定）
+  pinModel: (modelId: string, version: number | null) => 
+    fetch(`${PYTHON_ML_API_BASE}/models/${modelId}/pin`, version === null ? { method: 'DELETE' } : {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ version })
+    }).then(res => res.json()).then(data => {
+      return data.error ? { success: false, error: data.error } : { success: true, ...data };
+    }),
+
+  // 遗传算法评估（options: generations、seed、weights、history 等）
+  runGeneticAlgorithm: (ips: any[], options: Record<string, any> = {}) => 
+    fetch(`${PYTHON_ML_API_BASE}/genetic/evaluate`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ ips, ...options })
+    }).then(res => res.json()).then(data => {
+      return data.error ? { success: false, error: data.error } : { success: true, ...data };
+    }),
+
+  // AHP层次权重（matrices 为单组判断矩阵，或 experts 为多名专家的判断矩阵）
+  calculateAHPWeights: (params: { matrices?: any; experts?: any[]; expert_weights?: number[]; feature_names?: string[]; n_features?: number }) => 
+    fetch(`${PYTHON_ML_API_BASE}/ahp/weights`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify(params)
+    }).then(res => res.json()).then(data => {
+      return data.error ? { success: false, error: data.error } : { success: true, ...data };
+    }),
+
+  // 流式导入专家打分表（options: aggregate、save_dataset、include_data、sheet、min_value、max_value）
+  ingestScoreSheet: (file: File, options: Record<string, string> = {}) => {
+    const formData = new FormData();
+    formData.append('file', file);
+    Object.entries(options).forEach(([key, value]) => formData.append(key, value));
+    
+    return fetch(`${PYTHON_ML_API_BASE}/ingest`, {
+      method: 'POST',
+      body: formData
+    }).then(res => res.json()).then(data => {
+      return data.error ? { success: false, error: data.error, bad_rows: data.bad_rows } : { success: true, ...data };
+    });
+  },
+
+  // 多专家评分聚合与异常专家检测（scores 为长格式评分；options: methods、trim、z_threshold、exclude_outliers、expert_outlier_rate）
+  aggregateExpertScores: (scores: any, options: Record<string, any> = {}) => 
+    fetch(`${PYTHON_ML_API_BASE}/experts/aggregate`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ scores, ...options })
+    }).then(res => res.json()).then(data => {
+      return data.error ? { success: false, error: data.error } : { success: true, ...data };
+    }),
+
+  // 三级指标聚合为二级/一级指标得分（options: weights、ahp）
+  rollupIndicators: (ips: any[], featureNames?: string[], options: Record<string, any> = {}) => 
+    fetch(`${PYTHON_ML_API_BASE}/hierarchy/rollup`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ ips, feature_names: featureNames, ...options })
+    }).then(res => res.json()).then(data => {
+      return data.error ? { success: false, error: data.error } : { success: true, ...data };
+    }),
+
+  // 按组别（县）并行分析与跨组别比较（options: groups、ahp、generations、n_clusters、importance_strategy）
+  analyzeByGroup: (ips: any[], featureNames?: string[], options: Record<string, any> = {}) => 
+    fetch(`${PYTHON_ML_API_BASE}/groups/analyze`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ ips, feature_names: featureNames, ...options })
+    }).then(res => res.json()).then(data => {
+      return data.error ? { success: false, error: data.error } : { success: true, ...data };
+    }),
+
   // 生成高级可视化图表
-  generateAdvancedPlot: (plotType: string, plotData: any) => 
+  generateAdvancedPlot: (plotType: string, plotData: any, options: { format?: 'png' | 'svg' | 'webp'; dpi?: number } = {}) => 
     fetch(`${PYTHON_ML_API_BASE}/visualization/advanced-plot`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ plot_type: plotType, data: plotData })
+      body: JSON.stringify({ plot_type: plotType, data: plotData, ...options })
+    }).then(res => res.json()).then(data => {
+      return data.error ? { success: false, error: data.error } : { success: true, ...data };
+    }),
+
+  // 分析流水线：一次请求返回各阶段结果（stages 可为阶段名或 { stage, ...参数 }）
+  runPipeline: (ips: any[], stages: (string | { stage: string; [key: string]: any })[], featureNames?: string[]) => 
+    fetch(`${PYTHON_ML_API_BASE}/pipeline`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ ips, stages, feature_names: featureNames })
     }).then(res => res.json()).then(data => {
       return data.error ? { success: false, error: data.error } : { success: true, ...data };
     }),
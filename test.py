@@ -1,3 +1,5 @@
+import os
+import sys
 import numpy as np 
 import matplotlib
 matplotlib.use('TkAgg')
@@ -5,16 +7,18 @@ import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import tkinter as tk
 from tkinter import messagebox, scrolledtext, simpledialog, ttk
-import torch
-import torch.nn as nn
-import torch.optim as optim
 from datetime import datetime
 import random
 import shap  # 需要提前安装：pip install shap
-from sklearn.decomposition import PCA
-from sklearn.cluster import KMeans
 from scipy.spatial import ConvexHull  # 用于绘制凸包
 
+# 与 Python API 共用的计算模块
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'python-ml-api'))
+from evaluation import cluster_ips, explain_scores, score_ips, train_scoring_model
+from history import EvaluationHistory
+from indicators import hierarchy_rollup
+from model_store import model_store
+
 # 使用内置的ggplot样式
 plt.style.use('ggplot')
 
@@ -54,49 +58,8 @@ def setup_chinese_font():
 setup_chinese_font()
 
 # ----------------------------
-# 模型与算法相关函数
+# 绘图辅助函数（评分、聚类等计算见 python-ml-api/evaluation.py）
 # ----------------------------
-class AdvancedNN(nn.Module):
-    def __init__(self, input_size):
-        super(AdvancedNN, self).__init__()
-        self.fc1 = nn.Linear(input_size, 64)
-        self.relu1 = nn.ReLU()
-        self.fc2 = nn.Linear(64, 32)
-        self.relu2 = nn.ReLU()
-        self.fc3 = nn.Linear(32, 1)
-
-    def forward(self, x):
-        x = self.fc1(x)
-        x = self.relu1(x)
-        x = self.fc2(x)
-        x = self.relu2(x)
-        x = self.fc3(x)
-        return x
-
-def train_nn(model, data, targets, epochs=500):
-    """训练模型，训练轮次设为500轮"""
-    criterion = nn.MSELoss()
-    optimizer = optim.Adam(model.parameters(), lr=0.001)
-    for epoch in range(epochs):
-        model.train()
-        optimizer.zero_grad()
-        outputs = model(data)
-        loss = criterion(outputs, targets)
-        loss.backward()
-        optimizer.step()
-
-def genetic_algorithm_per_ip(data, weights, iterations=50):
-    """
-    对每个 IP 分别记录每次迭代时的适应度，返回形状为 (iterations, num_IP)
-    """
-    n = data.shape[0]
-    fitness_history = np.zeros((iterations, n))
-    for it in range(iterations):
-        fitness = [np.dot(ind, weights) for ind in data]
-        fitness_history[it] = fitness
-        data = data + np.random.normal(0, 0.1, data.shape)
-    return fitness_history
-
 def plot_radar(ax, labels, values):
     num_vars = len(labels)
     angles = np.linspace(0, 2*np.pi, num_vars, endpoint=False).tolist()
@@ -105,12 +68,6 @@ def plot_radar(ax, labels, values):
     ax.plot(angles, values, linewidth=2, linestyle='solid', marker='o')
     ax.fill(angles, values, alpha=0.25)
 
-def ahp_weights(matrix):
-    eig_vals, eig_vecs = np.linalg.eig(matrix)
-    max_index = np.argmax(eig_vals)
-    weights = eig_vecs[:, max_index].real
-    return weights / np.sum(weights)
-
 def push_daily_updates(chat_box):
     def update_chat():
         daily_update = (f"【{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}】\n"
@@ -138,17 +95,8 @@ def explain_model():
         return
 
     messagebox.showinfo("提示", "使用随机目标值训练模型进行SHAP解释。如有真实标签，请替换随机值。")
-    Y = np.random.rand(X.shape[0], 1) * 10
-
-    X_tensor = torch.tensor(X, dtype=torch.float32)
-    Y_tensor = torch.tensor(Y, dtype=torch.float32)
-    input_size = X.shape[1]
-    model = AdvancedNN(input_size)
-    train_nn(model, X_tensor, Y_tensor)
-    model.eval()
-    explainer = shap.DeepExplainer(model, X_tensor)
-    shap_values = explainer.shap_values(X_tensor)
-    feature_names = [f"指标{i+1}" for i in range(input_size)]
+    shap_values = explain_scores(X)
+    feature_names = [f"指标{i+1}" for i in range(X.shape[1])]
     shap.summary_plot(shap_values, X, feature_names=feature_names)
 
 def explain_model_gui():
@@ -166,20 +114,12 @@ def cross_analysis():
     if data.shape[1] < 2:
         messagebox.showwarning("警告", "当前仅有1个指标，无法进行交叉分析。")
         return
-    # 数据归一化处理
-    from sklearn.preprocessing import StandardScaler
-    scaler = StandardScaler()
-    data_scaled = scaler.fit_transform(data)
-    
-    # PCA 降维到2D
-    pca = PCA(n_components=2)
-    data_2d = pca.fit_transform(data_scaled)
-
     k = simpledialog.askinteger("聚类参数", "请输入聚类数：", initialvalue=2, minvalue=2, maxvalue=len(ips))
     if k is None:
         return
-    kmeans = KMeans(n_clusters=k, random_state=42)
-    clusters = kmeans.fit_predict(data_2d)
+    # 标准化 + PCA 降到2维 + KMeans
+    clustered = cluster_ips(data, k)
+    data_2d, clusters = clustered['coordinates'], clustered['labels']
 
     cross_window = tk.Toplevel(root)
     cross_window.title("IP交叉分析结果 - (PCA + KMeans)")
@@ -274,7 +214,8 @@ def start_simulation():
     # 你可以继续添加其他县的数据
 ]
 
-    history = []
+    # 评估历史写入磁盘（python-ml-api/data/history），内存中只保留最近查看的几条
+    history = EvaluationHistory()
 
     main_frame = ttk.Frame(root)
     main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
@@ -536,18 +477,18 @@ def start_simulation():
             return
 
         dim = len(ip_subset[0][2])
-        ahp_matrix = np.ones((dim, dim))
-        weights = ahp_weights(ahp_matrix)
-
         data = np.array([ip[2] for ip in ip_subset], dtype=np.float32)
-        iterations = 50
-        fitness_history = genetic_algorithm_per_ip(data.copy(), weights, iterations=iterations)
-        history.append((ip_subset.copy(), fitness_history.copy()))
+        # AHP层次权重 + 遗传算法（指标列无法对应到指标体系时等权）
+        scored = score_ips(data, current_third_list if len(current_third_list) == dim else None, generations=50)
+        weights = scored['weights']
+        fitness_history = scored['genetic']['fitness_history']
+        history.append([ip[0] for ip in ip_subset], [ip[1] for ip in ip_subset], data, fitness_history,
+                       scored['scores'], scored['errors'], weights, label=filtered_group)
 
         # (1) 适应度变化曲线
         ax1.clear()
         for i in range(fitness_history.shape[1]):
-            ax1.plot(range(iterations), fitness_history[:, i],
+            ax1.plot(range(len(fitness_history)), fitness_history[:, i],
                      label=ip_subset[i][0],
                      marker='o', linestyle='-')
         ax1.set_xlabel('迭代次数', fontsize=12)
@@ -559,8 +500,8 @@ def start_simulation():
 
         # (2) IP评分分布（带误差条）
         ax2.clear()
-        scores = [np.dot(ip[2], weights) for ip in ip_subset]
-        errors = [np.std(fitness_history[:, i]) for i in range(len(ip_subset))]
+        scores = scored['scores']
+        errors = scored['errors']
         ax2.bar(range(len(ip_subset)),
                 scores,
                 yerr=errors,
@@ -578,19 +519,9 @@ def start_simulation():
         ax3.clear()
         angles = np.linspace(0, 2*np.pi, len(first_level), endpoint=False).tolist()
         angles += angles[:1]
-        for ip_name, _, ip_data in ip_subset:
-            aggregated = []
-            for f in first_level:
-                indices = []
-                for s in first_to_second[f]:
-                    if s in second_to_third:
-                        for t in second_to_third[s]:
-                            if t in current_third_list:
-                                indices.append(current_third_list.index(t))
-                if indices:
-                    aggregated.append(np.mean([ip_data[i] for i in indices]))
-                else:
-                    aggregated.append(0)
+        # 聚合矩阵按当前指标筛选条件缓存，所有IP的一级指标得分一次矩阵乘积得到
+        _, first_scores = hierarchy_rollup(current_third_list).rollup(data)
+        for (ip_name, _, _), aggregated in zip(ip_subset, first_scores.tolist()):
             aggregated = aggregated + aggregated[:1]
             ax3.plot(angles, aggregated, label=ip_name, marker='o')
             ax3.fill(angles, aggregated, alpha=0.25)
@@ -621,15 +552,8 @@ def start_simulation():
             return
         try:
             data = np.array([ip[2] for ip in ips], dtype=np.float32)
-            data_tensor = torch.tensor(data, dtype=torch.float32)
-            actual_scores = np.random.rand(len(ips), 1) * 10
-            targets_tensor = torch.tensor(actual_scores, dtype=torch.float32)
-            input_size = data.shape[1]
-            model = AdvancedNN(input_size)
-            train_nn(model, data_tensor, targets_tensor)
-            model.eval()
-            with torch.no_grad():
-                predicted_scores = model(data_tensor).numpy().flatten()
+            # 保存到模型库：IP不变时直接加载上次的模型，只新增少量IP时在上次模型基础上微调
+            _, predicted_scores, _ = train_scoring_model(data, store=model_store)
             log_box.insert(tk.END, "神经网络优化完成，预测评分如下：\n", "center")
             for name, score in zip([ip[0] for ip in ips], predicted_scores):
                 log_box.insert(tk.END, f"{name}: 预测评分 = {score:.2f}\n", "center")
@@ -641,29 +565,71 @@ def start_simulation():
         if not history:
             messagebox.showinfo("无记录", "没有历史记录可供查看。")
             return
+        page_size = 50
+        state = {'offset': 0, 'runs': []}
+        def show_page():
+            # 每页只读取记录摘要，选择或对比时才读取完整记录
+            state['runs'] = history.page(state['offset'], page_size)
+            history_listbox.delete(0, tk.END)
+            for run in state['runs']:
+                created = datetime.fromtimestamp(run['created_at']).strftime('%m-%d %H:%M:%S')
+                history_listbox.insert(tk.END, f"记录 {run['id']} [{created}] {run['label']}: {run['n_ips']} 个IP，"
+                                               f"最高 {run['best_name']} {run['best_score']:.2f}")
+            total = len(history)
+            page_label.config(text=f"第 {state['offset'] // page_size + 1} / {max(1, -(-total // page_size))} 页（共 {total} 条）")
+        def turn_page(step):
+            offset = state['offset'] + step * page_size
+            if 0 <= offset < len(history):
+                state['offset'] = offset
+                show_page()
         def select_history():
             selected_index = history_listbox.curselection()
             if not selected_index:
                 messagebox.showinfo("提示", "请选择一个历史记录。")
                 return
-            idx = selected_index[0]
-            previous_ips, previous_fitness = history[idx]
+            run = history.load(state['runs'][selected_index[0]]['id'])
             ax1.clear()
-            ax1.plot(previous_fitness, label=f'历史适应度变化 (记录 {idx+1})')
+            ax1.plot(run['fitness_history'], label=f"历史适应度变化 (记录 {run['id']})")
             ax1.set_xlabel('迭代次数', fontsize=12)
             ax1.set_ylabel('适应度', fontsize=12)
-            ax1.set_title(f'历史适应度变化曲线 - 记录 {idx+1}', fontsize=14)
+            ax1.set_title(f"历史适应度变化曲线 - 记录 {run['id']}", fontsize=14)
             ax1.legend()
             canvas_chart1.draw()
             history_window.destroy()
+        def compare_history():
+            selected_index = history_listbox.curselection()
+            if len(selected_index) != 2:
+                messagebox.showinfo("提示", "请选择两个历史记录进行对比。")
+                return
+            # 列表按时间倒序，先选中的一行是较新的记录
+            newer, older = (state['runs'][i]['id'] for i in selected_index)
+            diff = history.compare(older, newer)
+            log_box.delete('1.0', tk.END)
+            log_box.insert(tk.END, f"记录 {older} → 记录 {newer} 对比：\n", "center")
+            for change in diff['changes']:
+                log_box.insert(tk.END, f"{change['name']}（{change['group']}）: 评分 {change['score_before']:.2f} → "
+                                       f"{change['score_after']:.2f}（{change['score_change']:+.2f}），"
+                                       f"排名 {change['rank_before']} → {change['rank_after']}\n", "center")
+            for item in diff['added']:
+                log_box.insert(tk.END, f"新增: {item['name']}（{item['group']}）\n", "center")
+            for item in diff['removed']:
+                log_box.insert(tk.END, f"移除: {item['name']}（{item['group']}）\n", "center")
+            history_window.destroy()
         history_window = tk.Toplevel(root)
         history_window.title("查看历史记录")
-        history_listbox = tk.Listbox(history_window, width=50, height=10)
+        history_listbox = tk.Listbox(history_window, width=80, height=15, selectmode=tk.EXTENDED)
         history_listbox.pack(fill=tk.BOTH, expand=True)
-        for idx, (ips_data, _) in enumerate(history):
-            history_listbox.insert(tk.END, f"记录 {idx+1}: {len(ips_data)} 个IP")
-        select_button = ttk.Button(history_window, text="选择", command=select_history)
-        select_button.pack(pady=5)
+        nav_frame = ttk.Frame(history_window)
+        nav_frame.pack(pady=5)
+        ttk.Button(nav_frame, text="上一页", command=lambda: turn_page(-1)).pack(side=tk.LEFT, padx=5)
+        page_label = ttk.Label(nav_frame)
+        page_label.pack(side=tk.LEFT, padx=5)
+        ttk.Button(nav_frame, text="下一页", command=lambda: turn_page(1)).pack(side=tk.LEFT, padx=5)
+        action_frame = ttk.Frame(history_window)
+        action_frame.pack(pady=5)
+        ttk.Button(action_frame, text="选择", command=select_history).pack(side=tk.LEFT, padx=5)
+        ttk.Button(action_frame, text="对比", command=compare_history).pack(side=tk.LEFT, padx=5)
+        show_page()
 
     # 左侧操作按钮
     ttk.Button(button_frame, text="添加IP", command=add_ip).grid(row=0, column=0, padx=5, pady=3, sticky="we")